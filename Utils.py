@@ -3,25 +3,81 @@ import pandas as pd
 import datetime as dt
 from lmfit import Parameters
 from sqlalchemy import create_engine
-import pymysql
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.pool import QueuePool
 import json
 import pandas.io.sql as pdsql
 from boto.s3.connection import S3Connection
-from boto.s3.key import Key
-from io import StringIO
+import io
 import os
+import atexit
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
-DATETIME_LIKE = (dt.datetime, dt.date, np.datetime64, pd.Timestamp)
+DATETIME_LIKE = frozenset([dt.datetime, dt.date, np.datetime64, pd.Timestamp])
+# Exact types the per-value checks recognize with a single lookup; anything else falls back to issubclass
+INTEGER_TYPES = frozenset([int, np.int8, np.int16, np.int32, np.int64, np.uint8, np.uint16, np.uint32, np.uint64])
+NUMERICAL_TYPES = INTEGER_TYPES | frozenset([float, np.float16, np.float32, np.float64])
 
 def isIntegerLike(val):
-    return type(val) == int or issubclass(type(val), np.integer)
+    t = type(val)
+    return t in INTEGER_TYPES or issubclass(t, np.integer)
 
 def isNumerical(val):
-    return type(val) == int or type(val) == float or issubclass(type(val), np.integer) or issubclass(type(val), np.float)
+    # bool is excluded, it's a subclass of int but not a number as far as formulas are concerned
+    t = type(val)
+    return t in NUMERICAL_TYPES or issubclass(t, (float, np.integer, np.floating))
 
 def isDatetimeLike(val):
     return type(val) in DATETIME_LIKE
 
+def numericalMask(values):
+    """
+    Column-level isNumerical: decided from the dtype, and only checked value by value for object columns.
+    :param values: array-like
+    :return: np.ndarray of bools
+    """
+    values = np.asarray(values)
+    if values.dtype.kind in 'iuf':
+        return np.ones(values.shape, dtype=bool)
+    if values.dtype.kind != 'O':
+        return np.zeros(values.shape, dtype=bool)
+    return np.fromiter((isNumerical(v) for v in values.flat), dtype=bool, count=values.size).reshape(values.shape)
+
+def toExcelSerialDates(values):
+    """
+    Convert datetime-like values to Excel serial day numbers (1900 date system), dropping any time of day.
+    :param values: array-like of datetimes
+    :return: np.ndarray of floats, NaN where the value is missing
+    """
+    values = pd.DatetimeIndex(values)
+    if values.tz is not None:
+        values = values.tz_localize(None)
+    days = np.asarray((values.normalize() - pd.Timestamp('1899-12-31')).days, dtype=float)
+    # Excel treats 1900 as a leap year, so every serial after 28 Feb 1900 is one day ahead
+    days[days > 59] += 1
+    return days
+
+def fromExcelSerialDate(serial):
+    """
+    Convert an Excel serial day number (1900 date system) back to a datetime at midnight.
+    :param serial: number
+    :return: dt.datetime
+    """
+    # Serials from 1 Mar 1900 on are one day ahead because of Excel's phantom 29 Feb 1900
+    epoch = dt.datetime(1899, 12, 30) if serial >= 61 else dt.datetime(1899, 12, 31)
+    return epoch + dt.timedelta(days=int(serial))
+
+def contiguousRuns(mask):
+    """
+    Find the runs of True in a boolean array.
+    :param mask: 1D boolean array
+    :return: list of (start, stop) tuples
+    """
+    edges = np.flatnonzero(np.diff(np.concatenate(([False], mask, [False])).astype(int)))
+    return list(zip(edges[::2], edges[1::2]))
+
 def assertType(value, allowed_types):
     """
     Assert type of value
@@ -49,68 +105,198 @@ def getDatabaseAuth(filepath, quiet=False):
         print('Unknown Exception: %r' % Err)
         exit(1)
 
+def getDatabaseURL(auth_json):
+    """
+    SQLAlchemy URL for the database described by an auth file: its "URL" entry if it has one (e.g.
+    "sqlite:///local.db"), otherwise a MySQL URL built from Host, Port, Username, Password and Database.
+    """
+    if 'URL' in auth_json:
+        return make_url(auth_json['URL'])
+    return URL.create('mysql+pymysql', username=auth_json["Username"], password=auth_json["Password"],
+                      host=auth_json["Host"], port=int(auth_json["Port"]), database=auth_json["Database"])
+
+
+class EnginePool():
+    """
+    SQLAlchemy engines shared between queries, one per auth file, so that connections are pooled rather than
+    opened for every query. Auth files are read once and read again only if they change on disk.
+    """
+
+    def __init__(self, pool_size=5, max_overflow=10, pool_recycle=3600):
+        """
+        :param pool_size: int, connections kept open per database
+        :param max_overflow: int, connections opened beyond pool_size under load, closed when returned
+        :param pool_recycle: int, seconds after which a connection is replaced, as servers drop idle ones
+        """
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.pool_recycle = pool_recycle
+        self.auths = {}
+        self.engines = {}
+        self.lock = threading.Lock()
+
+    def configure(self, pool_size=None, max_overflow=None, pool_recycle=None):
+        """Change the pool settings. Engines already created keep theirs until disposed."""
+        if pool_size is not None:
+            self.pool_size = pool_size
+        if max_overflow is not None:
+            self.max_overflow = max_overflow
+        if pool_recycle is not None:
+            self.pool_recycle = pool_recycle
+
+    def getAuth(self, authfile, quiet=False):
+        path = os.path.abspath(authfile)
+        try:
+            modified = os.stat(path).st_mtime
+        except OSError:
+            # Left to getDatabaseAuth to report
+            modified = None
+        cached = self.auths.get(path)
+        if cached is None or cached[0] != modified:
+            cached = (modified, getDatabaseAuth(path, quiet=quiet))
+            self.auths[path] = cached
+        return cached[1]
+
+    def getEngine(self, authfile, quiet=False):
+        """
+        :param authfile: str, path to a json auth file
+        :param quiet: bool
+        :return: sqlalchemy Engine, created on first use
+        """
+        path = os.path.abspath(authfile)
+        with self.lock:
+            auth_json = self.getAuth(path, quiet=quiet)
+            url = getDatabaseURL(auth_json)
+            engine = self.engines.get(path)
+            if engine is not None and engine.url == url:
+                return engine
+            if engine is not None:
+                engine.dispose()
+            kwargs = {'pool_recycle': self.pool_recycle, 'pool_pre_ping': True}
+            # In-memory SQLite, for one, uses a pool without these settings
+            if issubclass(url.get_dialect().get_pool_class(url), QueuePool):
+                kwargs.update(pool_size=self.pool_size, max_overflow=self.max_overflow)
+            engine = create_engine(url, **kwargs)
+            self.engines[path] = engine
+            return engine
+
+    def dispose(self, authfile=None):
+        """
+        Close the pooled connections of one auth file's engine, or of all of them.
+        :param authfile: str, or None for every engine
+        """
+        with self.lock:
+            paths = list(self.engines) if authfile is None else [os.path.abspath(authfile)]
+            for path in paths:
+                engine = self.engines.pop(path, None)
+                if engine is not None:
+                    engine.dispose()
+                self.auths.pop(path, None)
+
+
+DATABASE_ENGINES = EnginePool()
+atexit.register(DATABASE_ENGINES.dispose)
+
+
+def configureDatabaseEngines(pool_size=None, max_overflow=None, pool_recycle=None):
+    DATABASE_ENGINES.configure(pool_size=pool_size, max_overflow=max_overflow, pool_recycle=pool_recycle)
+
+
+def disposeDatabaseEngines(authfile=None):
+    DATABASE_ENGINES.dispose(authfile)
+
+
 def pushParametersDictToSQL(authfile, param_dict, table_name, if_exists='append', index=False):
     assertType(param_dict, dict)
     param_dict = {i: param_dict[i].valuesdict() for i in param_dict}
+    # One row per set of parameters and one column per parameter name, melted to one row per parameter
     param_df = pd.DataFrame(param_dict).transpose()
-    new_dicts = []
-    for row in param_df.iterrows():
-        new_dicts.append({
-            'id': '|'.join(row[0]),
-            'param_name': row[1].index.values,
-            'param_value': row[1].values
-        })
-    df = pd.concat([pd.DataFrame(x) for x in new_dicts])
+    num_sets, num_names = param_df.shape
+    df = pd.DataFrame({
+        'id': np.repeat(['|'.join(i) for i in param_df.index], num_names),
+        'param_name': np.tile(param_df.columns.values, num_sets),
+        'param_value': param_df.values.ravel()
+    }, index=np.tile(np.arange(num_names), num_sets))
     df['runtime'] = dt.datetime.now()
-    pushDataFrameUsingAlchemy(authfile, df, table_name, if_exists=if_exists, index=index)
+    pushDataFrameUsingAlchemy(authfile, df, table_name, if_exists=if_exists, index=index, method='multi')
+    # Snapshots read before this push may no longer be the most recent
+    PARAMETER_SNAPSHOTS.clear()
+
+
+# (auth file, query, datetime_filter, exact_datetimes) -> rows of parameters, filled by readParametersDictFromSQL
+PARAMETER_SNAPSHOTS = {}
 
 
-def readParametersDictFromSQL(authfile, query, results=True, quiet=False, datetime_filter='recent', exact_datetimes=None):
+def readParametersDictFromSQL(authfile, query, results=True, quiet=False, datetime_filter='recent', exact_datetimes=None, cache=False):
+    """
+    Read sets of fitted parameters pushed by pushParametersDictToSQL.
+    :param cache: bool, if True the rows read are kept in memory, and a later read with the same arguments is
+        served from them without running the query. Cleared by pushParametersDictToSQL and clearParameterSnapshots
+    :return: dict of tuple id: lmfit.Parameters
+    """
     passable_datetime_filters = ['recent', 'all', 'exact']
     assert datetime_filter in passable_datetime_filters, (
         'Acceptable datetime_filters are %s' % passable_datetime_filters)
-    df = runDatabaseQuery(authfile, query, results=results, quiet=quiet)
-    # assert 'ParameterSetName' in df.columns, (
-    #     'Derived table from query passed must have a column named "ParameterSetName"')
     if datetime_filter == 'exact':
-        for i in exact_datetimes:
-            uv.assertDatetimeLike(exact_datetimes)
-        df = df[df['runtime'].apply(lambda x: x in exact_datetimes)]
-    if datetime_filter == 'recent':
-        df = df[df['runtime'] == max(df['runtime'])]
-    if datetime_filter == 'all':
-        pass
+        assert all(isDatetimeLike(i) for i in exact_datetimes), 'exact_datetimes must be datetimes.'
+    key = (os.path.abspath(authfile), query, datetime_filter,
+           None if exact_datetimes is None else tuple(exact_datetimes))
+    # Snapshots are kept as the rows the parameters are built from, so each read builds fresh Parameters
+    df = PARAMETER_SNAPSHOTS.get(key) if cache else None
+    if df is None:
+        df = runDatabaseQuery(authfile, query, results=results, quiet=quiet)
+        # assert 'ParameterSetName' in df.columns, (
+        #     'Derived table from query passed must have a column named "ParameterSetName"')
+        if datetime_filter == 'exact':
+            df = df[df['runtime'].isin(exact_datetimes)]
+        if datetime_filter == 'recent':
+            df = df[df['runtime'] == df['runtime'].max()]
+        if datetime_filter == 'all':
+            pass
+        df = df[['id', 'param_name', 'param_value']]
+        if cache:
+            PARAMETER_SNAPSHOTS[key] = df
+    # Rows are grouped by id in one pass over the factorized ids rather than by slicing the frame per id
+    codes, ids = pd.factorize(df['id'].values)
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(len(ids) + 1))
+    names = df['param_name'].values[order]
+    values = df['param_value'].values[order]
     param_dict = {}
-    df = df.set_index('id')
-    for ind in df.index.values:
-        sub_df = df.ix[ind]
+    for i, ind in enumerate(ids):
         p = Parameters()
-        for row in sub_df.iterrows():
-            p.add(name=row[1]['param_name'], value=row[1]['param_value'])
+        p.add_many(*zip(names[bounds[i]:bounds[i + 1]], values[bounds[i]:bounds[i + 1]]))
         param_dict[tuple(ind.split('|'))] = p
     return param_dict
 
-def pushDataFrameUsingAlchemy(authfile, df, table_name, if_exists='fail', index=True, message=None, quiet=False):
-    """Run query on database and return results as a data frame."""
+
+def clearParameterSnapshots():
+    PARAMETER_SNAPSHOTS.clear()
+
+
+def pushDataFrameUsingAlchemy(authfile, df, table_name, if_exists='fail', index=True, message=None, quiet=False, method=None):
+    """
+    Push a data frame to a table of the database.
+    :param method: passed on to DataFrame.to_sql; 'multi' inserts each chunk of 1000 rows in a single statement
+    """
     if message is not None:
         print(message)
 
     # Connect to the MySQL database server
-    auth_json = getDatabaseAuth(authfile, quiet=quiet)
+    auth_json = DATABASE_ENGINES.getAuth(authfile, quiet=quiet)
     if quiet is False:
-        print(' Attempting to connect to server %s' % auth_json["Host"])
+        print(' Attempting to connect to server %s' % auth_json.get("Host", auth_json.get("URL")))
     try:
-        engine = create_engine('mysql+mysqlconnector://%s:%s@%s:%s/%s' % (auth_json["Username"], auth_json["Password"],
-                                                           auth_json["Host"], auth_json["Port"], auth_json["Database"]))
+        engine = DATABASE_ENGINES.getEngine(authfile, quiet=quiet)
         if quiet is False:
-            print(' Connection established to server %s' % auth_json["Host"])
+            print(' Connection established to server %s' % auth_json.get("Host", auth_json.get("URL")))
 
         # Read data into pandas dataframe
         if quiet is False:
             print(' Pushing data.')
 
         try:
-            df.to_sql(table_name, engine, if_exists=if_exists, index=index, chunksize=1000)
+            df.to_sql(table_name, engine, if_exists=if_exists, index=index, chunksize=1000, method=method)
             if quiet is False:
                 print(' Push complete.')
         except Exception as Err:
@@ -118,13 +304,11 @@ def pushDataFrameUsingAlchemy(authfile, df, table_name, if_exists='fail', index=
                 print(' Unable to complete push: %r' % Err)
             else:
                 print(' Unable to complete push: %r. %s' % (Err, message))
-            engine.dispose()
             return 'Failed'
         finally:
-            # Close cursor and connection
+            # Connections go back to the pool rather than being closed
             if quiet is False:
-                print('Closing database connections.\n')
-            engine.dispose()
+                print('Returning database connections.\n')
             return 'Success'
 
     except Exception as Err:
@@ -138,18 +322,14 @@ def runDatabaseQuery(authfile, sql_query, results=True, quiet=False):
         print('Running query: %s' % sql_query)
 
     # Connect to the MySQL database server
-    auth_json = getDatabaseAuth(authfile, quiet=quiet)
+    auth_json = DATABASE_ENGINES.getAuth(authfile, quiet=quiet)
     if quiet is False:
-        print(' Attempting to connect to server %s' % auth_json["Host"])
+        print(' Attempting to connect to server %s' % auth_json.get("Host", auth_json.get("URL")))
     try:
-        conn = pymysql.connect(
-            host = auth_json["Host"],
-            user = auth_json["Username"],
-            passwd = auth_json["Password"],
-            db = auth_json["Database"],
-            port = int(auth_json["Port"]))
+        # A DBAPI connection checked out of the pool; closing it returns it to the pool
+        conn = DATABASE_ENGINES.getEngine(authfile, quiet=quiet).raw_connection()
         if quiet is False:
-            print(' Connection established to server %s' % auth_json["Host"])
+            print(' Connection established to server %s' % auth_json.get("Host", auth_json.get("URL")))
         # Get a cursor and review server info
         cur = conn.cursor()
 
@@ -173,6 +353,8 @@ def runDatabaseQuery(authfile, sql_query, results=True, quiet=False):
         else:
             try:
                 cur.execute(sql_query)
+                # Pooled connections are rolled back when returned, so changes have to be committed here
+                conn.commit()
                 if quiet is False:
                     print(' Query worked.')
             except Exception as Err:
@@ -189,64 +371,225 @@ def runDatabaseQuery(authfile, sql_query, results=True, quiet=False):
         exit(1)
 
 
-def getDataFrameFromS3(auth_file_path, bucket_name, s3_file_path):
+def iterDatabaseQuery(authfile, sql_query, chunksize=10000, quiet=False):
+    """
+    Run a query and yield its results a chunk at a time, e.g. to pass to Sheet.addTable without holding the
+    whole result. The pooled connection is held until the chunks are exhausted or the generator is closed.
+    :param authfile: str, path to auth file
+    :param sql_query: str
+    :param chunksize: int, rows per DataFrame
+    :param quiet: bool
+    :return: generator of pd.DataFrame
+    """
+    if quiet is False:
+        print('Running query: %s' % sql_query)
+    conn = DATABASE_ENGINES.getEngine(authfile, quiet=quiet).raw_connection()
+    try:
+        for chunk in pdsql.read_sql(sql_query, con=conn, chunksize=chunksize):
+            yield chunk
+    finally:
+        if quiet is False:
+            print('Closing database connections.\n')
+        conn.close()
+
+
+# Parts are read and uploaded this many bytes at a time; S3 requires at least 5MB for all but the last part
+S3_PART_SIZE = 8 * 2 ** 20
+S3_UPLOAD_WORKERS = 4
+
+
+class S3Connections():
+    """
+    S3 connections shared between calls, one per auth file, along with the buckets opened through them, so that
+    each call doesn't reconnect and look its bucket up again.
     """
-    Reads a csv from S3, returns a DataFrame.
+
+    def __init__(self):
+        self.connections = {}
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def getBucket(self, auth_file_path, bucket_name):
+        path = os.path.abspath(auth_file_path)
+        with self.lock:
+            bucket = self.buckets.get((path, bucket_name))
+            if bucket is None:
+                conn = self.connections.get(path)
+                if conn is None:
+                    auth_json = getDatabaseAuth(path)
+                    conn = S3Connection(auth_json['key'], auth_json['secret'])
+                    self.connections[path] = conn
+                bucket = conn.get_bucket(bucket_name)
+                self.buckets[(path, bucket_name)] = bucket
+            return bucket
+
+    def close(self):
+        with self.lock:
+            for conn in self.connections.values():
+                conn.close()
+            self.connections = {}
+            self.buckets = {}
+
+
+S3_CONNECTIONS = S3Connections()
+atexit.register(S3_CONNECTIONS.close)
+
+
+def closeS3Connections():
+    S3_CONNECTIONS.close()
+
+
+class S3KeyReader(io.RawIOBase):
+    """Read-only file over an S3 key, fetching it as it is read rather than downloading it whole first."""
+
+    def __init__(self, key):
+        self.key = key
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        # Key.read(0) would read the rest of the key at once
+        data = self.key.read(len(b)) if len(b) > 0 else b''
+        b[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self.key.close()
+        super().close()
+
+
+def uploadPartsToS3(key, chunks, part_size=S3_PART_SIZE, workers=S3_UPLOAD_WORKERS):
+    """
+    Upload bytes to an S3 key as they are produced. Anything that fits in one part is uploaded in a single
+    request, anything larger as a multipart upload with up to workers parts in flight at a time, so that at
+    most workers + 1 parts are held in memory.
+    :param key: boto.s3.key.Key
+    :param chunks: iterable of bytes
+    :param part_size: int, bytes per part
+    :param workers: int, number of threads uploading parts
+    :return:
+    """
+    chunks = iter(chunks)
+    buffer = io.BytesIO()
+    for chunk in chunks:
+        buffer.write(chunk)
+        if buffer.tell() >= part_size:
+            break
+    else:
+        buffer.seek(0)
+        key.set_contents_from_file(buffer)
+        return
+
+    upload = key.bucket.initiate_multipart_upload(key.name)
+
+    def uploadPart(part, part_num):
+        part.seek(0)
+        upload.upload_part_from_file(part, part_num)
+
+    pending = deque()
+    part_num = 0
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        while True:
+            if buffer.tell() >= part_size:
+                part_num += 1
+                pending.append(pool.submit(uploadPart, buffer, part_num))
+                buffer = io.BytesIO()
+                while len(pending) > workers:
+                    pending.popleft().result()
+            chunk = next(chunks, None)
+            if chunk is None:
+                break
+            buffer.write(chunk)
+        if buffer.tell() > 0:
+            part_num += 1
+            pending.append(pool.submit(uploadPart, buffer, part_num))
+        while pending:
+            pending.popleft().result()
+        upload.complete_upload()
+    except BaseException:
+        for future in pending:
+            future.cancel()
+        # Parts already being uploaded finish first, so none lands after the upload is cancelled
+        pool.shutdown()
+        upload.cancel_upload()
+        raise
+    finally:
+        pool.shutdown()
+
+
+def iterDataFrameCSV(df, rows=100000):
+    """Render a DataFrame as csv a block of rows at a time, as bytes; joined they are df.to_csv()."""
+    for start in range(0, max(len(df), 1), rows):
+        yield df.iloc[start:start + rows].to_csv(header=start == 0).encode('utf-8')
+
+
+def getDataFrameFromS3(auth_file_path, bucket_name, s3_file_path, chunksize=None):
+    """
+    Reads a csv from S3, returns a DataFrame. The csv is parsed as it is downloaded.
     :param auth_file_path: str, path to auth file
     :param bucket_name: str, name of S3 bucket
     :param s3_file_path: str, path to S3 file
+    :param chunksize: int, if given an iterator of DataFrames of this many rows is returned instead, e.g. to pass
+        to Sheet.addTable
     :return: pd.DataFrame
     """
-    auth_json = getDatabaseAuth(auth_file_path)
-    conn = S3Connection(auth_json['key'], auth_json['secret'])
-    bucket = conn.get_bucket(bucket_name)
-    key = Key(bucket)
-    key.key = s3_file_path
-    string = key.get_contents_as_string()
-    string = string.decode('utf-8')
-    stringio = StringIO(string)
-    df = pd.DataFrame.from_csv(stringio)
-    conn.close()
-    return df
+    bucket = S3_CONNECTIONS.getBucket(auth_file_path, bucket_name)
+    key = bucket.new_key(s3_file_path)
+    stream = io.BufferedReader(S3KeyReader(key), buffer_size=S3_PART_SIZE)
+    # As the removed pd.DataFrame.from_csv read them
+    csv_options = {'index_col': 0, 'parse_dates': True}
+    if chunksize is None:
+        with stream:
+            return pd.read_csv(stream, **csv_options)
+    return iterCSVChunks(stream, chunksize, csv_options)
+
+
+def iterCSVChunks(stream, chunksize, csv_options):
+    """Parse a csv stream chunk by chunk, closing it once the chunks are exhausted."""
+    with stream:
+        for chunk in pd.read_csv(stream, chunksize=chunksize, **csv_options):
+            yield chunk
 
 
 def pushDataFrameToS3(df, auth_file_path, bucket_name, s3_file_path, overwrite=False):
     """
-    Takes a DataFrame and saves to s3
+    Takes a DataFrame and saves to s3, uploading the csv in parts as it is rendered.
     :param df: pd.DataFrame
     :param auth_file_path: str, path to auth file
     :param bucket_name: str, name of S3 bucket
     :param s3_file_path: str, path to S3 file
     :return:
     """
-    auth_json = getDatabaseAuth(auth_file_path)
-    conn = S3Connection(auth_json['key'], auth_json['secret'])
-    bucket = conn.get_bucket(bucket_name)
+    bucket = S3_CONNECTIONS.getBucket(auth_file_path, bucket_name)
     key = bucket.get_key(s3_file_path)
     if key is None:
-        key = Key(bucket)
-        key.key = s3_file_path
+        key = bucket.new_key(s3_file_path)
     elif not overwrite:
         print('Nothing was pushed because %s already exists. To overwrite, use overwrite=True' % s3_file_path)
         return
-    stringio = StringIO()
-    df.to_csv(stringio)
-    key.set_contents_from_string(stringio.getvalue())
-    conn.close()
+    uploadPartsToS3(key, iterDataFrameCSV(df))
 
 
 def saveFileToS3(file, auth_file_path, bucket_name, s3_file_path, overwrite=False, delete_local_version=False):
-    auth_json = getDatabaseAuth(auth_file_path)
-    conn = S3Connection(auth_json['key'], auth_json['secret'])
-    bucket = conn.get_bucket(bucket_name)
+    """
+    Upload a local file, such as an exported .xlsx, to S3 in parts.
+    :param file: str, path to the file
+    :param auth_file_path: str, path to auth file
+    :param bucket_name: str, name of S3 bucket
+    :param s3_file_path: str, path to S3 file
+    :return:
+    """
+    bucket = S3_CONNECTIONS.getBucket(auth_file_path, bucket_name)
     key = bucket.get_key(s3_file_path)
     if key is None:
-        key = Key(bucket)
-        key.key = s3_file_path
+        key = bucket.new_key(s3_file_path)
     elif not overwrite:
         print('Nothing was pushed because %s already exists. To overwrite, use overwrite=True' % s3_file_path)
         return
-    key.set_contents_from_filename(file)
-    conn.close()
+    with open(file, 'rb') as f:
+        uploadPartsToS3(key, iter(lambda: f.read(S3_PART_SIZE), b''))
     if delete_local_version:
         os.remove(file)
@@ -0,0 +1,255 @@
+import sys
+import time
+import shutil
+import tempfile
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+from .df2xl import Workbook, Formula
+
+DATA_KINDS = ('numeric', 'datetime', 'nan_heavy', 'string')
+DEFAULT_CELLS = (1000, 10000, 100000, 1000000)
+
+
+def timeCall(function, *args, **kwargs):
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def peakMemory(function, *args, **kwargs):
+    """Peak memory allocated by Python while running function, in bytes."""
+    tracemalloc.start()
+    try:
+        function(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def syntheticDataFrame(cells, kind, width=10, seed=0):
+    """
+    Build a DataFrame of about the given number of cells.
+    :param cells: int
+    :param kind: str, one of DATA_KINDS
+    :param width: int, number of columns; narrowed for small sizes so that there are at least as many rows
+    :param seed: int
+    :return: pd.DataFrame
+    """
+    assert kind in DATA_KINDS, 'Acceptable kind arguments are %s.' % list(DATA_KINDS)
+    width = max(1, min(width, int(np.sqrt(cells))))
+    height = max(1, cells // width)
+    random = np.random.RandomState(seed)
+    if kind == 'numeric':
+        values = random.rand(height, width) * 1000
+    elif kind == 'datetime':
+        days = random.randint(0, 3650, size=(height, width))
+        values = {x: pd.Timestamp('2010-01-01') + pd.to_timedelta(days[:, x], unit='D') for x in range(width)}
+    elif kind == 'nan_heavy':
+        values = random.rand(height, width)
+        values[random.rand(height, width) < 0.9] = np.nan
+    else:
+        values = random.choice(['north', 'south', 'east', 'west', ''], size=(height, width))
+    df = pd.DataFrame(values)
+    df.columns = ['c%d' % x for x in range(width)]
+    return df
+
+
+def squareDataFrame(cells, seed=0):
+    """Numeric cohort-shaped DataFrame of about the given number of cells, for toRetentionRate."""
+    side = max(2, int(np.sqrt(cells)))
+    return pd.DataFrame(np.triu(np.random.RandomState(seed).rand(side, side) * 1000))
+
+
+def setupAddTable(df, total_row=False):
+    sheet = Workbook('benchmark').addSheet('benchmark')
+    return lambda: sheet.addTable('t', df, total_row=total_row)
+
+
+def setupFormula(df, function):
+    sheet = Workbook('benchmark').addSheet('benchmark')
+    left = sheet.addTable('left', df)
+    right = sheet.addTable('right', df)
+    return lambda: function(left, right)
+
+
+def setupRetentionRate(df):
+    table = Workbook('benchmark').addSheet('benchmark').addTable('cohorts', df)
+    return table.toRetentionRate
+
+
+def setupShift(df):
+    table = Workbook('benchmark').addSheet('benchmark').addTable('t', df)
+    return lambda: table.shift(1, 1)
+
+
+def setupExport(df, csvs=False, constant_memory=False):
+    wb = Workbook('benchmark')
+    sheet = wb.addSheet('benchmark')
+    table = sheet.addTable('t', df, total_row=True)
+    sheet.addTable('ratios', Formula.divide(table, table), relative_position='right')
+    directory = tempfile.mkdtemp()
+    path = directory + '/benchmark.xlsx'
+    if csvs:
+        return lambda: wb.exportAsXLSXandCSVs(path, constant_memory=constant_memory), directory
+    return lambda: wb.exportAsXLSX(path, constant_memory=constant_memory), directory
+
+
+# name: (setup taking a DataFrame and returning the call to measure, whether it needs a cohort-shaped frame)
+BENCHMARK_CASES = {
+    'add_table': (setupAddTable, False),
+    'add_table_total_row': (lambda df: setupAddTable(df, total_row=True), False),
+    'formula_add': (lambda df: setupFormula(df, Formula.add), False),
+    'formula_divide': (lambda df: setupFormula(df, Formula.divide), False),
+    'formula_sum': (lambda df: setupFormula(df, Formula.sum), False),
+    'retention_rate': (setupRetentionRate, True),
+    'shift': (setupShift, False),
+    'export_xlsx': (setupExport, False),
+    'export_xlsx_and_csvs': (lambda df: setupExport(df, csvs=True), False),
+    'export_xlsx_constant_memory': (lambda df: setupExport(df, constant_memory=True), False),
+}
+
+
+def runCase(setup, df, memory=True):
+    """
+    Time one call, and separately measure its peak memory as tracing allocations slows it down.
+    :return: (seconds, peak bytes or NaN)
+    """
+    def measure(measurement):
+        call = setup(df)
+        directory = None
+        if isinstance(call, tuple):
+            call, directory = call
+        try:
+            return measurement(call)
+        finally:
+            if directory is not None:
+                shutil.rmtree(directory, ignore_errors=True)
+    seconds = measure(timeCall)
+    peak = measure(peakMemory) if memory else np.nan
+    return seconds, peak
+
+
+def runBenchmarks(cells=DEFAULT_CELLS, kinds=DATA_KINDS, cases=None, memory=True, path=None, quiet=False):
+    """
+    Time the main paths of the library on synthetic data of increasing size.
+    :param cells: iterable of ints, approximate number of cells in each generated DataFrame
+    :param kinds: iterable of str, kinds of data from DATA_KINDS
+    :param cases: iterable of names from BENCHMARK_CASES, or None for all of them
+    :param memory: bool, if True peak memory is measured as well as time
+    :param path: str, if given the results are saved to it as a csv
+    :param quiet: bool
+    :return: pd.DataFrame with one row per case, kind and size
+    """
+    if cases is None:
+        cases = list(BENCHMARK_CASES)
+    results = []
+    for name in cases:
+        setup, square = BENCHMARK_CASES[name]
+        # Cohort tables are only generated as numbers, the kind of data doesn't change the cost
+        for kind in (['numeric'] if square else kinds):
+            for size in cells:
+                df = squareDataFrame(size) if square else syntheticDataFrame(size, kind)
+                seconds, peak = runCase(setup, df, memory=memory)
+                results.append({
+                    'case': name,
+                    'kind': kind,
+                    'cells': df.size,
+                    'seconds': seconds,
+                    'peak_mb': peak / 2 ** 20,
+                })
+                if quiet is False:
+                    print('%-22s %-10s %9d cells %10.4fs %10.1fMB' % (name, kind, df.size, seconds, peak / 2 ** 20))
+    results = pd.DataFrame(results, columns=['case', 'kind', 'cells', 'seconds', 'peak_mb'])
+    if path is not None:
+        results.to_csv(path, index=False)
+    return results
+
+
+def compareBenchmarks(baseline, current, tolerance=0.2, min_seconds=0.01, quiet=False):
+    """
+    Compare two benchmark runs and flag the measurements that got worse.
+    :param baseline: pd.DataFrame or path to a csv saved by runBenchmarks
+    :param current: pd.DataFrame or path to a csv saved by runBenchmarks
+    :param tolerance: float, relative slowdown or memory growth allowed before a measurement is flagged
+    :param min_seconds: float, timings below this in both runs are too noisy to flag
+    :param quiet: bool
+    :return: pd.DataFrame of both runs side by side, with ratios and a regression flag
+    """
+    if isinstance(baseline, str):
+        baseline = pd.read_csv(baseline)
+    if isinstance(current, str):
+        current = pd.read_csv(current)
+    comparison = pd.merge(baseline, current, on=['case', 'kind', 'cells'], suffixes=('_baseline', '_current'))
+    comparison['seconds_ratio'] = comparison['seconds_current'] / comparison['seconds_baseline']
+    comparison['peak_mb_ratio'] = comparison['peak_mb_current'] / comparison['peak_mb_baseline']
+    slower = (comparison['seconds_ratio'] > 1 + tolerance) & (comparison['seconds_current'] >= min_seconds)
+    # NaN ratios (memory not measured) compare False and are never flagged
+    larger = comparison['peak_mb_ratio'] > 1 + tolerance
+    comparison['regression'] = slower | larger
+    if quiet is False:
+        regressions = comparison[comparison['regression']]
+        if len(regressions) == 0:
+            print('No regressions.')
+        else:
+            print(regressions[['case', 'kind', 'cells', 'seconds_ratio', 'peak_mb_ratio']].to_string(index=False))
+    return comparison
+
+
+def benchmarkBroadcasting(heights=(1000, 2000, 4000, 8000, 16000), width=20, quiet=False):
+    """
+    Time Formula.divide(table, table) on blocks of increasing height, to check that broadcasting scales linearly.
+    :param heights: iterable of ints, number of rows in each block
+    :param width: int, number of columns in each block
+    :param quiet: bool
+    :return: pd.DataFrame of timings, one row per height
+    """
+    results = []
+    for height in heights:
+        wb = Workbook('benchmark')
+        sheet = wb.addSheet('benchmark')
+        numerator = sheet.addTable('numerator', pd.DataFrame(np.random.rand(height, width)))
+        denominator = sheet.addTable('denominator', pd.DataFrame(np.random.rand(height, width)))
+        seconds = timeCall(Formula.divide, numerator, denominator)
+        results.append({'cells': height * width, 'seconds': seconds})
+    results = pd.DataFrame(results).set_index('cells')
+    results['seconds_per_cell'] = results['seconds'] / results.index.values
+    # Ratio of per-cell cost at the largest size to the smallest; stays near 1 when scaling is linear
+    results['relative_cost'] = results['seconds_per_cell'] / results['seconds_per_cell'].iloc[0]
+    if quiet is False:
+        print(results)
+    return results
+
+
+def benchmarkConstantMemory(cells=(100000, 400000, 1600000), kind='numeric', tolerance=2., quiet=False):
+    """
+    Measure the peak memory of constant_memory exports of increasing size, to check that it stays bounded
+    rather than growing with the table.
+    :param cells: iterable of ints, approximate number of cells in each generated DataFrame
+    :param kind: str, one of DATA_KINDS
+    :param tolerance: float, how many times the peak of the smallest export the others may reach before being
+        flagged
+    :param quiet: bool
+    :return: pd.DataFrame of peaks, one row per size, with a flag for the ones over the bound
+    """
+    results = []
+    for size in cells:
+        df = syntheticDataFrame(size, kind)
+        seconds, peak = runCase(BENCHMARK_CASES['export_xlsx_constant_memory'][0], df)
+        results.append({'cells': df.size, 'seconds': seconds, 'peak_mb': peak / 2 ** 20})
+    results = pd.DataFrame(results).set_index('cells')
+    results['relative_peak'] = results['peak_mb'] / results['peak_mb'].iloc[0]
+    results['unbounded'] = results['relative_peak'] > tolerance
+    if quiet is False:
+        print(results)
+        if results['unbounded'].any():
+            print('Peak memory of constant_memory exports grows with their size.')
+    return results
+
+
+if __name__ == '__main__':
+    # python -m package.benchmarks [results.csv [baseline.csv]]
+    results = runBenchmarks(path=sys.argv[1] if len(sys.argv) > 1 else None)
+    if len(sys.argv) > 2:
+        compareBenchmarks(sys.argv[2], results)
@@ -0,0 +1,111 @@
+import os
+import pickle
+import shutil
+import hashlib
+import tempfile
+
+
+def hashKeys(*parts):
+    """Combine strings (e.g. other keys) into one key."""
+    h = hashlib.sha1()
+    for part in parts:
+        h.update(str(part).encode('utf-8'))
+        h.update(b'\x00')
+    return h.hexdigest()
+
+
+class ExportCache():
+    """
+    Content-addressed store for exports, kept in a local directory. Finished .xlsx files are stored under a key
+    hashing everything that went into the workbook, and the prepared row buffers of each sheet under a key
+    hashing the sheet, so that an export can skip whatever hasn't changed since the last one. Entries are
+    evicted least recently used first once the directory grows past max_bytes.
+    """
+
+    def __init__(self, directory, max_bytes=2 ** 30):
+        """
+        :param directory: str, created if it doesn't exist
+        :param max_bytes: int, size the cache is trimmed to after each export
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def _getPath(self, key, suffix):
+        return os.path.join(self.directory, key + suffix)
+
+    def _touch(self, path):
+        # Modification times double as the LRU order, so a hit makes an entry the most recently used
+        try:
+            os.utime(path, None)
+            return True
+        except OSError:
+            return False
+
+    def _store(self, path, write):
+        # Written to a temporary file and renamed into place so that a cache entry is never seen half written
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as f:
+                write(f)
+            os.replace(temporary, path)
+        except BaseException:
+            os.remove(temporary)
+            raise
+
+    def getWorkbook(self, key, path):
+        """
+        Copy the cached .xlsx for key to path.
+        :return: bool, False if there is no such entry
+        """
+        cached = self._getPath(key, '.xlsx')
+        if not self._touch(cached):
+            return False
+        shutil.copyfile(cached, path)
+        return True
+
+    def putWorkbook(self, key, path):
+        with open(path, 'rb') as source:
+            self._store(self._getPath(key, '.xlsx'), lambda f: shutil.copyfileobj(source, f))
+
+    def getSheet(self, key):
+        """
+        :return: the cached export buffers of a sheet, or None
+        """
+        cached = self._getPath(key, '.sheet')
+        if not self._touch(cached):
+            return None
+        try:
+            with open(cached, 'rb') as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def putSheet(self, key, buffers):
+        self._store(self._getPath(key, '.sheet'), lambda f: pickle.dump(buffers, f, pickle.HIGHEST_PROTOCOL))
+
+    def getSize(self):
+        return sum(entry.stat().st_size for entry in os.scandir(self.directory) if entry.is_file())
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and (entry.name.endswith('.xlsx') or entry.name.endswith('.sheet')):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        size = sum(entry[1] for entry in entries)
+        for mtime, entry_size, path in sorted(entries):
+            if size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= entry_size
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.is_file():
+                os.remove(entry.path)
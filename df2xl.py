@@ -2,18 +2,69 @@ import numpy as np
 import pandas as pd
 import datetime as dt
 import xlsxwriter
-from xlsxwriter.utility import xl_rowcol_to_cell
+from xlsxwriter.utility import xl_col_to_name, xl_cell_to_rowcol
 from xlsx2csv import Xlsx2csv
-from collections import OrderedDict
-import openpyxl
+from collections import OrderedDict, namedtuple
 import csv
 import os
-
-from .Utils import assertType, isIntegerLike, isNumerical, isDatetimeLike
+import heapq
+import itertools
+import hashlib
+import warnings
+import bisect
+import pickle
+import tempfile
+import threading
+import collections.abc
+import numbers
+from concurrent.futures import ThreadPoolExecutor
+
+from .instrumentation import Instrumentation
+from .cache import hashKeys
+from .Utils import assertType, isIntegerLike, isNumerical, numericalMask, isDatetimeLike, toExcelSerialDates, \
+    fromExcelSerialDate, contiguousRuns
 
 #TODO: Assertions on types of arguments
 
 
+# Cells prepared at a time when a table is exported row by row, as for constant_memory exports and csvs
+EXPORT_BLOCK_CELLS = 2 ** 16
+
+# Column kinds used when exporting; a column is classified once from its dtype rather than per value
+EMPTY = 'empty'
+NUMBER = 'number'
+DATETIME = 'datetime'
+STRING = 'string'
+FORMULA = 'formula'
+OBJECT = 'object'
+
+# A1 column letters for every column Excel allows, so references don't recompute them per cell
+COLUMN_LETTERS = [xl_col_to_name(x) for x in range(16384)]
+
+# Part of every export cache key; bump it whenever a change to the library changes what gets written
+EXPORT_CACHE_VERSION = 3
+
+ExportColumn = namedtuple('ExportColumn', ['kind', 'data', 'valid', 'style_prefix'])
+
+
+class RenderCache():
+    """
+    Tracks the layout generation that rendered references are valid for. Any move of a Location, and any edit of
+    a Formula or Cell after it is built, bumps the generation, which invalidates every memoized rendering at once.
+    Edits also bump edits, which moving tables doesn't: only edits change what formulas refer to, relative to
+    the tables at either end.
+    """
+
+    generation = 0
+    edits = 0
+
+    @classmethod
+    def invalidate(cls, edit=False):
+        cls.generation += 1
+        if edit:
+            cls.edits += 1
+
+
 def asRow(s):
     assert type(s) == pd.Series
     return pd.DataFrame(s).transpose()
@@ -23,6 +74,88 @@ def asColumn(s):
     return pd.DataFrame(s)
 
 
+def upperTriangle(height, width):
+    """
+    Coordinates of the cells of a cohort triangle: those on or above the diagonal, in rows that have a diagonal.
+    :return: (rows, columns) arrays, row by row
+    """
+    return np.triu_indices(min(height, width), m=width)
+
+
+def upperTriangleMask(shape, rows, cols):
+    mask = np.zeros(shape, dtype=bool)
+    mask[rows, cols] = True
+    return mask
+
+
+def annualAnniversaries(cohorts):
+    """
+    The dates each cohort renews on, as pd.date_range(cohort, max(cohorts), freq='12MS') gives them, computed for
+    all cohorts at once with month arithmetic.
+    :param cohorts: pd.DatetimeIndex
+    :return: (cohort positions, years since the first anniversary, anniversary dates), one entry per anniversary,
+        grouped by cohort in order
+    """
+    months = np.asarray(cohorts.year * 12 + cohorts.month - 1, dtype=np.int64)
+    time_of_day = np.asarray(cohorts - cohorts.normalize(), dtype='timedelta64[ns]')
+    # Dates that aren't month starts roll forward to the next one
+    first_months = months + (np.asarray(cohorts.day) != 1)
+    end = cohorts.max()
+    end_month = end.year * 12 + end.month - 1
+    last_years = (end_month - first_months) // 12
+    # In the last month the anniversary only counts if its time of day isn't past the end
+    end_start = np.datetime64(pd.Timestamp(end.year, end.month, 1)) + time_of_day
+    last_years -= ((first_months + 12 * last_years == end_month) & (end_start > np.datetime64(end))).astype(np.int64)
+    counts = np.maximum(last_years + 1, 0)
+    cohort_rows = np.repeat(np.arange(len(cohorts)), counts)
+    starts = np.cumsum(counts) - counts
+    years = np.arange(counts.sum()) - np.repeat(starts, counts)
+    anniversary_months = first_months[cohort_rows] + 12 * years
+    anniversaries = (anniversary_months - 1970 * 12).astype('datetime64[M]').astype('datetime64[ns]') \
+        + time_of_day[cohort_rows]
+    return cohort_rows, years, anniversaries
+
+
+def waterfallLayout(cohorts, cohort_rows, anniversaries):
+    """
+    Place anniversaries in a waterfall the way DataFrame.from_dict(orient='index') lays out a dict of cohort ->
+    {anniversary: value}: columns in order of first appearance, and rows in order of first appearance going
+    through the columns in turn.
+    :return: (row of each entry, row labels, column of each entry, column labels)
+    """
+    column_values, first, columns = np.unique(anniversaries, return_index=True, return_inverse=True)
+    column_order = np.argsort(first, kind='stable')
+    column_rank = np.empty(len(column_order), dtype=np.int64)
+    column_rank[column_order] = np.arange(len(column_order))
+    columns = column_rank[columns]
+    by_column = cohort_rows[np.argsort(columns, kind='stable')]
+    row_values, first = np.unique(by_column, return_index=True)
+    row_order = row_values[np.argsort(first, kind='stable')]
+    row_rank = np.empty(len(cohorts), dtype=np.int64)
+    row_rank[row_order] = np.arange(len(row_order))
+    return row_rank[cohort_rows], cohorts[row_order], columns, pd.DatetimeIndex(column_values[column_order])
+
+
+def cleanOperand(arg):
+    """Formula operand as it is stored: numbers become the strings they're written as."""
+    return str(arg) if isNumerical(arg) else arg
+
+
+def cleanOperands(values):
+    """
+    cleanOperand over a column, classified from its dtype so that only object columns are checked value by value.
+    :param values: 1D array
+    :return: 1D object array
+    """
+    numerical = numericalMask(values)
+    values = np.asarray(values).astype(object, copy=False)
+    if not numerical.any():
+        return values
+    values = values.copy()
+    values[numerical] = [str(v) for v in values[numerical]]
+    return values
+
+
 class Location:
 
     """A point identified by (x,y) coordinates.
@@ -44,6 +177,8 @@ class Location:
 
     #TODO: Validate arguments to __init__
 
+    __slots__ = ('x', 'y', 'sheet')
+
     def __init__(self, x, y, sheet):
         self._setX(x)
         self._setY(y)
@@ -62,7 +197,8 @@ class Location:
         self.y = y
 
     def _setSheet(self, s):
-        assertType(s, Sheet)
+        if __debug__:
+            assertType(s, Sheet)
         self.sheet = s
 
     def getSheet(self):
@@ -105,6 +241,7 @@ class Location:
         """Reset x & y coordinates."""
         self._setX(x)
         self._setY(y)
+        RenderCache.invalidate()
 
     def move_inplace(self, p):
         '''Move to new (x+dx,y+dy).
@@ -114,6 +251,7 @@ class Location:
         '''
         self._setX(self.getX() + p.x)
         self._setY(self.getY() + p.y)
+        RenderCache.invalidate()
 
     def move(self, p):
         c = self.copy()
@@ -131,67 +269,128 @@ class Location:
     #     self._setY(self.getY() + dy)
 
     def toReference(self):
-        return xl_rowcol_to_cell(self.getY(), self.getX())
+        return COLUMN_LETTERS[self.getX()] + str(self.getY() + 1)
 
 
 class Cell():
+    """
+    A value at a location. Cells belonging to a Table keep their location relative to the table's data origin,
+    so moving the table moves them without touching each cell. getLocation() and _setLocation() deal in absolute
+    Locations either way; for table cells getLocation() returns a new Location, so move the cell itself with
+    move_inplace() or _setLocation() rather than the Location it returns.
+    """
 
-    def __init__(self, location, data):
-        assertType(location, Location)
-        self._setData(data)
-        self._setLocation(location)
+    __slots__ = ('data', 'location', 'table', 'rendered')
+
+    def __init__(self, location, data, table=None):
+        if __debug__:
+            assertType(location, Location)
+        self.rendered = None
+        self.table = table
+        self.data = data
+        self.location = location
 
     def __repr__(self):
         return 'Cell(' + self.toDataString() + ')'
 
     def _setData(self, data):
         self.data = data
+        self.rendered = None
 
     def getData(self):
         return self.data
 
     def _setLocation(self, location):
+        if self.table is not None:
+            x, y = self.table.getDataOrigin()
+            location = Location(location.getX() - x, location.getY() - y, location.getSheet())
+        # Formulas referring to the cell have memoized its old reference
         self.location = location
+        self.rendered = None
+        RenderCache.invalidate(edit=True)
 
     def getLocation(self):
-        return self.location
+        if self.table is None:
+            return self.location
+        return Location(self.getX(), self.getY(), self.getSheet())
+
+    def getTable(self):
+        return self.table
+
+    def getSheet(self):
+        return self.location.sheet
 
     def copy(self):
-        return Cell(self.getLocation(), self.getData())
+        return Cell(self.location, self.getData(), self.table)
 
     def move_inplace(self, p):
-        self.getLocation().move_inplace(p)
+        self.location.move_inplace(p)
+        RenderCache.invalidate(edit=True)
 
     def getX(self):
-        return self.getLocation().getX()
+        if self.table is None:
+            return self.location.x
+        return self.table.getDataOrigin()[0] + self.location.x
 
     def getY(self):
-        return self.getLocation().getY()
+        if self.table is None:
+            return self.location.y
+        return self.table.getDataOrigin()[1] + self.location.y
 
     def toReferenceString(self, sheet):
-        prepend = ("'%s'!" % self.getLocation().getSheet().getId()) if sheet != self.getLocation().getSheet() else ''
-        return prepend + self.getLocation().toReference()
+        # Memoized for the last target sheet until the layout changes. The memo is read once, as it may be read
+        # from several threads at a time
+        rendered = self.rendered
+        if rendered is not None and rendered[0] == RenderCache.generation and rendered[1] is sheet:
+            return rendered[2]
+        prepend = ("'%s'!" % self.getSheet().getId()) if sheet != self.getSheet() else ''
+        retval = prepend + COLUMN_LETTERS[self.getX()] + str(self.getY() + 1)
+        self.rendered = (RenderCache.generation, sheet, retval)
+        return retval
 
     def toDataString(self):
         if isinstance(self.getData(), Formula):
-            return self.getData().toReferenceString(self.getLocation().getSheet())
+            return self.getData().toReferenceString(self.getSheet())
         else:
             return str(self.getData())
 
     def toFinalString(self):
-        if type(self.getData()) == Formula:
+        if isinstance(self.getData(), Formula):
             prepend = '='
         else:
             prepend = ''
         return prepend + self.toDataString()
 
+    def evaluate(self):
+        if isinstance(self.getData(), Formula):
+            return self.getData().evaluate()
+        return self.getData()
 
 
 class Function():
+    """
+    An operator or Excel function. Functions are immutable and interned, so Function(string, position) always
+    returns the same instance for the same arguments and formulas share it rather than each holding a copy.
+    """
 
-    def __init__(self, string, position):
-        self._setString(string)
-        self._setPosition(position)
+    interned = {}
+    # Held while a new Function is made, so that two threads making the same one don't end up with two instances
+    interning = threading.Lock()
+
+    def __new__(cls, string, position):
+        function = cls.interned.get((string, position))
+        if function is None:
+            with cls.interning:
+                function = cls.interned.get((string, position))
+                if function is None:
+                    function = super().__new__(cls)
+                    function._setString(string)
+                    function._setPosition(position)
+                    cls.interned[(string, position)] = function
+        return function
+
+    def __reduce__(self):
+        return Function, (self.string, self.position)
 
     def __repr__(self):
         return self.toString()
@@ -260,17 +459,73 @@ class Function():
         """
 
         assert df1.shape == df2.shape
+        return self._mapFunctionToBlocks(
+            OperandBlock.fromArg(df1), OperandBlock.fromArg(df2), parentheses=parentheses).toDF()
 
-        retval = pd.DataFrame(index=df1.index, columns=df1.columns)
+    def _mapFunctionToBlocks(self, left, right, parentheses=False):
+        """
+        Broadcast left against right following the row/column/scalar rules of apply, and build the resulting
+        block column by column. Where both sides are uniform down a column the whole column becomes a single
+        FormulaTemplate; otherwise a formula is built per cell.
 
-        for col in range(len(df1.columns)):
-            for row in range(len(df1)):
-                retval[retval.columns[col]].iloc[row] = Formula(
-                    self,
-                    df1[df1.columns[col]].iloc[row],
-                    df2[df2.columns[col]].iloc[row],
-                    parentheses=parentheses)
-        return retval
+        :param left: OperandBlock or scalar, the accumulated earlier arguments
+        :param right: OperandBlock or scalar, the next argument
+        :param parentheses:
+        :return: OperandBlock or Formula
+        """
+
+        if not isinstance(left, OperandBlock) and not isinstance(right, OperandBlock):
+            return Formula(self, left, right, parentheses=parentheses)
+        # The mode says how a side's columns line up with the columns of the result
+        if not isinstance(right, OperandBlock):
+            shape, index, columns = left.shape, left.index, left.columns
+            left_mode, right_mode = 'full', 'scalar'
+        elif not isinstance(left, OperandBlock):
+            shape, index, columns = right.shape, right.index, right.columns
+            left_mode, right_mode = 'scalar', 'full'
+        elif right.isRow() or right.isColumn():
+            shape, index, columns = left.shape, left.index, left.columns
+            left_mode = 'full'
+            if (right.isRow() and left.isColumn()) or (right.isColumn() and left.isRow()):
+                assert right.shape[::-1] == left.shape
+                right_mode = 'transposed'
+            elif right.isRow():
+                assert right.shape[1] == left.shape[1]
+                right_mode = 'row'
+            else:
+                assert right.shape[0] == left.shape[0]
+                right_mode = 'column'
+        else:
+            shape, right_mode = right.shape, 'full'
+            if left.isRow():
+                assert left.shape[1] == right.shape[1]
+                index, columns, left_mode = pd.RangeIndex(right.shape[0]), left.columns, 'row'
+            elif left.isColumn():
+                assert left.shape[0] == right.shape[0]
+                index, columns, left_mode = left.index, pd.RangeIndex(right.shape[1]), 'column'
+            else:
+                assert left.shape == right.shape, 'Operations on non-vector matrices of different shape are ambiguous'
+                index, columns, left_mode = left.index, left.columns, 'full'
+
+        height = shape[0]
+        column_values = []
+        leaves = {}
+        for j in range(shape[1]):
+            if height > 1:
+                left_uniform, left_expression = OperandBlock.sideExpression(left, left_mode, j)
+                right_uniform, right_expression = OperandBlock.sideExpression(right, right_mode, j)
+                if left_uniform and right_uniform:
+                    leaves[j] = FormulaTemplate(Formula(self, left_expression, right_expression, parentheses=parentheses))
+                    column_values.append(None)
+                    continue
+            pairs = zip(
+                OperandBlock.sideColumn(left, left_mode, j, height),
+                OperandBlock.sideColumn(right, right_mode, j, height))
+            values = np.empty(height, dtype=object)
+            values[:] = [Formula.fromCleanArgs(self, (l, r), parentheses=parentheses) for l, r in pairs]
+            leaves[j] = None
+            column_values.append(values)
+        return OperandBlock(index, columns, shape, column_values=column_values, leaves=leaves)
 
     def apply(self, *args, parentheses=False):
         """
@@ -280,88 +535,194 @@ class Function():
         :return:
         """
 
-        def apply_helper(*args, joiner=None):
-            args = list(args)
-            for arg in range(len(args)):
-                # This is contentious, but it's ambiguous if a Series should be a column or a row; if you wanna
-                # use a row/column, slice it from the CellDF and then use asRow() or asColumn().
-                assert type(args[arg]) != pd.Series
-                if type(args[arg]) == Table:
-                    args[arg] = args[arg].getCellDF()
-            current = args[0]
-            if len(args) == 1:
-                return current
-            else:
-                # If dataframe is 1x1, just treat it as a cell since that is probably the expected behavior
-                if isinstance(current, pd.DataFrame) and current.shape == (1, 1):
-                    current = current[current.columns[0]].iloc[0]
-                next = apply_helper(*args[1:], joiner=joiner)
-                if isinstance(current, pd.DataFrame):
-                    # Columns have shape[1]=1, rows have shape[0] = 1
-                    if isinstance(next, pd.DataFrame):
-                        if current.shape[0] == 1:
-                            if next.shape[1] == 1:
-                                return joiner._mapFunctionToDFs(next, pd.DataFrame(current).transpose())
-                            else:
-                                return joiner._mapFunctionToDFs(
-                                    next,
-                                    pd.concat([pd.DataFrame(current)]*next.shape[0], axis=0).reset_index(drop=True))
-                        elif current.shape[1] == 1:
-                            if next.shape[0] == 1:
-                                return joiner._mapFunctionToDFs(next, current.transpose())
-                            else:
-                                current_formatted = pd.concat([pd.DataFrame(current)]*next.shape[1], axis=1)
-                                current_formatted.columns = np.arange(len(current_formatted.columns))
-                                return joiner._mapFunctionToDFs(next, current_formatted)
-                        else:
-                            if next.shape[0] == 1:
-                                return joiner._mapFunctionToDFs(
-                                    pd.concat([pd.DataFrame(next)]*current.shape[0], axis=0).reset_index(drop=True),
-                                    current)
-                            elif next.shape[1] == 1:
-                                next_formatted = pd.concat([pd.DataFrame(next)]*current.shape[1], axis=1)
-                                next_formatted.columns = np.arange(len(next_formatted.columns))
-                                return joiner._mapFunctionToDFs(next_formatted, current)
-                            else:
-                                assert current.shape == next.shape,\
-                                    'Operations on non-vector matrices of different shape are ambiguous'
-                                return joiner._mapFunctionToDFs(next, current)
-                    else:
-                        next_formatted = pd.DataFrame(index=current.index, columns=current.columns).fillna(next)
-                        return joiner._mapFunctionToDFs(next_formatted, current)
-                else:
-                    if isinstance(next, pd.DataFrame):
-                        current_formatted = pd.DataFrame(index=next.index, columns=next.columns).fillna(current)
-                        return joiner._mapFunctionToDFs(next, current_formatted)
-                    else:
-                        return Formula(joiner, next, current)
-
-
         if self.getPosition() == 'between':
             joiner = self
         else:
             joiner = Function(',', 'between')
-        helper_out = apply_helper(*args[::-1], joiner=joiner)
-        if isinstance(helper_out, Formula):
-            helper_out._setParentheses(parentheses=parentheses)
-        elif isinstance(helper_out, pd.DataFrame):
-            for col in helper_out.columns:
-                for row in helper_out.index:
-                    if self.getPosition() == 'before':
-                        helper_out[col].ix[row] = Formula(self, helper_out[col].ix[row], parentheses=parentheses)
-                    else:
-                        helper_out[col].ix[row]._setParentheses(parentheses=parentheses)
-        return helper_out
+
+        blocks = []
+        for arg in range(len(args)):
+            # This is contentious, but it's ambiguous if a Series should be a column or a row; if you wanna
+            # use a row/column, slice it from the CellDF and then use asRow() or asColumn().
+            assert type(args[arg]) != pd.Series
+            block = OperandBlock.fromArg(args[arg])
+            # If a later dataframe is 1x1, just treat it as a cell since that is probably the expected behavior
+            if arg > 0 and isinstance(block, OperandBlock) and block.shape == (1, 1):
+                block = block.getValue(0, 0)
+            blocks.append(block)
+
+        if len(blocks) == 1:
+            current = blocks[0]
+            if isinstance(current, OperandBlock):
+                current = current.map(lambda arg: Formula.fromCleanArgs(self, (arg,), parentheses=parentheses))
+            else:
+                current = Formula(self, current, parentheses=parentheses)
+        else:
+            current = blocks[0]
+            for arg in range(1, len(blocks)):
+                current = joiner._mapFunctionToBlocks(current, blocks[arg])
+            if self.getPosition() == 'before':
+                if isinstance(current, OperandBlock):
+                    current = current.map(lambda arg: Formula.fromCleanArgs(self, (arg,), parentheses=parentheses))
+                else:
+                    current = Formula(self, current, parentheses=parentheses)
+            elif parentheses:
+                if isinstance(current, OperandBlock):
+                    current.setParentheses(parentheses)
+                else:
+                    current._setParentheses(parentheses=parentheses)
+
+        if isinstance(current, OperandBlock):
+            return current.toDF()
+        return current
+
+
+class OperandBlock():
+    """
+    A 2D block of formula operands (cells, formulas or values) and the labels it carries, held column by column.
+
+    A column that is uniform down its rows also has a leaf, a RowCursor or FormulaTemplate describing the whole
+    column, and its values are only built from the leaf if something needs them cell by cell.
+    """
+
+    def __init__(self, index, columns, shape, column_values=None, leaves=None):
+        self.index = index
+        self.columns = columns
+        self.shape = shape
+        self.column_values = column_values if column_values is not None else [None] * shape[1]
+        # Column position -> leaf, or None for columns that aren't uniform; columns not in here haven't been scanned
+        self.leaves = leaves if leaves is not None else {}
+
+    @classmethod
+    def fromArg(cls, arg):
+        """Wrap a Table or DataFrame argument as a block; anything else is a scalar operand and is returned as is."""
+        if type(arg) == Table:
+            store = arg.getCellStore()
+            shape = (store.getHeight(), store.getWidth())
+            leaves = {x: RowCursor(store.getCell(x, 0)) for x in range(shape[1])} if shape[0] > 0 else {}
+            return cls(store.getIndex(), store.columns, shape, leaves=leaves)
+        if isinstance(arg, pd.DataFrame):
+            # Numbers are turned into operand strings here, a column at a time and by dtype, so that every value a
+            # block holds is already clean and formulas can be built from them with Formula.fromCleanArgs. Columns
+            # are taken one by one so that an int column isn't upcast by a float column next to it
+            column_values = []
+            for j in range(arg.shape[1]):
+                series = arg.iloc[:, j]
+                if series.dtype.kind in 'iuf':
+                    column = np.empty(arg.shape[0], dtype=object)
+                    column[:] = [str(v) for v in widenFloats(series.values).tolist()]
+                else:
+                    column = cleanOperands(series.astype(object).values)
+                column_values.append(column)
+            return cls(arg.index, arg.columns, arg.shape, column_values=column_values)
+        return arg
+
+    @staticmethod
+    def scalarArray(value):
+        # 0-d object array so that a scalar broadcasts against a block without being tiled
+        arr = np.empty((), dtype=object)
+        arr[()] = value
+        return arr
+
+    @staticmethod
+    def sideExpression(side, mode, j):
+        """
+        Describe one side of a broadcast down result column j.
+        :return: (uniform, expression) where expression is a constant operand, a RowCursor or a template Formula
+        """
+        if mode == 'scalar':
+            return True, side
+        if mode == 'row':
+            return True, side.getValue(0, j)
+        if mode == 'transposed':
+            return False, None
+        leaf = side.getLeaf(0 if mode == 'column' else j)
+        if leaf is None:
+            return False, None
+        return True, leaf.getExpression()
+
+    @staticmethod
+    def sideColumn(side, mode, j, height):
+        """Values of one side of a broadcast for result column j, one per result row."""
+        if mode == 'scalar':
+            return np.broadcast_to(OperandBlock.scalarArray(cleanOperand(side)), (height,))
+        if mode == 'row':
+            return np.broadcast_to(OperandBlock.scalarArray(side.getValue(0, j)), (height,))
+        if mode == 'transposed':
+            return side.getValues().T[:, j]
+        return side.getColumn(0 if mode == 'column' else j)
+
+    def isRow(self):
+        return self.shape[0] == 1
+
+    def isColumn(self):
+        return self.shape[1] == 1
+
+    def getLeaf(self, j):
+        if j not in self.leaves:
+            self.leaves[j] = scanColumnLeaf(self.getColumn(j))
+        return self.leaves[j]
+
+    def getColumn(self, j):
+        if self.column_values[j] is None:
+            leaf = self.leaves[j]
+            values = np.empty(self.shape[0], dtype=object)
+            values[:] = [leaf.atRow(row) for row in range(self.shape[0])]
+            self.column_values[j] = values
+        return self.column_values[j]
+
+    def getValue(self, i, j):
+        return self.getColumn(j)[i]
+
+    def getValues(self):
+        values = np.empty(self.shape, dtype=object)
+        for j in range(self.shape[1]):
+            values[:, j] = self.getColumn(j)
+        return values
+
+    def map(self, function):
+        column_values = []
+        leaves = {}
+        for j in range(self.shape[1]):
+            leaf = self.getLeaf(j) if self.shape[0] > 1 else None
+            if leaf is not None:
+                leaves[j] = FormulaTemplate(function(leaf.getExpression()))
+                column_values.append(None)
+            else:
+                values = np.empty(self.shape[0], dtype=object)
+                values[:] = [function(arg) for arg in self.getColumn(j)]
+                leaves[j] = None
+                column_values.append(values)
+        return OperandBlock(self.index, self.columns, self.shape, column_values=column_values, leaves=leaves)
+
+    def setParentheses(self, parentheses):
+        """Set parentheses on every formula of a block built by _mapFunctionToBlocks or map."""
+        for j in range(self.shape[1]):
+            leaf = self.leaves.get(j)
+            if isinstance(leaf, FormulaTemplate):
+                leaf.formula._setParentheses(parentheses=parentheses)
+                leaf.rendered = None
+            else:
+                for formula in self.getColumn(j):
+                    formula._setParentheses(parentheses=parentheses)
+
+    def toDF(self):
+        return pd.DataFrame(self.getValues(), index=self.index, columns=self.columns)
 
 
 class Formula():
 
+    __slots__ = ('function', 'args', 'parentheses', 'rendered')
+
     def __init__(self, function, *args, parentheses=False):
         # for arg in args:
         #     assert isinstance(arg, CellReference) or isinstance(arg, Formula)
-        self._setFunction(function)
-        self._setArgs(*args)
-        self._setParentheses(parentheses)
+        if __debug__:
+            assertType(function, Function)
+        self.rendered = None
+        self.function = function
+        self.args = [cleanOperand(arg) for arg in args]
+        self.parentheses = parentheses
 
     def __repr__(self):
         return self.toFinalString(None)
@@ -408,34 +769,55 @@ class Formula():
         return if_func.apply(conditional, true, false, parentheses=parentheses)
 
     def _setFunction(self, function):
-        assertType(function, Function)
+        if __debug__:
+            assertType(function, Function)
         self.function = function
+        self._invalidate()
 
     def getFunction(self):
         return self.function
 
     def _setArgs(self, *args):
-        cleaned_args = []
-        for arg in args:
-            if isNumerical(arg):
-                cleaned_args.append(str(arg))
-            else:
-                cleaned_args.append(arg)
-        self.args = cleaned_args
+        self.args = [cleanOperand(arg) for arg in args]
+        self._invalidate()
+
+    def _invalidate(self):
+        # Formulas built on this one have memoized its old rendering, so every memo is dropped rather than just
+        # this formula's
+        self.rendered = None
+        RenderCache.invalidate(edit=True)
+
+    @classmethod
+    def fromCleanArgs(cls, function, args, parentheses=False):
+        """
+        Build a formula from arguments that have already been through cleanOperand(s), skipping the per-argument
+        checks of the constructor. Used where operands are cleaned a column at a time.
+        """
+        formula = cls.__new__(cls)
+        formula.function = function
+        formula.args = list(args)
+        formula.parentheses = parentheses
+        formula.rendered = None
+        return formula
 
     def getArgs(self):
         return self.args
 
     def _setParentheses(self, parentheses):
         self.parentheses = parentheses
+        self._invalidate()
 
     def getParentheses(self):
         return self.parentheses
 
     def toReferenceString(self, sheet=None):
+        # Memoized for the last target sheet until the layout changes, so shared subformulas render once
+        rendered = self.rendered
+        if rendered is not None and rendered[0] == RenderCache.generation and rendered[1] is sheet:
+            return rendered[2]
 
         def toAppropriateString(arg):
-            if isinstance(arg, (Cell, Function, Formula)):
+            if isinstance(arg, (Cell, Function, Formula, RowCursor, TemplateCursor)):
                 return arg.toReferenceString(sheet)
             else:
                 return arg
@@ -446,13 +828,895 @@ class Formula():
         else:
             retval = '%s' % self.getFunction().toReferenceString().join(args)
         if self.getParentheses():
-            return '(%s)' % retval
-        else:
-            return retval
+            retval = '(%s)' % retval
+        self.rendered = (RenderCache.generation, sheet, retval)
+        return retval
 
     def toFinalString(self, sheet):
         return '=' + self.toReferenceString(sheet)
 
+    def evaluate(self):
+        """
+        Compute the value of the formula from the cells it references, for the functions in FORMULA_EVALUATORS.
+        :return: value, or an Excel error string such as '#DIV/0!'
+        """
+        function = self.getFunction().toString()
+        if function not in FORMULA_EVALUATORS:
+            return '#NAME?'
+        if function == ':':
+            return evaluateRange(*self.getArgs())
+        return FORMULA_EVALUATORS[function]([evaluateOperand(arg) for arg in self.getArgs()])
+
+
+def evaluateOperand(arg):
+    """Value of a formula argument: cells and formulas are evaluated, numbers kept as _setArgs stored them."""
+    if isinstance(arg, (Cell, Formula)):
+        return arg.evaluate()
+    if isinstance(arg, RowCursor):
+        return arg.cell.evaluate()
+    if isinstance(arg, TemplateCursor):
+        return arg.atRow(0).evaluate()
+    if isinstance(arg, str):
+        try:
+            return float(arg)
+        except ValueError:
+            return arg
+    return arg
+
+
+def evaluateRange(top_left, bottom_right):
+    """Values of the cells in a range, as a flat list. Only ranges within a single table can be evaluated."""
+    if isinstance(top_left, RowCursor):
+        top_left = top_left.cell
+    if isinstance(bottom_right, RowCursor):
+        bottom_right = bottom_right.cell
+    if type(top_left) != Cell or type(bottom_right) != Cell or top_left.table is None \
+            or top_left.table is not bottom_right.table:
+        return '#REF!'
+    store = top_left.table.getCellStore()
+    values = []
+    for y in range(top_left.location.y, bottom_right.location.y + 1):
+        for x in range(top_left.location.x, bottom_right.location.x + 1):
+            value = store.getData(x, y)
+            values.append(value.evaluate() if isinstance(value, Formula) else value)
+    return values
+
+
+def toEvaluationNumber(value):
+    """Number a value counts as in arithmetic, as Excel treats blanks as 0. Raises ValueError if it isn't one."""
+    if value is None or (isinstance(value, float) and not np.isfinite(value)):
+        return 0
+    if isinstance(value, (bool, np.bool_)):
+        return int(value)
+    if isNumerical(value):
+        return value
+    raise ValueError(value)
+
+
+def flattenEvaluated(values):
+    flat = []
+    for value in values:
+        if isinstance(value, list):
+            flat.extend(flattenEvaluated(value))
+        else:
+            flat.append(value)
+    return flat
+
+
+def evaluateArithmetic(operation):
+    def evaluator(values):
+        for value in values:
+            if isinstance(value, str) and value.startswith('#'):
+                return value
+        try:
+            numbers = [toEvaluationNumber(value) for value in values]
+        except ValueError:
+            return '#VALUE!'
+        result = numbers[0]
+        for number in numbers[1:]:
+            try:
+                result = operation(result, number)
+            except ZeroDivisionError:
+                return '#DIV/0!'
+        return result
+    return evaluator
+
+
+def evaluateDivision(a, b):
+    if b == 0:
+        raise ZeroDivisionError
+    return a / b
+
+
+def evaluateAggregate(aggregate):
+    def evaluator(values):
+        values = flattenEvaluated(values)
+        for value in values:
+            if isinstance(value, str) and value.startswith('#'):
+                return value
+        # Like Excel, blanks and text in the arguments are skipped
+        numbers = [value for value in values if isNumerical(value) and np.isfinite(value)]
+        return aggregate(numbers)
+    return evaluator
+
+
+def evaluateAverage(numbers):
+    if len(numbers) == 0:
+        return '#DIV/0!'
+    return sum(numbers) / len(numbers)
+
+
+def evaluateIf(values):
+    conditional, true, false = (values + [False, False])[:3]
+    if isinstance(conditional, str):
+        return '#VALUE!'
+    return true if conditional else false
+
+
+def evaluateReference(values):
+    if len(values) == 1:
+        return values[0]
+    return '#VALUE!'
+
+
+FORMULA_EVALUATORS = {
+    '+': evaluateArithmetic(lambda a, b: a + b),
+    '-': evaluateArithmetic(lambda a, b: a - b),
+    '*': evaluateArithmetic(lambda a, b: a * b),
+    '/': evaluateArithmetic(evaluateDivision),
+    '=': lambda values: all(value == values[0] for value in values[1:]),
+    '': evaluateReference,
+    ':': None,
+    'SUM': evaluateAggregate(sum),
+    'AVERAGE': evaluateAggregate(evaluateAverage),
+    'IF': evaluateIf,
+}
+
+
+class PooledFormula(Formula):
+    """A formula shared through a FormulaPool. Editing it would edit every cell sharing it, so it can't be edited."""
+
+    __slots__ = ()
+
+    def _refuseEdit(self, *args):
+        raise TypeError('Pooled formulas are shared and can\'t be modified; build a new Formula instead.')
+
+    _setFunction = _setArgs = _setParentheses = _refuseEdit
+
+
+class FormulaPool():
+    """
+    Hash-consing for formulas. Formulas built or interned through a pool are shared: structurally identical
+    formulas, e.g. the same SUM over a range built separately for many cells, become one node, so memory and
+    rendering grow with the number of distinct expressions rather than with the number of cells. Operands are
+    identical if they are the same Cell, the same interned formula or equal constants.
+
+    Pooled formulas are shared, so they are PooledFormulas, which can't be modified after they are made.
+    """
+
+    def __init__(self):
+        self.nodes = {}
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def formula(self, function, *args, parentheses=False):
+        """Pooled equivalent of Formula(function, *args, parentheses=parentheses)."""
+        if __debug__:
+            assertType(function, Function)
+        args = tuple(self.intern(cleanOperand(arg)) for arg in args)
+        key = (function, parentheses) + args
+        try:
+            node = self.nodes.get(key)
+        except TypeError:
+            # Unhashable operands can't be matched, so the formula isn't pooled
+            return Formula.fromCleanArgs(function, args, parentheses=parentheses)
+        if node is None:
+            node = PooledFormula.fromCleanArgs(function, args, parentheses=parentheses)
+            self.nodes[key] = node
+        return node
+
+    def intern(self, arg):
+        """
+        Shared node for a formula, interning its subformulas bottom up. Anything else, including template rows,
+        is returned as is.
+        """
+        if type(arg) != Formula:
+            return arg
+        return self.formula(arg.getFunction(), *arg.getArgs(), parentheses=arg.getParentheses())
+
+    def internDF(self, df):
+        """Intern every formula of a DataFrame, e.g. one built by a Formula classmethod, before it's added as a table."""
+        values = df.values.astype(object)
+        for j in range(values.shape[1]):
+            values[:, j] = [self.intern(arg) for arg in values[:, j]]
+        return pd.DataFrame(values, index=df.index, columns=df.columns)
+
+
+class RowCursor():
+    """Leaf of a formula template: a table cell that steps down one row for every row of the template."""
+
+    __slots__ = ('cell',)
+
+    def __init__(self, cell):
+        self.cell = cell
+
+    def __repr__(self):
+        return 'RowCursor(%s)' % self.cell.toReferenceString(None)
+
+    def getExpression(self):
+        return self
+
+    def atRow(self, row):
+        if row == 0:
+            return self.cell
+        return self.cell.getTable().getCellStore().getCell(self.cell.location.x, self.cell.location.y + row)
+
+    def shifted(self, rows):
+        return RowCursor(self.atRow(rows))
+
+    def toReferenceString(self, sheet=None):
+        return self.cell.toReferenceString(sheet)
+
+
+class TemplateCursor():
+    """
+    Leaf of a formula template: consecutive rows of another FormulaTemplate used as an operand, stepping down
+    one row for every row of the template. The rows themselves are kept, so that a template built on them is
+    only used while none of them have been built out, and edited, as formulas of their own.
+    """
+
+    __slots__ = ('rows',)
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __repr__(self):
+        return 'TemplateCursor(%s)' % self.atRow(0).toReferenceString(None)
+
+    def getExpression(self):
+        return self
+
+    def getTemplate(self):
+        return self.rows[0].template
+
+    def atRow(self, row):
+        return self.rows[row]
+
+    def shifted(self, rows):
+        return TemplateCursor(self.rows[rows:])
+
+    def toReferenceString(self, sheet=None):
+        return self.atRow(0).toReferenceString(sheet)
+
+
+def mapCursors(arg, function):
+    """Rebuild a template expression with function applied to each of its RowCursors and TemplateCursors."""
+    if isinstance(arg, (RowCursor, TemplateCursor)):
+        return function(arg)
+    if type(arg) == Formula:
+        args = [mapCursors(a, function) for a in arg.getArgs()]
+        if all(a is b for a, b in zip(args, arg.getArgs())):
+            return arg
+        return Formula(arg.getFunction(), *args, parentheses=arg.getParentheses())
+    return arg
+
+
+def iterCursors(arg):
+    """Yield the RowCursors and TemplateCursors of a template expression."""
+    if isinstance(arg, (RowCursor, TemplateCursor)):
+        yield arg
+    elif type(arg) == Formula:
+        for a in arg.getArgs():
+            for cursor in iterCursors(a):
+                yield cursor
+
+
+def templateParts(arg, sheet):
+    """
+    Render a template expression as a %-format string with a %d slot for the row number of each RowCursor.
+    :param arg: template expression or constant operand
+    :param sheet: Sheet the formula will be written to
+    :return: (format string, list of 1-based row numbers of the RowCursors at the first row)
+    """
+    if isinstance(arg, RowCursor):
+        cell = arg.cell
+        prepend = ("'%s'!" % cell.getSheet().getId()) if sheet != cell.getSheet() else ''
+        return prepend.replace('%', '%%') + COLUMN_LETTERS[cell.getX()] + '%d', [cell.getY() + 1]
+    if isinstance(arg, TemplateCursor):
+        template, rows = arg.getTemplate().getTemplateString(sheet)
+        return template, [row + arg.atRow(0).row for row in rows]
+    if type(arg) == Formula:
+        parts = [templateParts(a, sheet) for a in arg.getArgs()]
+        args = [part[0] for part in parts]
+        rows = [row for part in parts for row in part[1]]
+        function = arg.getFunction().toReferenceString().replace('%', '%%')
+        if arg.getFunction().getPosition() == 'before':
+            retval = '%s(%s)' % (function, ','.join(args))
+        else:
+            retval = function.join(args)
+        if arg.getParentheses():
+            retval = '(%s)' % retval
+        return retval, rows
+    if isinstance(arg, (Cell, Function, Formula)):
+        arg = arg.toReferenceString(sheet)
+    return arg.replace('%', '%%'), []
+
+
+class FormulaTemplate():
+    """
+    A column of formulas that differ only by row, stored once as the formula of its first row. The formula is
+    built on RowCursor and TemplateCursor leaves, which step down one row for each row of the column, and is
+    expanded to A1 strings for all rows at once when it is exported.
+    """
+
+    __slots__ = ('formula', 'rendered', 'sources', 'materialized')
+
+    def __init__(self, formula):
+        self.formula = formula
+        self.rendered = None
+        # Templates whose rows this one is built on, and whether any of its own rows has been built as a Formula,
+        # which can then be edited apart from the template
+        self.sources = [cursor.getTemplate() for cursor in iterCursors(formula) if isinstance(cursor, TemplateCursor)]
+        self.materialized = False
+
+    def __repr__(self):
+        return 'FormulaTemplate(%s)' % self.formula
+
+    def getExpression(self):
+        return self.formula
+
+    def atRow(self, row):
+        return TemplateRow(self, row)
+
+    def instantiate(self, row):
+        return mapCursors(self.formula, lambda cursor: cursor.atRow(row))
+
+    def isCurrent(self):
+        """Whether the rows this template is built on are still described by their templates."""
+        return all(source.isIntact() for source in self.sources)
+
+    def isIntact(self):
+        """Whether every row of this template is still described by it, so the column can be rendered from it."""
+        return not self.materialized and self.isCurrent()
+
+    def shifted(self, rows):
+        if rows == 0:
+            return self
+        return FormulaTemplate(mapCursors(self.formula, lambda cursor: cursor.shifted(rows)))
+
+    def getTemplateString(self, sheet):
+        # Memoized for the last target sheet until the layout changes
+        rendered = self.rendered
+        if rendered is None or rendered[0] != RenderCache.generation or rendered[1] is not sheet:
+            rendered = (RenderCache.generation, sheet, templateParts(self.formula, sheet))
+            self.rendered = rendered
+        return rendered[2]
+
+    def toReferenceString(self, sheet, row):
+        template, rows = self.getTemplateString(sheet)
+        return template % tuple(r + row for r in rows)
+
+    def toReferenceStrings(self, sheet, length, prepend=''):
+        """Render the first length rows of the template, each prefixed with prepend."""
+        template, rows = self.getTemplateString(sheet)
+        template = prepend.replace('%', '%%') + template
+        if not rows:
+            return [template % ()] * length
+        return [template % row for row in zip(*[range(r, r + length) for r in rows])]
+
+
+class TemplateRow(Formula):
+    """
+    One row of a FormulaTemplate, standing in for the Formula of that row. It renders from the template and
+    only builds its own formula tree if its function or arguments are asked for.
+    """
+
+    __slots__ = ('template', 'row', 'formula')
+
+    def __init__(self, template, row):
+        self.template = template
+        self.row = row
+        self.formula = None
+
+    def getFormula(self):
+        if self.formula is None:
+            self.formula = self.template.instantiate(self.row)
+            self.template.materialized = True
+        return self.formula
+
+    def _setFunction(self, function):
+        self.getFormula()._setFunction(function)
+
+    def getFunction(self):
+        return self.getFormula().getFunction()
+
+    def _setArgs(self, *args):
+        self.getFormula()._setArgs(*args)
+
+    def getArgs(self):
+        return self.getFormula().getArgs()
+
+    def _setParentheses(self, parentheses):
+        self.getFormula()._setParentheses(parentheses)
+
+    def getParentheses(self):
+        return self.getFormula().getParentheses()
+
+    def toReferenceString(self, sheet=None):
+        if self.formula is None and self.template.isCurrent():
+            return self.template.toReferenceString(sheet, self.row)
+        return self.getFormula().toReferenceString(sheet)
+
+    def evaluate(self):
+        # A formula built only to be evaluated is thrown away, so the template still stands for the whole column
+        if self.formula is None:
+            return self.template.instantiate(self.row).evaluate()
+        return self.formula.evaluate()
+
+
+def scanColumnLeaf(values):
+    """
+    Find the leaf describing a column of operands, if the column is uniform: consecutive cells of one table
+    column, or consecutive rows of one FormulaTemplate that are still described by it.
+    :param values: 1D array of operands
+    :return: RowCursor, TemplateCursor or None
+    """
+    if len(values) < 2:
+        return None
+    first = values[0]
+    if type(first) == Cell and first.table is not None:
+        table, x, y = first.table, first.location.x, first.location.y
+        for row in range(len(values)):
+            cell = values[row]
+            if type(cell) != Cell or cell.table is not table or cell.location.x != x or cell.location.y != y + row:
+                return None
+        return RowCursor(first)
+    if type(first) == TemplateRow and first.template.isIntact():
+        template, start = first.template, first.row
+        for row in range(len(values)):
+            formula = values[row]
+            if type(formula) != TemplateRow or formula.template is not template or formula.row != start + row:
+                return None
+        return TemplateCursor(values)
+    return None
+
+
+def widenFloats(values):
+    """
+    Widen floats narrower than float64 by their shortest decimal representation, so that a float32 0.1 is
+    written as 0.1 rather than as 0.10000000149011612. Other arrays are returned as they are.
+    """
+    values = np.asarray(values)
+    if values.dtype.kind == 'f' and values.dtype.itemsize < 8:
+        return values.astype(str).astype(np.float64)
+    return values
+
+
+def isMissing(values):
+    """Mask of the values that shouldn't be written at all: NaN, inf and NaT. None is kept, as a blank cell."""
+    values = np.asarray(values)
+    if values.dtype.kind == 'f':
+        return ~np.isfinite(values)
+    if values.dtype.kind in 'mM':
+        return np.isnat(values)
+    if values.dtype.kind == 'O':
+        return np.array([isinstance(v, float) and not np.isfinite(v) for v in values], dtype=bool)
+    return np.zeros(len(values), dtype=bool)
+
+
+def classifyColumn(values, missing=None):
+    """
+    Classify a column of values by its dtype, looking at individual values only for object columns.
+    :param values: array-like
+    :param missing: optional boolean array from isMissing
+    :return: one of EMPTY, NUMBER, DATETIME, STRING, FORMULA, OBJECT
+    """
+    if missing is None:
+        missing = isMissing(values)
+    if missing.all():
+        return EMPTY
+    dtype = values.dtype
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return DATETIME
+    if dtype.kind in 'iuf':
+        return NUMBER
+    if dtype.kind == 'O':
+        types = set(type(v) for v in np.asarray(values)[~missing])
+        if types == {str}:
+            return STRING
+        if all(issubclass(t, Formula) for t in types):
+            return FORMULA
+    return OBJECT
+
+
+def prepareExportColumn(values, sheet, style_prefix, formulas='text'):
+    """
+    Classify a column and convert it to what gets written: numbers as floats, dates as Excel serials and
+    formulas as rendered strings.
+    :param values: array-like
+    :param sheet: Sheet the column is written to, for rendering formula references
+    :param style_prefix: str
+    :param formulas: str, 'text' to render formulas or 'value' to replace them with their computed values
+    :return: ExportColumn
+    """
+    missing = isMissing(values)
+    kind = classifyColumn(values, missing)
+    if kind == FORMULA and formulas == 'value':
+        kind = OBJECT
+        data = [None if m else v.evaluate() for v, m in zip(values, missing)]
+    elif kind == NUMBER:
+        data = widenFloats(values).tolist()
+    elif kind == DATETIME:
+        data = toExcelSerialDates(values).tolist()
+    elif kind == FORMULA:
+        data = [None if m else v.toFinalString(sheet) for v, m in zip(values, missing)]
+    elif isinstance(values, np.ndarray):
+        # tolist() boxes numpy scalars (bools in particular) into the Python types xlsxwriter recognizes
+        data = values.tolist()
+    else:
+        data = list(values)
+    return ExportColumn(kind, data, ~missing, style_prefix)
+
+
+# Types xlsxwriter writes as they are
+WRITTEN_TYPES = frozenset([str, int, float, bool, type(None)])
+
+# Stands for a value xlsxwriter can't write, which is left out of the file
+NOT_WRITTEN = object()
+
+
+def toWrittenValue(d, sheet):
+    """
+    Reduce a value of an object column or a header to what writeFunction writes for it, so that prepared
+    buffers hold plain values rather than parts of the workbook. Formulas are rendered; anything else that isn't
+    a number or a date is converted as xlsxwriter would convert it.
+    :param d: value
+    :param sheet: Sheet the value is written to, for rendering formula references
+    :return: value, or NOT_WRITTEN for values that aren't written at all, e.g. a Cell
+    """
+    if type(d) in WRITTEN_TYPES or isDatetimeLike(d):
+        return d
+    if isinstance(d, Formula):
+        return d.toFinalString(sheet)
+    if isinstance(d, str):
+        return str(d)
+    if isinstance(d, numbers.Number):
+        return d
+    try:
+        return float(d)
+    except TypeError:
+        return NOT_WRITTEN
+    except ValueError:
+        return str(d)
+
+
+def formatCSVNumber(value):
+    """Format a number the way it reads back from an .xlsx: xlsxwriter's %.16G, as an int when it has no fraction."""
+    if not np.isfinite(value):
+        return ''
+    string = '%.16G' % value
+    if '.' in string or 'E' in string:
+        return str(float(string))
+    return str(int(string))
+
+
+def toCSVValue(d, kind, sheet, formulas='text'):
+    """
+    Convert a value written by the .xlsx export to the csv field it becomes.
+    :param d: value as passed to writeFunction
+    :param kind: column kind of the value
+    :param sheet: Sheet the value is written to, for rendering formula references
+    :param formulas: str, 'text' or 'value'
+    :return: str
+    """
+    if kind == NUMBER:
+        return formatCSVNumber(d)
+    if kind == DATETIME:
+        return str(fromExcelSerialDate(d))
+    if kind in (STRING, FORMULA):
+        return d
+    if isinstance(d, Formula):
+        if formulas == 'text':
+            return d.toFinalString(sheet)
+        d = d.evaluate()
+    if d is None:
+        return ''
+    if type(d) == bool:
+        return str(d)
+    if isinstance(d, str):
+        return d
+    if isDatetimeLike(d):
+        return str(dt.datetime(d.year, d.month, d.day))
+    try:
+        return formatCSVNumber(float(d))
+    except (TypeError, ValueError):
+        # Anything xlsxwriter can't write is left out of the .xlsx, and so out of the csv
+        return ''
+
+
+def hashColumnValues(h, values, sheet):
+    """
+    Feed a column of values to a hash as they would be exported: typed arrays by their bytes, formulas and
+    cells by their references as rendered on the sheet, and anything else by its type and repr.
+    :param h: hashlib hash object
+    :param values: array-like or pd.Index
+    :param sheet: Sheet the column is written to
+    :return:
+    """
+    h.update(str(values.dtype).encode('utf-8'))
+    if isinstance(values, pd.DatetimeIndex):
+        h.update(values.asi8.tobytes())
+        return
+    values = np.asarray(values)
+    if values.dtype.kind in 'biufcmM':
+        h.update(np.ascontiguousarray(values).tobytes())
+        return
+    parts = []
+    for v in values:
+        if isinstance(v, (Formula, Cell)):
+            parts.append('=' + v.toReferenceString(sheet))
+        else:
+            parts.append(type(v).__name__ + ':' + repr(v))
+    h.update('\x00'.join(parts).encode('utf-8'))
+
+
+class CellStore():
+    """Columnar backing store for the body of a Table.
+
+    Values stay in the source DataFrame's arrays and positions are derived from the table's data origin plus
+    integer offsets. Cell objects are only created when they are asked for, and are cached so that formulas
+    built on them keep referring to the same cells.
+    """
+
+    def __init__(self, table, df):
+        self.table = table
+        self.index = df.index
+        self.columns = df.columns
+        self.values = [self._boxableValues(df.iloc[:, x]) for x in range(df.shape[1])]
+        self.data_height = df.shape[0]
+        # Columns that are consecutive rows of one FormulaTemplate are exported from the template
+        self.templates = [self._findTemplate(values) for values in self.values]
+        self.cells = {}
+        self.cell_df = None
+        self.total_row = None
+        if table.total_row:
+            self._setTotalRow()
+
+    @staticmethod
+    def _boxableValues(series):
+        # Datetime arrays are kept as indexes so that single values come back as Timestamps, like to_dict() gives
+        if pd.api.types.is_datetime64_any_dtype(series.dtype):
+            return pd.DatetimeIndex(series)
+        if pd.api.types.is_timedelta64_dtype(series.dtype):
+            return pd.TimedeltaIndex(series)
+        return series.values
+
+    @staticmethod
+    def _findTemplate(values):
+        if values.dtype != object:
+            return None
+        leaf = scanColumnLeaf(values)
+        return FormulaTemplate(leaf) if isinstance(leaf, TemplateCursor) else None
+
+    def getTemplate(self, x):
+        """Template the column is exported from, or None if its cells have to be rendered one by one."""
+        template = self.templates[x]
+        if template is None or not template.isIntact():
+            return None
+        return template
+
+    def _setTotalRow(self):
+        total_row = []
+        for x in range(len(self.columns)):
+            total = Formula(Function.sum(), Formula(Function.range(), self.getCell(x, 0), self.getCell(x, self.data_height - 1)))
+            total_row.append(total)
+        self.total_row = total_row
+
+    def getTable(self):
+        return self.table
+
+    def getWidth(self):
+        return len(self.columns)
+
+    def getHeight(self):
+        return self.data_height + int(self.total_row is not None)
+
+    def getIndex(self):
+        if self.total_row is None:
+            return self.index
+        return self.index.append(pd.Index(['Total']))
+
+    def getColumnPosition(self, key):
+        """Position of a column label, or None if the label doesn't pick out exactly one column."""
+        if not pd.api.types.is_hashable(key) or key not in self.columns:
+            return None
+        position = self.columns.get_loc(key)
+        return position if isIntegerLike(position) else None
+
+    def getColumnValues(self, x):
+        return self.values[x]
+
+    def getData(self, x, y):
+        if y == self.data_height:
+            return self.total_row[x]
+        return self.values[x][y]
+
+    def getCell(self, x, y):
+        cell = self.cells.get((x, y))
+        if cell is None:
+            cell = Cell(Location(x, y, self.getTable().getSheet()), self.getData(x, y), self.getTable())
+            self.cells[(x, y)] = cell
+        return cell
+
+    def getColumn(self, x):
+        return pd.Series(
+            [self.getCell(x, y) for y in range(self.getHeight())], index=self.getIndex(), name=self.columns[x])
+
+    def getCellArray(self):
+        cells = np.empty((self.getHeight(), self.getWidth()), dtype=object)
+        for x in range(self.getWidth()):
+            cells[:, x] = [self.getCell(x, y) for y in range(self.getHeight())]
+        return cells
+
+    def getCellDF(self):
+        if self.cell_df is None:
+            self.cell_df = pd.DataFrame(self.getCellArray(), index=self.getIndex(), columns=self.columns)
+        return self.cell_df
+
+    def getBlock(self, start, stop):
+        """Rows start to stop of the body, sharing the store's arrays."""
+        return StoreChunk(
+            self.index[start:stop], [values[start:stop] for values in self.values],
+            [None if template is None else template.shifted(start)
+             for template in [self.getTemplate(x) for x in range(self.getWidth())]])
+
+    def iterChunks(self, rows=None):
+        """
+        Yield the body a chunk of rows at a time, as (first row, store of the chunk's rows).
+        :param rows: int, most rows per chunk, or None for the whole body at once
+        """
+        if rows is None or rows >= self.data_height:
+            yield 0, self
+            return
+        for start in range(0, self.data_height, rows):
+            yield start, self.getBlock(start, min(start + rows, self.data_height))
+
+
+def peekChunks(data):
+    """
+    Tell whether data passed as a table's contents is an iterator of DataFrame chunks, e.g. from
+    read_sql(chunksize=...), from its first item. Iterators of anything else, such as the row tuples of zip() or
+    csv.reader, are the rows of a single DataFrame.
+    :return: (bool, data), data still yielding every item if it's an iterator
+    """
+    if not isinstance(data, collections.abc.Iterator):
+        return False, data
+    for first in data:
+        return type(first) == pd.DataFrame, itertools.chain([first], data)
+    return False, []
+
+
+class StoreChunk():
+    """
+    Some rows of a store, with the parts of the CellStore interface export uses: a block of a CellStore, or a
+    chunk of a ChunkedCellStore read back from its spool.
+    """
+
+    def __init__(self, index, values, templates=None):
+        self.index = index
+        self.values = values
+        self.templates = [None] * len(values) if templates is None else templates
+        self.data_height = len(index)
+
+    @classmethod
+    def fromDF(cls, df):
+        return cls(df.index, [CellStore._boxableValues(df.iloc[:, x]) for x in range(df.shape[1])])
+
+    def getWidth(self):
+        return len(self.values)
+
+    def getTemplate(self, x):
+        return self.templates[x]
+
+    def getColumnValues(self, x):
+        return self.values[x]
+
+    def getBlock(self, start, stop):
+        return StoreChunk(self.index[start:stop], [values[start:stop] for values in self.values])
+
+
+class ChunkedCellStore(CellStore):
+    """
+    Store for a table built from an iterator of DataFrames. The chunks are pickled to a temporary spool file as
+    they arrive, so only one of them is in memory at a time while the table is built, and again when it is
+    exported row by row. The columns of the first chunk are the table's headers. Single values are served from
+    the chunk last read back; anything needing whole columns reads the spool through.
+    """
+
+    def __init__(self, table, chunks):
+        self.table = table
+        self.spool = tempfile.TemporaryFile()
+        self.lock = threading.Lock()
+        # (first row, position in the spool) of each chunk
+        self.chunks = []
+        self.columns = None
+        height = 0
+        for chunk in chunks:
+            if type(chunk) != pd.DataFrame:
+                raise TypeError('Every chunk of table %s must be a DataFrame, not %s.' % (table.getId(), type(chunk)))
+            if self.columns is None:
+                self.columns = chunk.columns
+            elif not chunk.columns.equals(self.columns):
+                raise ValueError('Every chunk needs the columns of the first, %s.' % list(self.columns))
+            if len(chunk) == 0:
+                continue
+            if isinstance(chunk.index, pd.RangeIndex) and chunk.index.start == 0 and chunk.index.step == 1:
+                # Chunks numbered from 0 each, as read_sql makes them, are numbered on as one DataFrame would be
+                chunk.index = pd.RangeIndex(height, height + len(chunk))
+            self.chunks.append((height, self.spool.tell()))
+            pickle.dump(chunk, self.spool, pickle.HIGHEST_PROTOCOL)
+            height += len(chunk)
+        if self.columns is None:
+            raise ValueError('No chunks to build table %s from.' % table.getId())
+        self.chunk_starts = [start for start, position in self.chunks]
+        self.data_height = height
+        self.loaded = None
+        self.cells = {}
+        self.cell_df = None
+        self.total_row = None
+        if table.total_row:
+            self._setTotalRow()
+
+    def _readChunk(self, i):
+        with self.lock:
+            self.spool.seek(self.chunks[i][1])
+            return pickle.load(self.spool)
+
+    def _getChunk(self, i):
+        loaded = self.loaded
+        if loaded is None or loaded[0] != i:
+            loaded = (i, StoreChunk.fromDF(self._readChunk(i)))
+            self.loaded = loaded
+        return loaded[1]
+
+    def iterChunks(self, rows=None):
+        for i, (start, position) in enumerate(self.chunks):
+            chunk = StoreChunk.fromDF(self._readChunk(i))
+            if rows is None or rows >= chunk.data_height:
+                yield start, chunk
+                continue
+            for block_start in range(0, chunk.data_height, rows):
+                yield start + block_start, chunk.getBlock(block_start, min(block_start + rows, chunk.data_height))
+
+    def toDF(self):
+        if len(self.chunks) == 0:
+            return pd.DataFrame(columns=self.columns)
+        return pd.concat([self._readChunk(i) for i in range(len(self.chunks))])
+
+    @property
+    def index(self):
+        if len(self.chunks) == 0:
+            return pd.RangeIndex(0)
+        index = self._readChunk(0).index
+        for i in range(1, len(self.chunks)):
+            index = index.append(self._readChunk(i).index)
+        return index
+
+    def getTemplate(self, x):
+        return None
+
+    def getColumnValues(self, x):
+        if len(self.chunks) == 0:
+            return np.empty(0, dtype=object)
+        return self._boxableValues(pd.concat([self._readChunk(i).iloc[:, x] for i in range(len(self.chunks))]))
+
+    def getData(self, x, y):
+        if y == self.data_height:
+            return self.total_row[x]
+        i = bisect.bisect_right(self.chunk_starts, y) - 1
+        return self._getChunk(i).getColumnValues(x)[y - self.chunk_starts[i]]
+
 
 class Table():
 
@@ -476,15 +1740,19 @@ class Table():
         self.include_id = include_id
         self.body_style = body_style
         self._setDFs(data)
-        self.data_width = self.getDataDF().shape[1]
-        self.data_height = self.getDataDF().shape[0]
+        self.data_width = self.getCellStore().getWidth()
+        self.data_height = self.getCellStore().data_height
 
 
     def __repr__(self):
         return '%s\nAt location %s' % (self.getDataDF().__repr__(), self.getLocation().__repr__())
 
     def __getitem__(self, key):
-        return self.getCellDF()[key]
+        # Single columns can be served straight from the store without building the full cell DataFrame
+        x = self.getCellStore().getColumnPosition(key)
+        if x is None:
+            return self.getCellDF()[key]
+        return self.getCellStore().getColumn(x)
 
     @property
     def ix(self):
@@ -511,6 +1779,7 @@ class Table():
     def _setLocation(self, location):
         assertType(location, Location)
         self.location = location
+        self.data_origin = None
 
     def getLocation(self):
         return self.location
@@ -523,43 +1792,45 @@ class Table():
         return self.sheet
 
     def getDataDF(self):
+        if self.data_df is None:
+            # Tables built from chunks don't keep their data in memory
+            return self.getCellStore().toDF()
         return self.data_df
 
     def _setDFs(self, to_df):
+        chunked, to_df = peekChunks(to_df)
+        if chunked:
+            self.data_df = None
+            self.cell_store = ChunkedCellStore(self, to_df)
+            return
         if type(to_df) != pd.DataFrame:
             to_df = pd.DataFrame(to_df)
         self.data_df = to_df
-        self.ix = self.getDataDF().ix
-        self.iloc = self.getDataDF().iloc
-        self._setCellDF()
+        self._setCellStore()
 
-    def getCellDF(self):
-        return self.cell_df
+    def _getInMemoryDF(self):
+        if self.data_df is None:
+            raise TypeError('Table %s was built from chunks and has no DataFrame in memory; getDataDF() reads it '
+                            'back from disk.' % self.getId())
+        return self.data_df
 
-    def _setCellDF(self):
-        df = self.getDataDF()
-        x_offset, y_offset = self.getDataOriginLocation().asTuple()
-        d = df.to_dict()
-        ordered_xs = df.columns
-        ordered_ys = df.index
-        c = OrderedDict()
-        for x in range(len(ordered_xs)):
-            xd = {}
-            for y in range(len(ordered_ys)):
-                 xd[ordered_ys[y]] = Cell(
-                     Location(x+x_offset, y+y_offset, self.getSheet()),
-                     d[ordered_xs[x]][ordered_ys[y]])
-            c[ordered_xs[x]] = xd
-        cell_df = pd.DataFrame(c, columns=ordered_xs, index=ordered_ys)
-        if self.total_row:
-            top = cell_df.iloc[0]
-            bottom = cell_df.iloc[-1]
-            total = Formula.sum(Formula.range(asRow(top), asRow(bottom)))
-            for x in range(len(total.columns)):
-                total[total.columns[x]].iloc[0] = Cell(bottom.iloc[x].getLocation().move(Location(0, 1, self.getSheet())), total[total.columns[x]].iloc[0])
-            total.index = ['Total']
-            cell_df = pd.concat([cell_df, total])
-        self.cell_df = cell_df
+    @property
+    def ix(self):
+        # .ix is gone from pandas; label lookups, which is what callers used it for, go through .loc
+        return self._getInMemoryDF().loc
+
+    @property
+    def iloc(self):
+        return self._getInMemoryDF().iloc
+
+    def getCellStore(self):
+        return self.cell_store
+
+    def _setCellStore(self):
+        self.cell_store = CellStore(self, self.getDataDF())
+
+    def getCellDF(self):
+        return self.getCellStore().getCellDF()
 
     def getColumnHeaderHeight(self):
         return int(self.getIncludeHeader()) + int(self.getIncludeId())
@@ -576,6 +1847,12 @@ class Table():
     def getDataOriginLocation(self):
         return self.getLocation() + Location(self.getRowHeaderWidth(), self.getColumnHeaderHeight(), self.getSheet())
 
+    def getDataOrigin(self):
+        """(x, y) of the top left body cell; cells of this table are positioned relative to it."""
+        if self.data_origin is None:
+            self.data_origin = self.getDataOriginLocation().asTuple()
+        return self.data_origin
+
     def getIncludeHeader(self):
         return self.include_header
 
@@ -588,12 +1865,136 @@ class Table():
     def getBodyStyle(self):
         return self.body_style
 
+    def getContentHash(self):
+        """
+        Hash of everything that decides how the table is exported: its data and formulas, as referenced from its
+        sheet, its location and its layout options.
+        :return: str
+        """
+        store = self.getCellStore()
+        sheet = self.getSheet()
+        h = hashlib.sha1()
+        h.update(repr((
+            self.getId(), self.getLocation().asTuple(), self.getIncludeHeader(), self.getIncludeIndex(),
+            self.getIncludeId(), self.total_row, self.getBodyStyle(), list(store.columns))).encode('utf-8'))
+        hashColumnValues(h, store.index, sheet)
+        for x in range(store.getWidth()):
+            template = store.getTemplate(x)
+            if template is not None:
+                # Columns only have a template while none of their rows have been built, and so possibly edited,
+                # on their own, so the template string stands for every row
+                h.update(repr(template.getTemplateString(sheet)).encode('utf-8'))
+            else:
+                hashColumnValues(h, store.getColumnValues(x), sheet)
+        return h.hexdigest()
+
+    def getExportColumns(self, formulas='text', store=None):
+        """
+        Classify and convert the row header and body columns for export.
+        :param formulas: str, 'text' to render formulas or 'value' to replace them with their computed values
+        :param store: store of the rows to export, one of those yielded by the cell store's iterChunks().
+            Defaults to the whole cell store
+        :return: list of (sheet column, ExportColumn), covering the data rows but not the total row
+        """
+        x_offset = self.getLocation().getX()
+        ind_offset = self.getRowHeaderWidth()
+        if store is None:
+            store = self.getCellStore()
+        columns = []
+        if self.getIncludeIndex():
+            columns.append((x_offset, prepareExportColumn(store.index.values, self.getSheet(), 'row_header')))
+        for x in range(store.getWidth()):
+            template = store.getTemplate(x)
+            if template is not None and formulas == 'value':
+                data = [formula.evaluate() for formula in store.getColumnValues(x)]
+                column = ExportColumn(OBJECT, data, np.ones(store.data_height, dtype=bool), self.getBodyStyle())
+            elif template is not None:
+                # Only given while none of the column's formulas have been built, and so possibly edited, on their own
+                data = template.toReferenceStrings(self.getSheet(), store.data_height, prepend='=')
+                column = ExportColumn(FORMULA, data, np.ones(store.data_height, dtype=bool), self.getBodyStyle())
+            else:
+                column = prepareExportColumn(
+                    store.getColumnValues(x), self.getSheet(), self.getBodyStyle(), formulas=formulas)
+            columns.append((x_offset+ind_offset+x, column))
+        return columns
+
+    def getExportBlockRows(self):
+        """Rows prepared at a time when the body is exported row by row, about EXPORT_BLOCK_CELLS cells' worth."""
+        return max(1, EXPORT_BLOCK_CELLS // max(1, self.getWidth()))
+
+    def iterExportChunks(self, formulas='text', rows=None):
+        """
+        Classify and convert the body for export a chunk at a time, so that a table built from chunks is read
+        back one chunk at a time.
+        :param formulas: str, 'text' to render formulas or 'value' to replace them with their computed values
+        :param rows: int, most rows prepared at a time, or None to prepare other tables whole
+        :return: generator of (first data row, number of rows, [(sheet column, ExportColumn), ...])
+        """
+        for y, store in self.getCellStore().iterChunks(rows=rows):
+            yield y, store.data_height, self.getExportColumns(formulas=formulas, store=store)
+
+    def iterHeaderRows(self):
+        """
+        Yield the id and column header rows of the table.
+        :return: generator of (row, [(column, value, style_prefix, kind), ...]) in absolute sheet coordinates
+        """
+        x_offset, y_offset = self.getLocation().asTuple()
+        row_counter = 0
+        if self.getIncludeId():
+            writes = [(x_offset, self.getId(), 'columns_title', OBJECT)]
+            writes.extend((x_offset+col, '', 'columns_title', OBJECT) for col in range(1, self.getWidth()))
+            yield y_offset, writes
+            row_counter += 1
+        if self.getIncludeHeader():
+            store = self.getCellStore()
+            ind_offset = self.getRowHeaderWidth()
+            writes = []
+            if self.getIncludeIndex():
+                writes.append((x_offset, '', 'column_header', OBJECT))
+            writes.extend(
+                (x_offset+ind_offset+col, store.columns[col], 'column_header', OBJECT)
+                for col in range(store.getWidth()))
+            yield y_offset+row_counter, writes
+
+    def iterTotalRow(self):
+        """
+        Yield the total row of the table, if it has one.
+        :return: generator of (row, [(column, value, style_prefix, kind), ...]) in absolute sheet coordinates
+        """
+        if self.total_row:
+            x_offset = self.getLocation().getX()
+            ind_offset = self.getRowHeaderWidth()
+            store = self.getCellStore()
+            writes = []
+            if self.getIncludeIndex():
+                writes.append((x_offset, 'Total', 'row_header', OBJECT))
+            writes.extend(
+                (x_offset+ind_offset+x, store.getData(x, store.data_height), self.getBodyStyle(), OBJECT)
+                for x in range(store.getWidth()))
+            yield self.getDataOriginLocation().getY() + store.data_height, writes
+
+    def iterRows(self, formulas='text'):
+        """
+        Yield the rows the table occupies in the spreadsheet, top to bottom.
+        :param formulas: str, 'text' to render formulas or 'value' to replace them with their computed values
+        :return: generator of (row, [(column, value, style_prefix, kind), ...]) in absolute sheet coordinates
+        """
+        for row in self.iterHeaderRows():
+            yield row
+        y_offset = self.getDataOriginLocation().getY()
+        # Prepared a block of rows at a time, so that only a block's converted values are held at once
+        for start, height, columns in self.iterExportChunks(formulas=formulas, rows=self.getExportBlockRows()):
+            for y in range(height):
+                yield y_offset+start+y, [(x, c.data[y], c.style_prefix, c.kind) for x, c in columns if c.valid[y]]
+        for row in self.iterTotalRow():
+            yield row
+
     def shift(self, dx, dy):
-        # Note that this happens IN PLACE so that references to these cells will
-        # be automatically adjusted when the table is exported to .xlsx
-        l = Location(dx, dy, self.getSheet())
-        self._setLocation(self.getLocation() + l)
-        self.getCellDF().applymap(lambda cell: cell.move_inplace(Location(dx, dy, self.getSheet())))
+        # Cells are positioned relative to the table, so moving the origin moves all of them and references
+        # to these cells will be automatically adjusted when the table is exported to .xlsx
+        self._setLocation(self.getLocation() + Location(dx, dy, self.getSheet()))
+        self.getSheet().getLayout().invalidate(self)
+        RenderCache.invalidate()
 
     def shiftToLocation(self, end):
         assert type(end) == Location
@@ -602,64 +2003,227 @@ class Table():
         self.shift(diff.asTuple()[0], diff.asTuple()[1])
 
     def getDataRangeReference(self, parentheses=False):
-        df = self.getCellDF()
-        return Formula.range(df[df.columns[0]].iloc[0], df[df.columns[-1]].iloc[-1])
-
-    def toRetentionRate(self):
-        ret = self.getCellDF().copy()
-        for row in range(len(ret)):
-            for col in range(row, len(ret.columns)):
-                num = ret[ret.columns[col]].iloc[row]
-                div = ret[ret.columns[row]].iloc[row]
-                ret[ret.columns[col]].iloc[row] = Formula.divide(num, div)
-        return ret
+        store = self.getCellStore()
+        return Formula.range(store.getCell(0, 0), store.getCell(store.getWidth() - 1, store.getHeight() - 1))
+
+    def toRetentionRate(self, values=False, mask_lower=False):
+        """
+        Divide each row of a cohort table, on and above the diagonal, by the row's diagonal cell.
+        :param values: bool, if True return the computed rates rather than formulas
+        :param mask_lower: bool, if True leave the lower triangle empty rather than keeping the table's cells (or
+            values) there
+        :return: pd.DataFrame of formulas or floats, shaped like the cell DataFrame
+        """
+        store = self.getCellStore()
+        rows, cols = upperTriangle(store.data_height, store.getWidth())
+        if values:
+            data = np.empty((store.getHeight(), store.getWidth()))
+            for x in range(store.getWidth()):
+                data[:, x] = pd.to_numeric(
+                    [evaluateOperand(store.getData(x, y)) for y in range(store.getHeight())], errors='coerce')
+            ret = data.copy()
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ret[rows, cols] = data[rows, cols] / data[rows, rows]
+            if mask_lower:
+                ret[~upperTriangleMask(ret.shape, rows, cols)] = np.nan
+        else:
+            cells = store.getCellArray()
+            ret = cells.copy()
+            divide = Function.divide()
+            ret[rows, cols] = [
+                Formula.fromCleanArgs(divide, (num, div)) for num, div in zip(cells[rows, cols], cells[rows, rows])]
+            if mask_lower:
+                ret[~upperTriangleMask(ret.shape, rows, cols)] = None
+        return pd.DataFrame(ret, index=store.getIndex(), columns=store.columns)
 
     def toAnnualRenewalWaterfall(self, renewal_rates):
-        renewal_rates = renewal_rates.getCellDF()
-        adds = self.getCellDF()
+        """
+        Project each cohort (row) of the table forward on its anniversaries: the cohort itself on the first and the
+        cohort times the year's renewal rate on each later one.
+        :param renewal_rates: Table of renewal rates by year, with the same columns as this table. An integer
+            index is looked up by label, anything else by position, as .ix did
+        :return: dict of column -> pd.DataFrame with a row per cohort and a column per anniversary date
+        """
+        adds = self.getCellStore()
+        rates = renewal_rates.getCellStore()
+        cohorts = pd.DatetimeIndex(adds.getIndex())
+        cohort_rows, years, anniversaries = annualAnniversaries(cohorts)
+        rows, row_labels, columns, column_labels = waterfallLayout(cohorts, cohort_rows, anniversaries)
+        rate_index = rates.getIndex()
+        if pd.api.types.is_integer_dtype(rate_index):
+            rate_rows = rate_index.get_indexer(years)
+            if (rate_rows[years > 0] < 0).any():
+                raise KeyError(sorted(set(years[(years > 0) & (rate_rows < 0)])))
+        else:
+            rate_rows = years
+        reference = Function.reference()
+        multiply = Function.multiply()
+        renewing = years > 0
+        blank = np.empty((len(row_labels), len(column_labels)), dtype=object)
+        blank[:] = np.nan
         ret_all = {}
-        for col in adds:
-            this_adds = adds[col]
-            this_rr = renewal_rates[col]
-            all_dates = this_adds.index
-            retval = pd.DataFrame(index=all_dates, columns=all_dates).to_dict()
-            for cohort in all_dates:
-                cohort_dict = {}
-                annuals = pd.date_range(cohort, max(all_dates), freq='12MS')
-                base = this_adds.ix[cohort]
-                cohort_dict[annuals[0]] = Formula(Function.reference(), base)
-                for year in range(1, len(annuals)):
-                    cohort_dict[annuals[year]] = Formula(Function.multiply(), base, this_rr.ix[year])
-                retval[cohort] = cohort_dict
-            ret_all[col] = pd.DataFrame.from_dict(retval, orient='index')
+        for col in adds.columns:
+            x = adds.getColumnPosition(col)
+            rate_x = rates.getColumnPosition(col)
+            bases = np.empty(adds.getHeight(), dtype=object)
+            bases[:] = [adds.getCell(x, y) for y in range(adds.getHeight())]
+            rate_cells = np.empty(int(rate_rows[renewing].max()) + 1 if renewing.any() else 0, dtype=object)
+            rate_cells[:] = [rates.getCell(rate_x, y) for y in range(len(rate_cells))]
+            values = blank.copy()
+            values[rows[~renewing], columns[~renewing]] = [
+                Formula.fromCleanArgs(reference, (base,)) for base in bases[cohort_rows[~renewing]]]
+            values[rows[renewing], columns[renewing]] = [
+                Formula.fromCleanArgs(multiply, (base, rate)) for base, rate in
+                zip(bases[cohort_rows[renewing]], rate_cells[rate_rows[renewing]])]
+            ret_all[col] = pd.DataFrame(values, index=row_labels, columns=column_labels)
         return ret_all
 
     def periodsFromForecastDate(self, num_periods_out, as_data=True):
-        cdf = self.getCellDF().copy()
-        ddf = cdf.applymap(lambda c: c.getData())
-        assert ('CountDate' in cdf.columns and 'ForecastDate' in cdf.columns and 'Count'  in cdf.columns)
-        ddf = ddf.set_index('ForecastDate')
-        cdf.index = ddf.index
-        to_df = {}
-        for i in cdf.index.unique():
-            ix = ddf.ix[i].set_index('CountDate').index
-            this_index = cdf.ix[i]
-            this_index.index = ix
-            first_ind = np.where(this_index.index == i)[0][0]
-            assert this_index.index.is_monotonic
-            # assert len(this_index['m'].unique() == 1)
-            # m = this_index['m'].unique()[0]
-            # c = this_index['Count'].iloc[first_ind]
-            this_index = this_index['Count'].iloc[first_ind+1:first_ind+1+num_periods_out]
-            this_index.index = np.arange(1, num_periods_out+1)
-            # this_index.ix['m'] = m
-            # this_index.ix['c'] = c
-            to_df[i] = this_index
-
-        if as_data:
-            return pd.DataFrame(to_df)
-        else:
-            return pd.DataFrame(to_df).applymap(lambda c: Formula(Function.reference(), c))
+        """
+        For each ForecastDate, take the Count cells of the num_periods_out rows following the row whose CountDate
+        is the forecast date. Rows of a forecast date must be in CountDate order.
+        :param num_periods_out: int
+        :param as_data: bool, if True return the cells themselves, otherwise formulas referencing them
+        :return: pd.DataFrame with a column per ForecastDate, in order of appearance, and periods 1..num_periods_out
+        """
+        store = self.getCellStore()
+        positions = [store.getColumnPosition(col) for col in ('CountDate', 'ForecastDate', 'Count')]
+        assert None not in positions
+        count_dates, forecast_dates, count_x = store.getColumnValues(positions[0]), \
+            store.getColumnValues(positions[1]), positions[2]
+        rows = pd.DataFrame({'CountDate': count_dates, 'ForecastDate': forecast_dates})
+        # One pass over the rows grouped by forecast date, keeping each group in table order
+        groups = rows.groupby('ForecastDate', sort=False)
+        group = groups.ngroup().values
+        position = groups.cumcount().values
+        previous = groups['CountDate'].shift()
+        assert not (rows['CountDate'] < previous).any(), 'CountDate must be increasing within each ForecastDate.'
+        on_forecast = (rows['CountDate'] == rows['ForecastDate']).values
+        starts = pd.Series(position[on_forecast]).groupby(group[on_forecast]).min()
+        forecasts = groups.size().index.rename(None)
+        assert len(starts) == len(forecasts), 'Every ForecastDate needs a row with the same CountDate.'
+        offset = position - starts.reindex(np.arange(len(forecasts))).values[group]
+        taken = (offset >= 1) & (offset <= num_periods_out)
+        if (np.bincount(group[taken], minlength=len(forecasts)) != num_periods_out).any():
+            raise ValueError('Every ForecastDate needs %d rows after its CountDate.' % num_periods_out)
+        cells = [store.getCell(count_x, y) for y in np.flatnonzero(taken)]
+        if not as_data:
+            reference = Function.reference()
+            cells = [Formula.fromCleanArgs(reference, (cell,)) for cell in cells]
+        values = np.empty((num_periods_out, len(forecasts)), dtype=object)
+        values[offset[taken] - 1, group[taken]] = cells
+        return pd.DataFrame(values, index=np.arange(1, num_periods_out + 1), columns=forecasts)
+
+
+class SheetLayout():
+    """
+    Spatial index of the rectangles occupied by the tables of a sheet, for finding the table under a cell and
+    the tables a new one would overlap without scanning every table. Each table is registered in the square
+    buckets of BUCKET_SIZE cells that its rectangle touches, so a lookup only looks at the tables sharing a
+    bucket. Tables that move are only marked dirty, and are reindexed together at the next lookup.
+    """
+
+    BUCKET_SIZE = 64
+
+    def __init__(self):
+        self.tables = OrderedDict()
+        self.rectangles = {}
+        self.buckets = {}
+        self.dirty = OrderedDict()
+
+    @staticmethod
+    def getRectangle(table):
+        """
+        :return: (left, top, right, bottom), right and bottom exclusive
+        """
+        x, y = table.getLocation().asTuple()
+        return x, y, x + table.getWidth(), y + table.getHeight()
+
+    def _iterBuckets(self, rectangle):
+        left, top, right, bottom = rectangle
+        if right <= left or bottom <= top:
+            return
+        size = self.BUCKET_SIZE
+        for by in range(top // size, (bottom - 1) // size + 1):
+            for bx in range(left // size, (right - 1) // size + 1):
+                yield bx, by
+
+    def _index(self, table):
+        rectangle = self.getRectangle(table)
+        self.rectangles[table.getId()] = rectangle
+        for bucket in self._iterBuckets(rectangle):
+            self.buckets.setdefault(bucket, []).append(table.getId())
+
+    def _unindex(self, id):
+        rectangle = self.rectangles.pop(id, None)
+        if rectangle is None:
+            return
+        for bucket in self._iterBuckets(rectangle):
+            ids = self.buckets[bucket]
+            ids.remove(id)
+            if len(ids) == 0:
+                del self.buckets[bucket]
+
+    def _reflow(self):
+        dirty, self.dirty = self.dirty, OrderedDict()
+        for id in dirty:
+            self._unindex(id)
+            self._index(self.tables[id])
+
+    def add(self, table):
+        # A table added under an existing id replaces it, as it does in Sheet.tables
+        self.remove(table.getId())
+        self.tables[table.getId()] = table
+        self._index(table)
+
+    def remove(self, id):
+        if id in self.tables:
+            self._unindex(id)
+            del self.tables[id]
+            self.dirty.pop(id, None)
+
+    def invalidate(self, table):
+        """Mark a table as moved; it is reindexed at the next lookup."""
+        if self.tables.get(table.getId()) is table:
+            self.dirty[table.getId()] = table
+
+    def findOverlaps(self, rectangle, exclude=None):
+        """
+        :param rectangle: (left, top, right, bottom), right and bottom exclusive
+        :param exclude: table id to leave out
+        :return: list of the tables intersecting the rectangle, in the order they were added
+        """
+        self._reflow()
+        left, top, right, bottom = rectangle
+        found = set()
+        for bucket in self._iterBuckets(rectangle):
+            for id in self.buckets.get(bucket, ()):
+                if id == exclude or id in found:
+                    continue
+                other_left, other_top, other_right, other_bottom = self.rectangles[id]
+                if other_left < right and left < other_right and other_top < bottom and top < other_bottom:
+                    found.add(id)
+        return [table for id, table in self.tables.items() if id in found]
+
+    def findTable(self, x, y):
+        """
+        :return: the first table added that covers the cell at (x, y), or None
+        """
+        overlaps = self.findOverlaps((x, y, x + 1, y + 1))
+        return overlaps[0] if len(overlaps) > 0 else None
+
+    def getOverlaps(self):
+        """
+        :return: list of (table, table) pairs that overlap, each pair in the order the tables were added
+        """
+        self._reflow()
+        pairs = []
+        order = {id: i for i, id in enumerate(self.tables)}
+        for id, table in self.tables.items():
+            for other in self.findOverlaps(self.rectangles[id], exclude=id):
+                if order[other.getId()] > order[id]:
+                    pairs.append((table, other))
+        return pairs
 
 
 class Sheet():
@@ -668,6 +2232,7 @@ class Sheet():
         self._setId(id)
         self._setWorkbook(wb)
         self.tables = OrderedDict()
+        self.layout = SheetLayout()
         self.next_table_origin = Location(0, 0, self)
 
     def __repr__(self):
@@ -686,33 +2251,315 @@ class Sheet():
     def getId(self):
         return self.id
 
+    def getLayout(self):
+        return self.layout
+
     def getNextTableOrigin(self, relative_position='below', margin=1):
         if len(self.getTables()) == 0:
             return Location(0, 0, self)
         else:
-            last = list(self.getTables().items())[-1][1]
+            last = next(reversed(self.getTables().values()))
             if relative_position == 'right':
                 return Location(last.getLocation().getX() + last.getWidth() + margin, last.getLocation().getY(), self)
             else:
                 return Location(0, last.getLocation().getY() + last.getHeight() + margin, self)
 
-    def addTable(self, id, df, relative_position='below', total_row=False, margin=1, include_header=True, include_index=True, include_id=True, body_style='general'):
+    def addTable(self, id, df, relative_position='below', total_row=False, margin=1, include_header=True, include_index=True, include_id=True, body_style='general', on_overlap='warn'):
+        """
+        :param df: pd.DataFrame, or anything pd.DataFrame accepts. May also be an iterator of DataFrames, such as
+            read_sql or read_csv with chunksize, or Utils.iterDatabaseQuery; the chunks are spooled to disk as
+            they arrive and streamed back when the sheet is exported, so that a constant_memory export holds
+            one chunk at a time. The first chunk's columns become the headers
+        :param on_overlap: str, what to do when the new table would overlap tables already on the sheet, which
+            happens when 'right' and 'below' placements are mixed: 'warn', 'raise' or 'ignore'
+        """
+        acceptable_overlaps = ('warn', 'raise', 'ignore')
+        assert on_overlap in acceptable_overlaps, 'Acceptable on_overlap arguments are %s.' % list(acceptable_overlaps)
         location = self.getNextTableOrigin(relative_position=relative_position, margin=margin)
-        table = Table(id, df, location, total_row=total_row, include_header=include_header, include_index=include_index, include_id=include_id, body_style=body_style)
+        with self.getWorkbook().getInstrumentation().phase('build_table', self.getId(), id) as record:
+            table = Table(id, df, location, total_row=total_row, include_header=include_header, include_index=include_index, include_id=include_id, body_style=body_style)
+            record.count(cells=table.getWidth() * table.getHeight())
+        if on_overlap != 'ignore':
+            overlaps = self.getLayout().findOverlaps(SheetLayout.getRectangle(table), exclude=table.getId())
+            if len(overlaps) > 0:
+                message = 'Table %s at %s overlaps %s on sheet %s.' % (
+                    table.getId(), location, ', '.join(str(other.getId()) for other in overlaps), self.getId())
+                if on_overlap == 'raise':
+                    raise ValueError(message)
+                warnings.warn(message)
         self.tables[table.getId()] = table
+        self.getLayout().add(table)
         return table
 
     def getTables(self):
         return self.tables
 
+    def getTableAt(self, x, y):
+        """
+        :param x: int, column on the sheet
+        :param y: int, row on the sheet
+        :return: Table covering the cell, or None
+        """
+        return self.getLayout().findTable(x, y)
+
+    def getOverlappingTables(self):
+        """
+        :return: list of (table, table) pairs whose areas overlap
+        """
+        return self.getLayout().getOverlaps()
+
+    def iterRows(self, formulas='text'):
+        """
+        Yield the sheet's rows top to bottom, merging the rows of every table so that each spreadsheet row is
+        produced exactly once. Where tables share a row, their cells are written in table order.
+        :param formulas: str, 'text' to render formulas or 'value' to replace them with their computed values
+        :return: generator of (row, [(column, value, style_prefix, kind), ...])
+        """
+        merged = heapq.merge(
+            *[table.iterRows(formulas=formulas) for table in self.getTables().values()], key=lambda row: row[0])
+        for y, rows in itertools.groupby(merged, key=lambda row: row[0]):
+            yield y, [write for row in rows for write in row[1]]
+
+    def prepareExport(self, constant_memory=False, lazy=False):
+        """
+        Do all of the work of exporting the sheet short of writing it: formulas are rendered and values
+        classified and converted, so that writing is only a matter of passing the buffers to xlsxwriter.
+        :param constant_memory: bool, if True the tables are merged into rows in sheet order
+        :param lazy: bool, if True rows are only prepared as they are iterated over, so that a constant_memory
+            export holds one row at a time
+        :return: list of buffers in write order, each either ('rows', [(row, [(column, value, style_prefix,
+            kind), ...]), ...]) or ('columns', first row, [(column, ExportColumn), ...])
+        """
+        def renderRows(rows):
+            for y, writes in rows:
+                writes = [(x, toWrittenValue(d, self), style_prefix, kind) for x, d, style_prefix, kind in writes]
+                yield y, [write for write in writes if write[1] is not NOT_WRITTEN]
+
+        def renderColumn(column):
+            if column.kind != OBJECT:
+                return column
+            data = [toWrittenValue(d, self) for d in column.data]
+            unwritten = np.array([d is NOT_WRITTEN for d in data], dtype=bool)
+            if not unwritten.any():
+                return column._replace(data=data)
+            data = [None if d is NOT_WRITTEN else d for d in data]
+            return column._replace(data=data, valid=column.valid & ~unwritten)
+
+        if constant_memory:
+            rows = renderRows(self.iterRows())
+            return [('rows', rows if lazy else list(rows))]
+        instrumentation = self.getWorkbook().getInstrumentation()
+        buffers = []
+        for table in self.getTables().values():
+            with instrumentation.phase('prepare_table', self.getId(), table.getId()) as record:
+                rows = list(renderRows(itertools.chain(table.iterHeaderRows(), table.iterTotalRow())))
+                chunks = [(y, [(x, renderColumn(column)) for x, column in columns])
+                          for y, height, columns in table.iterExportChunks()]
+                if instrumentation.enabled:
+                    # Formulas in object columns aren't counted, finding them would cost a pass over the values
+                    record.count(
+                        cells=sum(len(writes) for y, writes in rows)
+                        + sum(c.valid.sum() for y, columns in chunks for x, c in columns),
+                        formulas=sum(c.valid.sum() for y, columns in chunks for x, c in columns if c.kind == FORMULA)
+                        + (table.getCellStore().getWidth() if table.total_row else 0))
+            buffers.append(('rows', rows))
+            y_offset = table.getDataOriginLocation().getY()
+            buffers.extend(('columns', y_offset + y, columns) for y, columns in chunks)
+        return buffers
+
+    def getContentHash(self, constant_memory=False):
+        """
+        Hash identifying the export buffers of the sheet, as made by prepareExport.
+        :param constant_memory: bool
+        :return: str
+        """
+        return hashKeys(
+            EXPORT_CACHE_VERSION, 'sheet', self.getId(), constant_memory,
+            *[table.getContentHash() for table in self.getTables().values()])
+
+    def exportAsCSV(self, path, formulas='text'):
+        """
+        Write the sheet as a csv laid out like its .xlsx export, straight from the tables.
+        :param path: str
+        :param formulas: str, 'text' to write formulas as they appear in the .xlsx (e.g. '=SUM(B3:B9)') or
+            'value' to write their computed values
+        :return:
+        """
+        acceptable_formulas = ('text', 'value')
+        assert formulas in acceptable_formulas, 'Acceptable formulas arguments are %s.' % list(acceptable_formulas)
+        width = max([table.getLocation().getX() + table.getWidth() for table in self.getTables().values()] + [0])
+        this_csv = open(path, 'w')
+        wr = csv.writer(this_csv, quoting=csv.QUOTE_ALL)
+        next_row = 0
+        for y, writes in self.iterRows(formulas=formulas):
+            for empty in range(next_row, y):
+                wr.writerow([''] * width)
+            row = [''] * width
+            for x, d, style_prefix, kind in writes:
+                row[x] = toCSVValue(d, kind, self, formulas)
+            wr.writerow(row)
+            next_row = y + 1
+        this_csv.close()
+
     def getTable(self, id):
         return self.getTables()[id]
 
+def iterReferencedRanges(arg):
+    """
+    Yield the ranges a formula argument refers to, as (top_left, bottom_right) pairs of Cells or RowCursors. A
+    single cell is yielded as a range of one.
+    """
+    if isinstance(arg, (Cell, RowCursor)):
+        yield arg, arg
+    elif isinstance(arg, TemplateCursor):
+        start = arg.atRow(0).row
+        for top_left, bottom_right in iterReferencedRanges(arg.getTemplate().getExpression()):
+            yield tuple(end.shifted(start) if isinstance(end, RowCursor) else end for end in (top_left, bottom_right))
+    elif type(arg) == TemplateRow and arg.formula is None:
+        # Read from a copy, so that indexing doesn't build the row out and take its template out of use
+        for pair in iterReferencedRanges(arg.template.instantiate(arg.row)):
+            yield pair
+    elif isinstance(arg, Formula):
+        if arg.getFunction() is Function.range():
+            yield arg.getArgs()[0], arg.getArgs()[1]
+        else:
+            for a in arg.getArgs():
+                for pair in iterReferencedRanges(a):
+                    yield pair
+
+
+class ReferenceIndex():
+    """
+    Reverse index of the references between the tables of a workbook: for each table, the formulas referring
+    into it. References are kept relative to the tables at both ends, as cells are, so moving tables leaves the
+    index valid. Tables are indexed the first time a lookup runs after they were added, a template column as
+    a single entry, and dropped once they are no longer part of the workbook. An edit of a formula or cell
+    can't be traced back to the tables holding it, so the first lookup after any edit indexes every table again.
+    """
+
+    def __init__(self, wb):
+        self.workbook = wb
+        # source table -> [(target table, entry)], and target table -> {source table: [entry]}. An entry is
+        # (x0, y0, x1, y1, x, y, rows, step): rows cells of the source from (x, y) down reference the range
+        # (x0, y0):(x1, y1) of the target, moving down with them if step
+        self.sources = {}
+        self.targets = {}
+        # RenderCache.edits as of the last update
+        self.edits = RenderCache.edits
+
+    def _getTables(self):
+        return [table for sheet in self.workbook.getSheets().values() for table in sheet.getTables().values()]
+
+    def update(self):
+        tables = self._getTables()
+        current = set(tables)
+        edited = self.edits != RenderCache.edits
+        self.edits = RenderCache.edits
+        for source in [source for source in self.sources if edited or source not in current]:
+            self._drop(source)
+        for table in tables:
+            if table not in self.sources:
+                self._index(table)
+        return current
+
+    def _drop(self, source):
+        for target, entry in self.sources.pop(source):
+            sources = self.targets.get(target)
+            if sources is not None:
+                sources.pop(source, None)
+                if len(sources) == 0:
+                    del self.targets[target]
+
+    def _index(self, table):
+        store = table.getCellStore()
+        references = []
+        for x in range(store.getWidth()):
+            template = store.getTemplate(x)
+            rows = range(store.getHeight())
+            if template is not None:
+                for top_left, bottom_right in iterReferencedRanges(template.getExpression()):
+                    self._addRange(references, top_left, bottom_right, x, 0, store.data_height)
+                rows = range(store.data_height, store.getHeight())
+            for y in rows:
+                data = store.getData(x, y)
+                if isinstance(data, (Cell, Formula)):
+                    for top_left, bottom_right in iterReferencedRanges(data):
+                        self._addRange(references, top_left, bottom_right, x, y, 1)
+        self.sources[table] = references
+        for target, entry in references:
+            self.targets.setdefault(target, {}).setdefault(table, []).append(entry)
+
+    def _addRange(self, references, top_left, bottom_right, x, y, rows):
+        step = isinstance(top_left, RowCursor)
+        if step != isinstance(bottom_right, RowCursor):
+            # A range with one end fixed and the other moving changes shape row by row
+            for row in range(rows):
+                self._addRange(references, top_left.atRow(row) if step else top_left,
+                               bottom_right if step else bottom_right.atRow(row), x, y + row, 1)
+            return
+        if step:
+            top_left, bottom_right = top_left.cell, bottom_right.cell
+        # Only ranges within one table are indexed, as only those can be evaluated
+        if type(top_left) != Cell or type(bottom_right) != Cell or top_left.table is None \
+                or top_left.table is not bottom_right.table:
+            return
+        references.append((top_left.table, (
+            top_left.location.x, top_left.location.y, bottom_right.location.x, bottom_right.location.y,
+            x, y, rows, step)))
+
+    def getDependents(self, cell):
+        """
+        :param cell: Cell of a table
+        :return: list of the Cells whose formulas refer to cell directly
+        """
+        table = cell.getTable()
+        if table is None:
+            return []
+        tx, ty = cell.location.x, cell.location.y
+        dependents = []
+        for source, entries in self.targets.get(table, {}).items():
+            store = source.getCellStore()
+            for x0, y0, x1, y1, x, y, rows, step in entries:
+                if not x0 <= tx <= x1:
+                    continue
+                if step:
+                    first, last = max(0, ty - y1), min(rows - 1, ty - y0)
+                elif y0 <= ty <= y1:
+                    first, last = 0, rows - 1
+                else:
+                    continue
+                dependents.extend(store.getCell(x, y + row) for row in range(first, last + 1))
+        # A formula referring to the cell more than once is listed once
+        return list(OrderedDict.fromkeys(dependents))
+
+    def getDanglingReferences(self, current):
+        """
+        :param current: set of the tables in the workbook, as returned by update()
+        :return: list of (Cell, Table) pairs, a cell of the workbook and a table outside it that it refers to
+        """
+        dangling = []
+        for target, sources in self.targets.items():
+            if target in current:
+                continue
+            for source, entries in sources.items():
+                store = source.getCellStore()
+                for x0, y0, x1, y1, x, y, rows, step in entries:
+                    dangling.extend((store.getCell(x, y + row), target) for row in range(rows))
+        return list(OrderedDict.fromkeys(dangling))
+
+
 class Workbook():
 
-    def __init__(self, id):
+    def __init__(self, id, instrumentation=None):
+        """
+        :param id: str
+        :param instrumentation: Instrumentation receiving timing events as tables are built and exported, e.g.
+            a HotspotReporter. By default events are ignored
+        """
         self._setId(id)
+        self.setInstrumentation(instrumentation)
         self.sheets = OrderedDict()
+        self.reference_index = ReferenceIndex(self)
 
     def __repr__(self):
         return '\n----------\n\n'.join(['%s:\n\n%s' % (sheet.getId(),sheet.__repr__()) for sheet in self.getSheets().values()])
@@ -726,6 +2573,79 @@ class Workbook():
     def getSheets(self):
         return self.sheets
 
+    def getCellAt(self, sheet_id, x, y):
+        """
+        :param sheet_id: id of a sheet of the workbook
+        :param x: int, column on the sheet
+        :param y: int, row on the sheet
+        :return: the body Cell of the table at that position, or None for headers and empty cells
+        """
+        sheet = self.getSheets().get(sheet_id)
+        if sheet is None:
+            return None
+        table = sheet.getTableAt(x, y)
+        if table is None:
+            return None
+        origin_x, origin_y = table.getDataOrigin()
+        store = table.getCellStore()
+        x, y = x - origin_x, y - origin_y
+        if not (0 <= x < store.getWidth() and 0 <= y < store.getHeight()):
+            return None
+        return store.getCell(x, y)
+
+    def resolveReference(self, reference, sheet_id=None):
+        """
+        Find the cell an A1 reference such as "'Summary'!D14" points to.
+        :param reference: str
+        :param sheet_id: id of the sheet references without a sheet name are on
+        :return: Cell, or None
+        """
+        if '!' in reference:
+            sheet_id, reference = reference.rsplit('!', 1)
+            if sheet_id.startswith("'") and sheet_id.endswith("'"):
+                sheet_id = sheet_id[1:-1].replace("''", "'")
+        y, x = xl_cell_to_rowcol(reference)
+        return self.getCellAt(sheet_id, x, y)
+
+    def getDependents(self, cell, transitive=False):
+        """
+        Find the cells whose formulas refer to a cell, to see what a change to it would affect.
+        :param cell: Cell of a table in the workbook
+        :param transitive: bool, if True also include the cells depending on those, and so on
+        :return: list of Cells
+        """
+        self.reference_index.update()
+        dependents = self.reference_index.getDependents(cell)
+        if not transitive:
+            return dependents
+        seen = set(dependents)
+        i = 0
+        while i < len(dependents):
+            for dependent in self.reference_index.getDependents(dependents[i]):
+                if dependent not in seen:
+                    seen.add(dependent)
+                    dependents.append(dependent)
+            i += 1
+        return dependents
+
+    def getDanglingReferences(self):
+        """
+        Find formulas referring to tables that are not part of the workbook, such as a table replaced by a later
+        addTable under the same id, or a table of another workbook. They would be exported pointing at
+        whatever now occupies the old position.
+        :return: list of (Cell, Table) pairs, the referring cell and the table it refers to
+        """
+        return self.reference_index.getDanglingReferences(self.reference_index.update())
+
+    def setInstrumentation(self, instrumentation):
+        if instrumentation is None:
+            instrumentation = Instrumentation()
+        assert isinstance(instrumentation, Instrumentation), 'instrumentation must be an Instrumentation.'
+        self.instrumentation = instrumentation
+
+    def getInstrumentation(self):
+        return self.instrumentation
+
     def _setId(self, id):
         self.id = id
 
@@ -791,68 +2711,158 @@ class Workbook():
         self.sheets[sheet.getId()] = sheet
         return sheet
 
-    def exportAsXLSX(self, path):
-        dir = '/'.join(path.split('/')[:-1]) + '/'
-        if not os.path.exists(dir):
-            os.makedirs(dir)
-        workbook = xlsxwriter.Workbook(path, {'default_date_format': 'mm/dd/yy'})
-        styles = self._getStylesDict(workbook)
-        for sheet in self.getSheets().values():
-            xlsx_sheet = workbook.add_worksheet(name=sheet.getId())
-            def writeFunction(y, x, d, style_prefix):
-                if isDatetimeLike(d):
-                    style_suffix = '_date'
-                    if type(d) == dt.date:
-                        xlsx_sheet.write_datetime(y, x, d, styles[style_prefix + style_suffix])
-                    else:
-                        xlsx_sheet.write_datetime(y, x, d.date(), styles[style_prefix + style_suffix])
-                elif isinstance(d, Formula):
-                    xlsx_sheet.write(y, x, d.toFinalString(sheet), styles[style_prefix])
-                else:
-                    try:
+    def _iterPreparedSheets(self, sheets, constant_memory=False, cache=None, sheet_keys=None, workers=1):
+        """
+        Prepare sheets for export, in order.
+        :param sheets: list of Sheets
+        :param constant_memory: bool
+        :param cache: ExportCache or None. It is only used from the calling thread
+        :param sheet_keys: dict of sheet id -> content hash, needed with a cache
+        :param workers: int, number of threads preparing sheets. With more than one, up to this many sheets are
+            prepared ahead of the one being written, so that at most workers + 1 sheets' buffers are held at once
+        :return: generator of each sheet's buffers
+        """
+        if workers == 1 or len(sheets) <= 1:
+            for sheet in sheets:
+                if cache is None:
+                    yield sheet.prepareExport(constant_memory, lazy=True)
+                    continue
+                buffers = cache.getSheet(sheet_keys[sheet.getId()])
+                if buffers is None:
+                    buffers = sheet.prepareExport(constant_memory)
+                    cache.putSheet(sheet_keys[sheet.getId()], buffers)
+                yield buffers
+            return
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            remaining = iter(sheets)
+            pending = collections.deque()
+
+            def submitNext():
+                for sheet in itertools.islice(remaining, 1):
+                    buffers = None if cache is None else cache.getSheet(sheet_keys[sheet.getId()])
+                    future = None if buffers is not None else pool.submit(sheet.prepareExport, constant_memory)
+                    pending.append((sheet, buffers, future))
+
+            for i in range(workers):
+                submitNext()
+            while pending:
+                sheet, buffers, future = pending.popleft()
+                submitNext()
+                if future is not None:
+                    buffers = future.result()
+                    if cache is not None:
+                        cache.putSheet(sheet_keys[sheet.getId()], buffers)
+                yield buffers
+
+    def exportAsXLSX(self, path, constant_memory=False, cache=None, created=None, workers=1):
+        """
+        Write the workbook to an .xlsx file.
+        :param path: str
+        :param constant_memory: bool, if True the tables on each sheet are merged into a single row order and
+            xlsxwriter's constant_memory mode is used, so that only one row is held in memory at a time
+        :param cache: ExportCache. If the workbook is unchanged since it was last exported through the cache the
+            cached file is copied to path, otherwise only the sheets that changed are prepared again. Cached
+            sheets are held in memory whole, even with constant_memory
+        :param created: datetime recorded as the file's creation time, defaults to now. The file's contents only
+            depend on the workbook and this, so passing a fixed time gives identical files for identical workbooks
+        :param workers: int, number of threads preparing sheets (rendering formulas and converting values) ahead
+            of the sheet being written. Sheets are still written one at a time and in order, so the file is the
+            same whatever the number of workers. Writing usually takes most of the time, so this mostly pays for
+            sheets heavy in formulas
+        :return:
+        """
+        assert isIntegerLike(workers) and workers >= 1, 'workers must be a positive integer.'
+        instrumentation = self.getInstrumentation()
+        with instrumentation.export():
+            dir = '/'.join(path.split('/')[:-1]) + '/'
+            if not os.path.exists(dir):
+                os.makedirs(dir)
+            sheets = list(self.getSheets().values())
+            sheet_keys = {}
+            if cache is not None:
+                for sheet in sheets:
+                    with instrumentation.phase('hash_sheet', sheet.getId()):
+                        sheet_keys[sheet.getId()] = sheet.getContentHash(constant_memory)
+                # The creation time is part of the file, so a file cached with another one can't be handed back.
+                # Without one the file gets the time it was first exported
+                workbook_key = hashKeys(
+                    EXPORT_CACHE_VERSION, 'workbook', xlsxwriter.__version__,
+                    None if created is None else created.isoformat(),
+                    *[sheet_keys[sheet.getId()] for sheet in sheets])
+                if cache.getWorkbook(workbook_key, path):
+                    return
+
+            workbook = xlsxwriter.Workbook(path, {'default_date_format': 'mm/dd/yy', 'constant_memory': constant_memory})
+            if created is not None:
+                workbook.set_properties({'created': created})
+            styles = self._getStylesDict(workbook)
+            # With one worker, sheets are prepared one at a time as they are written, so only one sheet's buffers
+            # are alive at once
+            prepared = self._iterPreparedSheets(sheets, constant_memory, cache, sheet_keys, workers)
+            for sheet, buffers in zip(sheets, prepared):
+                xlsx_sheet = workbook.add_worksheet(name=sheet.getId())
+                def writeFunction(y, x, d, style_prefix, kind=OBJECT):
+                    if kind == NUMBER:
+                        xlsx_sheet.write_number(y, x, d, styles[style_prefix])
+                    elif kind == DATETIME:
+                        xlsx_sheet.write_number(y, x, d, styles[style_prefix + '_date'])
+                    elif kind == FORMULA:
+                        xlsx_sheet.write_formula(y, x, d, styles[style_prefix])
+                    elif kind == STRING:
                         xlsx_sheet.write(y, x, d, styles[style_prefix])
-                    except TypeError:
-                        # This is specifically intended to handle NaNs, so that they aren't written at all
-                        pass
-            for table in sheet.getTables().values():
-                x_offset, y_offset = table.getLocation().asTuple()
-                row_counter = 0
-                if table.getIncludeId():
-                    writeFunction(y_offset, x_offset, table.getId(), 'columns_title')
-                    for col in range(1, table.getWidth()):
-                        writeFunction(y_offset, x_offset+col, '', 'columns_title')
-                    row_counter += 1
-                if table.getIncludeHeader():
-                    col_counter = 0
-                    if table.getIncludeIndex():
-                        ind_offset = 1
-                        writeFunction(y_offset+row_counter, x_offset+col_counter, '', 'column_header')
+                    elif isDatetimeLike(d):
+                        style_suffix = '_date'
+                        if type(d) == dt.date:
+                            xlsx_sheet.write_datetime(y, x, d, styles[style_prefix + style_suffix])
+                        else:
+                            xlsx_sheet.write_datetime(y, x, d.date(), styles[style_prefix + style_suffix])
                     else:
-                        ind_offset=0
-                    for column in table.getCellDF().columns:
-                        writeFunction(y_offset+row_counter, x_offset+ind_offset+col_counter, column, 'column_header')
-                        col_counter += 1
-                    row_counter += 1
-                for row in table.getCellDF().iterrows():
-                    col_counter = 0
-                    if table.getIncludeIndex():
-                        writeFunction(row_counter+y_offset, x_offset, row[0], 'row_header')
-                        col_counter += 1
-                    for i in row[1].index:
-                        d = row[1][i].getData()
-                        writeFunction(row_counter+y_offset, col_counter+x_offset, d, table.getBodyStyle())
-                        col_counter += 1
-                    row_counter += 1
-        workbook.close()
-
-    def exportAsXLSXandCSVs(self, path):
-        self.exportAsXLSX(path)
-        wb = openpyxl.load_workbook(path)
-        dir = '/'.join(path.split('/')[:-1]) + '/'
-        for i in self.getSheets():
-            sh = wb.get_sheet_by_name(i)
-            this_csv = open(dir + i + '.csv', 'w')
-            wr = csv.writer(this_csv, quoting=csv.QUOTE_ALL)
-            for row in sh.rows:
-                wr.writerow([x.value for x in row])
-            this_csv.close()
\ No newline at end of file
+                        try:
+                            xlsx_sheet.write(y, x, d, styles[style_prefix])
+                        except TypeError:
+                            # This is specifically intended to handle NaNs, so that they aren't written at all
+                            pass
+                def writeColumn(y, x, column):
+                    if column.kind == OBJECT:
+                        for i in np.flatnonzero(column.valid):
+                            writeFunction(y+i, x, column.data[i], column.style_prefix)
+                    elif column.kind != EMPTY:
+                        style = styles[column.style_prefix + ('_date' if column.kind == DATETIME else '')]
+                        for start, stop in contiguousRuns(column.valid):
+                            xlsx_sheet.write_column(y+start, x, column.data[start:stop], style)
+                with instrumentation.phase('write_sheet', sheet.getId()) as record:
+                    for buffer in buffers:
+                        if buffer[0] == 'rows':
+                            for y, writes in buffer[1]:
+                                record.count(cells=len(writes))
+                                for x, d, style_prefix, kind in writes:
+                                    writeFunction(y, x, d, style_prefix, kind)
+                        else:
+                            for x, column in buffer[2]:
+                                record.count(cells=int(column.valid.sum()))
+                                writeColumn(buffer[1], x, column)
+            with instrumentation.phase('close'):
+                workbook.close()
+            if cache is not None:
+                cache.putWorkbook(workbook_key, path)
+                cache.evict()
+
+    def exportAsXLSXandCSVs(self, path, formulas='text', constant_memory=False, cache=None, created=None, workers=1):
+        """
+        Write the workbook to an .xlsx file and each sheet to a csv next to it, named after the sheet. The csvs
+        are produced from the tables directly rather than by reading the .xlsx back.
+        :param path: str
+        :param formulas: str, 'text' to write formulas to the csvs as text or 'value' to write their computed values
+        :param constant_memory: bool, passed on to exportAsXLSX
+        :param cache: ExportCache, passed on to exportAsXLSX
+        :param created: datetime, passed on to exportAsXLSX
+        :param workers: int, passed on to exportAsXLSX
+        :return:
+        """
+        instrumentation = self.getInstrumentation()
+        with instrumentation.export():
+            self.exportAsXLSX(path, constant_memory=constant_memory, cache=cache, created=created, workers=workers)
+            dir = '/'.join(path.split('/')[:-1]) + '/'
+            for i, sheet in self.getSheets().items():
+                with instrumentation.phase('write_csv', i):
+                    sheet.exportAsCSV(dir + i + '.csv', formulas=formulas)
\ No newline at end of file
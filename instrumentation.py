@@ -0,0 +1,190 @@
+import time
+import threading
+import tracemalloc
+from collections import namedtuple
+from contextlib import contextmanager
+
+import pandas as pd
+
+# One timed phase of building or exporting a workbook. table is None for phases that cover a whole sheet, sheet
+# is None for the workbook-wide close. memory is the peak growth in traced memory in bytes, None unless traced.
+ExportEvent = namedtuple('ExportEvent', ['phase', 'sheet', 'table', 'seconds', 'cells', 'formulas', 'memory'])
+
+
+class NullRecord():
+    """Stand-in for PhaseRecord when instrumentation is off; counting is a no-op."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def count(self, cells=0, formulas=0):
+        pass
+
+
+NULL_RECORD = NullRecord()
+
+# Phases being traced, across all instrumentations since tracemalloc is process-wide
+_traced_records = set()
+_traced_lock = threading.Lock()
+
+
+def _foldPeak():
+    """
+    Credit the peak traced memory since the last reset to every phase being traced, then reset it. Phases can
+    nest or overlap, so each one keeps its own running peak rather than relying on tracemalloc's.
+    """
+    peak = tracemalloc.get_traced_memory()[1]
+    for record in _traced_records:
+        record.memory_peak = max(record.memory_peak, peak)
+    tracemalloc.reset_peak()
+
+
+class PhaseRecord():
+    """Times one phase and collects its counts, then hands an ExportEvent to the instrumentation on exit."""
+
+    __slots__ = ('instrumentation', 'phase', 'sheet', 'table', 'cells', 'formulas', 'start', 'memory_start',
+                 'memory_peak')
+
+    def __init__(self, instrumentation, phase, sheet, table):
+        self.instrumentation = instrumentation
+        self.phase = phase
+        self.sheet = sheet
+        self.table = table
+        self.cells = 0
+        self.formulas = 0
+
+    def __enter__(self):
+        self.memory_start = None
+        if tracemalloc.is_tracing():
+            with _traced_lock:
+                _foldPeak()
+                self.memory_start = self.memory_peak = tracemalloc.get_traced_memory()[0]
+                _traced_records.add(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        memory = None
+        if self.memory_start is not None:
+            with _traced_lock:
+                if tracemalloc.is_tracing():
+                    _foldPeak()
+                    memory = self.memory_peak - self.memory_start
+                _traced_records.discard(self)
+        self.instrumentation.event(
+            ExportEvent(self.phase, self.sheet, self.table, seconds, self.cells, self.formulas, memory))
+        return False
+
+    def count(self, cells=0, formulas=0):
+        self.cells += cells
+        self.formulas += formulas
+
+
+class Instrumentation():
+    """
+    Receives timing events from a Workbook as its tables are built and exported. This base class ignores them
+    and costs next to nothing; subclass it and override event() to record them, as HotspotReporter does.
+
+    Phases reported:
+        'build_table': construction of a table's cells in Sheet.addTable
+        'prepare_table': classifying, converting and rendering the formulas of a table for export
+        'write_sheet': passing a sheet's prepared buffers to xlsxwriter. For constant_memory exports tables
+            are prepared as their rows are written, so this phase includes the preparation
+        'close': xlsxwriter assembling and compressing the file
+        'hash_sheet': hashing a sheet's contents when exporting through an ExportCache
+        'write_csv': writing a sheet to csv
+    """
+
+    enabled = False
+
+    def __init__(self, memory=False):
+        """
+        :param memory: bool, if True memory is traced with tracemalloc during exports, which slows them down
+        """
+        self.memory = memory
+
+    def phase(self, phase, sheet=None, table=None):
+        """
+        Context manager timing a phase; counts are added with .count(cells=..., formulas=...).
+        :param phase: str
+        :param sheet: str, sheet id
+        :param table: str, table id
+        :return: PhaseRecord, or a shared no-op record when disabled
+        """
+        if not self.enabled:
+            return NULL_RECORD
+        return PhaseRecord(self, phase, sheet, table)
+
+    @contextmanager
+    def export(self):
+        """
+        Context manager around an export, tracing memory throughout if asked to. Exports can nest, as
+        exportAsXLSXandCSVs calls exportAsXLSX.
+        """
+        start_tracing = self.enabled and self.memory and not tracemalloc.is_tracing()
+        if start_tracing:
+            tracemalloc.start()
+        try:
+            yield self
+        finally:
+            if start_tracing:
+                tracemalloc.stop()
+
+    def event(self, event):
+        pass
+
+
+class HotspotReporter(Instrumentation):
+    """Collects every event, and summarizes where the time went table by table."""
+
+    enabled = True
+
+    def __init__(self, memory=False):
+        super().__init__(memory=memory)
+        self.events = []
+
+    def event(self, event):
+        # list.append is atomic, so events can arrive from workbooks exported on several threads, e.g. by an
+        # ExportPipeline
+        self.events.append(event)
+
+    def clear(self):
+        self.events = []
+
+    def toDF(self):
+        return pd.DataFrame(self.events, columns=ExportEvent._fields)
+
+    def summarize(self):
+        """
+        Total the events by sheet, table and phase.
+        :return: pd.DataFrame sorted by time spent, slowest first, with the share of the total time
+        """
+        events = self.toDF()
+        events[['sheet', 'table']] = events[['sheet', 'table']].fillna('')
+        events['memory'] = pd.to_numeric(events['memory'])
+        summary = events.groupby(['sheet', 'table', 'phase'], sort=False).agg({
+            'seconds': 'sum', 'cells': 'sum', 'formulas': 'sum', 'memory': 'max'})
+        summary['share'] = summary['seconds'] / summary['seconds'].sum()
+        summary['us_per_cell'] = 1e6 * summary['seconds'] / summary['cells'].where(summary['cells'] > 0)
+        return summary.sort_values('seconds', ascending=False)
+
+    def report(self, top=10):
+        """
+        Print the slowest phases of the last exports.
+        :param top: int, number of rows to print
+        :return: pd.DataFrame, the full summary
+        """
+        summary = self.summarize()
+        if len(summary) == 0:
+            print('No events recorded.')
+            return summary
+        printed = summary.head(top).copy()
+        printed['memory'] = printed['memory'] / 2 ** 20
+        printed = printed.rename(columns={'memory': 'peak_mb'})
+        print(printed.to_string(float_format=lambda v: '%.4g' % v))
+        print('Total: %.4gs over %d events' % (summary['seconds'].sum(), len(self.events)))
+        return summary
@@ -0,0 +1,208 @@
+import time
+import asyncio
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+# One workbook to produce. fetch() returns the data the workbook is built from, e.g. the results of
+# Utils.runDatabaseQuery; build(data) returns the Workbook, which is exported to path; upload(path), if given,
+# publishes the file, e.g. with Utils.saveFileToS3. fetch may be None, in which case build gets None
+ExportSpec = namedtuple('ExportSpec', ['id', 'fetch', 'build', 'path', 'upload'])
+ExportSpec.__new__.__defaults__ = (None,)
+
+# Outcome of one spec: path is None and error set if any stage failed
+PipelineResult = namedtuple('PipelineResult', ['id', 'path', 'error'])
+
+STAGES = ('fetch', 'export', 'upload')
+
+# Marks the end of a stage's input
+DONE = object()
+
+
+def buildAndExport(build, data, path, export_options):
+    """
+    Build a workbook and export it. Run in the export executor; with a ProcessPoolExecutor, build and the data
+    have to be picklable, so build must be a module-level function.
+    """
+    build(data).exportAsXLSX(path, **export_options)
+    return path
+
+
+class StageMetrics():
+    """Counts and times the items passing through one stage of an ExportPipeline."""
+
+    def __init__(self, stage, concurrency):
+        self.stage = stage
+        self.concurrency = concurrency
+        self.items = 0
+        self.failures = 0
+        self.skipped = 0
+        self.busy = 0.
+        self.blocked = 0.
+        self.first_start = None
+        self.last_end = None
+
+    def record(self, start, end, failed=False):
+        self.items += 1
+        self.failures += int(failed)
+        self.busy += end - start
+        if self.first_start is None or start < self.first_start:
+            self.first_start = start
+        if self.last_end is None or end > self.last_end:
+            self.last_end = end
+
+    def toDict(self):
+        wall = 0. if self.first_start is None else self.last_end - self.first_start
+        return {
+            'stage': self.stage,
+            'items': self.items,
+            'failures': self.failures,
+            'skipped': self.skipped,
+            'busy_seconds': self.busy,
+            'wall_seconds': wall,
+            'items_per_second': self.items / wall if wall > 0 else float('nan'),
+            'mean_seconds': self.busy / self.items if self.items > 0 else float('nan'),
+            # Share of the stage's workers' time spent working while the stage was active
+            'utilization': self.busy / (wall * self.concurrency) if wall > 0 else float('nan'),
+            # Time spent waiting for room in the next stage's queue, i.e. held back by backpressure
+            'blocked_seconds': self.blocked,
+        }
+
+
+class ExportPipeline():
+    """
+    Produce many workbooks at once, overlapping the fetching of their data, their export and their upload. Each
+    stage runs a bounded number of items at a time, fetches and uploads on a thread pool and exports on the
+    export executor, and the stages are joined by bounded queues, so that a slow stage holds the ones before
+    it back rather than letting fetched data or exported files pile up.
+
+        pipeline = ExportPipeline(fetch_concurrency=8, export_concurrency=2)
+        results = pipeline.runBlocking(ExportSpec(
+            id, lambda: runDatabaseQuery(authfile, query, quiet=True), buildReport, path,
+            lambda path: saveFileToS3(path, authfile, bucket, key)) for id, query, path, key in reports)
+        pipeline.getMetrics()
+    """
+
+    def __init__(self, fetch_concurrency=4, export_concurrency=2, upload_concurrency=4, queue_size=None,
+                 export_executor=None, export_options=None):
+        """
+        :param fetch_concurrency: int, most fetches run at a time
+        :param export_concurrency: int, most builds and exports run at a time
+        :param upload_concurrency: int, most uploads run at a time
+        :param queue_size: int, most items waiting between two stages. Defaults to twice the concurrency of
+            the stage taking them
+        :param export_executor: concurrent.futures.Executor building and exporting the workbooks. Defaults to a
+            thread pool of export_concurrency threads; pass a ProcessPoolExecutor to export on several cores
+        :param export_options: dict of keyword arguments for Workbook.exportAsXLSX, e.g. {'constant_memory': True}
+        """
+        self.concurrency = {'fetch': fetch_concurrency, 'export': export_concurrency, 'upload': upload_concurrency}
+        for stage, concurrency in self.concurrency.items():
+            assert isinstance(concurrency, int) and concurrency >= 1, '%s_concurrency must be a positive integer.' % stage
+        self.queue_size = queue_size
+        self.export_executor = export_executor
+        self.export_options = {} if export_options is None else dict(export_options)
+        self.metrics = {stage: StageMetrics(stage, self.concurrency[stage]) for stage in STAGES}
+
+    def _getQueueSize(self, stage):
+        if self.queue_size is not None:
+            return self.queue_size
+        return 2 * self.concurrency[stage]
+
+    async def run(self, specs):
+        """
+        Fetch, export and upload every spec. Failures are reported in the results rather than raised, and a
+        spec that failed in one stage skips the stages after it.
+        :param specs: iterable of ExportSpec, consumed only as the first stage has room for more
+        :return: list of PipelineResult, in the order of specs
+        """
+        self.metrics = {stage: StageMetrics(stage, self.concurrency[stage]) for stage in STAGES}
+        loop = asyncio.get_running_loop()
+        io_executor = ThreadPoolExecutor(max_workers=self.concurrency['fetch'] + self.concurrency['upload'])
+        export_executor = self.export_executor
+        if export_executor is None:
+            export_executor = ThreadPoolExecutor(max_workers=self.concurrency['export'])
+
+        async def fetch(spec, data):
+            if spec.fetch is None:
+                return None
+            return await loop.run_in_executor(io_executor, spec.fetch)
+
+        async def export(spec, data):
+            return await loop.run_in_executor(
+                export_executor, buildAndExport, spec.build, data, spec.path, self.export_options)
+
+        async def upload(spec, path):
+            if spec.upload is None:
+                return path
+            await loop.run_in_executor(io_executor, spec.upload, path)
+            return path
+
+        queues = {stage: asyncio.Queue(self._getQueueSize(stage)) for stage in STAGES}
+        done = asyncio.Queue()
+        stages = [
+            self._runStage('fetch', queues['fetch'], queues['export'], fetch),
+            self._runStage('export', queues['export'], queues['upload'], export),
+            self._runStage('upload', queues['upload'], done, upload),
+        ]
+        tasks = []
+        try:
+            tasks.extend(asyncio.ensure_future(stage) for stage in stages)
+            for i, spec in enumerate(specs):
+                await queues['fetch'].put((i, spec, None, None))
+            await queues['fetch'].put(DONE)
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        finally:
+            io_executor.shutdown(wait=False)
+            if self.export_executor is None:
+                export_executor.shutdown(wait=False)
+        results = {}
+        while not done.empty():
+            item = done.get_nowait()
+            if item is DONE:
+                continue
+            i, spec, path, error = item
+            results[i] = PipelineResult(spec.id, None if error is not None else path, error)
+        return [results[i] for i in sorted(results)]
+
+    async def _runStage(self, stage, inbox, outbox, work):
+        metrics = self.metrics[stage]
+
+        async def worker():
+            while True:
+                item = await inbox.get()
+                if item is DONE:
+                    # Left in the queue for the stage's other workers
+                    await inbox.put(DONE)
+                    return
+                i, spec, value, error = item
+                if error is None:
+                    start = time.perf_counter()
+                    try:
+                        value = await work(spec, value)
+                    except Exception as e:
+                        error = e
+                    metrics.record(start, time.perf_counter(), failed=error is not None)
+                else:
+                    metrics.skipped += 1
+                start = time.perf_counter()
+                await outbox.put((i, spec, value, error))
+                metrics.blocked += time.perf_counter() - start
+
+        await asyncio.gather(*[worker() for _ in range(self.concurrency[stage])])
+        await outbox.put(DONE)
+
+    def runBlocking(self, specs):
+        """Run the pipeline from synchronous code, in a new event loop. See run()."""
+        return asyncio.run(self.run(specs))
+
+    def getMetrics(self):
+        """
+        Throughput of each stage in the last run.
+        :return: pd.DataFrame indexed by stage
+        """
+        return pd.DataFrame([self.metrics[stage].toDict() for stage in STAGES]).set_index('stage')
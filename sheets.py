@@ -4,34 +4,102 @@ sys.path.insert(0, '/home/vagrant/twosixcapital/gspread')
 import pandas as pd
 import numpy as np
 import gspread
+from gspread.utils import rowcol_to_a1
 from oauth2client.service_account import ServiceAccountCredentials
 from oauth2client import tools
 import pdb
 
 SCOPE = 'https://spreadsheets.google.com/feeds'
+# Most cells sent in a single range write; larger frames are written as several ranges of whole rows
+MAX_CELLS_PER_WRITE = 40000
+
+_client = None
+
 
 def get_credentials():
     return ServiceAccountCredentials.from_json_keyfile_name('test-spreadsheet.json', SCOPE)
 
-def df_to_sheets(df, spreadsheet_id, worksheet_id, column_header=True, row_header=True):
 
-    gc = gspread.authorize(get_credentials())
-    wks = getattr(gc.open(spreadsheet_id), worksheet_id.lower())
+def get_client():
+    """Authorized client, created on first use and shared by later calls."""
+    global _client
+    if _client is None:
+        _client = gspread.authorize(get_credentials())
+    return _client
+
+
+def to_sheets_values(values):
+    """
+    Convert a column of values to what the Sheets API accepts: Python numbers and strings, with missing values
+    as empty cells and dates written as to_csv would.
+    """
+    values = pd.Index(values) if isinstance(values, pd.Index) else pd.Series(values)
+    missing = np.asarray(pd.isna(values))
+    if values.dtype.kind in 'biuf':
+        converted = values.tolist()
+    elif values.dtype.kind == 'M':
+        converted = pd.DatetimeIndex(values).astype(str).tolist()
+    else:
+        converted = [v.item() if isinstance(v, np.generic) else v for v in values.tolist()]
+        converted = [v if isinstance(v, (str, int, float, bool)) else str(v) for v in converted]
+    if missing.any():
+        for i in np.flatnonzero(missing):
+            converted[i] = ''
+    return converted
+
+
+def df_to_values(df, column_header=True, row_header=True):
+    """
+    Lay a DataFrame out as a grid of rows, the way df.to_csv() does: a row per column level, with the level
+    names over the index, then the index names if the columns have several levels.
+    :return: list of lists
+    """
+    index_names = [name if name is not None else '' for name in df.index.names]
+    width = df.shape[1]
+    header = []
+    if column_header:
+        if df.columns.nlevels > 1:
+            for level in range(df.columns.nlevels):
+                prefix = []
+                if row_header:
+                    name = df.columns.names[level]
+                    prefix = [name if name is not None else ''] + [''] * (df.index.nlevels - 1)
+                header.append(prefix + to_sheets_values(df.columns.get_level_values(level)))
+            if row_header and any(name is not None for name in df.index.names):
+                header.append(index_names + [''] * width)
+        else:
+            header.append((index_names if row_header else []) + to_sheets_values(df.columns))
+    columns = []
+    if row_header:
+        columns.extend(to_sheets_values(df.index.get_level_values(level)) for level in range(df.index.nlevels))
+    columns.extend(to_sheets_values(df.iloc[:, x].values) for x in range(width))
+    return header + [list(row) for row in zip(*columns)]
+
 
-    to_write = [x.split('|') for x in df.to_csv(sep='|').split('\n')[:-1]]
-    max_cell = wks.get_addr_int(len(to_write), len(to_write[0]))
-    cell_range = wks.range('A1:{}'.format(max_cell))
-    cell_arr = np.array(cell_range).reshape(len(to_write), len(to_write[0]))
+def df_to_sheets(df, spreadsheet_id, worksheet_id, column_header=True, row_header=True, max_cells=MAX_CELLS_PER_WRITE,
+                 value_input_option='RAW'):
+    """
+    :param value_input_option: str, 'RAW' to store values as they are or 'USER_ENTERED' to have Sheets parse
+        them as if typed in, which turns strings such as '=A1', '00123' and '1/2' into formulas, numbers and dates
+    """
+    wks = getattr(get_client().open(spreadsheet_id), worksheet_id.lower())
 
-    for row in range(len(cell_arr)):
-        for col in range(len(cell_arr[0])):
-            cell_arr[row, col].value = to_write[row][col]
+    to_write = df_to_values(df, column_header=column_header, row_header=row_header)
+    if len(to_write) == 0:
+        return
+    num_rows, num_cols = len(to_write), len(to_write[0])
+    if wks.row_count < num_rows or wks.col_count < num_cols:
+        wks.resize(rows=max(wks.row_count, num_rows), cols=max(wks.col_count, num_cols))
 
-    wks.update_cells(list(cell_arr.flatten()))
+    rows_per_write = max(1, max_cells // num_cols)
+    for start in range(0, num_rows, rows_per_write):
+        rows = to_write[start:start + rows_per_write]
+        cell_range = '{}:{}'.format(rowcol_to_a1(start + 1, 1), rowcol_to_a1(start + len(rows), num_cols))
+        wks.update(values=rows, range_name=cell_range, value_input_option=value_input_option)
 
 
 if __name__ == '__main__':
     df = pd.DataFrame([[1,2,3], [4,5,6]], columns=['a', 'b', 'c']).set_index(['a', 'b'])
     df.columns = [['d'], df.columns]
 
-    df_to_sheets(df, 'test', 'Sheet1')
\ No newline at end of file
+    df_to_sheets(df, 'test', 'Sheet1')
@@ -0,0 +1,17 @@
+"""
+The modules use relative imports and the repository has no __init__.py, so they are imported as members of a
+namespace package named after the checkout's directory.
+"""
+import os
+import sys
+import importlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = os.path.basename(ROOT)
+
+if os.path.dirname(ROOT) not in sys.path:
+    sys.path.insert(0, os.path.dirname(ROOT))
+
+
+def load(module):
+    return importlib.import_module('%s.%s' % (PACKAGE, module))
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+from support import load
+
+benchmarks = load('benchmarks')
+
+
+def test_synthetic_frames_are_reproducible():
+    for kind in benchmarks.DATA_KINDS:
+        df = benchmarks.syntheticDataFrame(1000, kind)
+        assert df.shape == (100, 10)
+        pd.testing.assert_frame_equal(df, benchmarks.syntheticDataFrame(1000, kind))
+    assert benchmarks.syntheticDataFrame(10, 'numeric').shape == (3, 3)
+    assert benchmarks.squareDataFrame(1000).shape == (31, 31)
+
+
+def test_every_case_runs_on_every_kind(tmp_path):
+    path = str(tmp_path / 'run.csv')
+    results = benchmarks.runBenchmarks(cells=(100,), memory=False, path=path, quiet=True)
+    expected = [(name, kind) for name, (setup, square) in benchmarks.BENCHMARK_CASES.items()
+                for kind in (['numeric'] if square else benchmarks.DATA_KINDS)]
+    assert list(zip(results['case'], results['kind'])) == expected
+    assert (results['seconds'] > 0).all()
+    assert results['peak_mb'].isnull().all()
+    pd.testing.assert_frame_equal(pd.read_csv(path), results)
+
+
+def test_compare_flags_slower_and_larger_cases():
+    baseline = pd.DataFrame({'case': ['a', 'b', 'c', 'd'], 'kind': 'numeric', 'cells': 100,
+                             'seconds': [1., 1., 0.001, 1.], 'peak_mb': [10., 10., 10., np.nan]})
+    current = baseline.assign(seconds=[1.1, 2., 0.005, 1.], peak_mb=[10., 10., 10., 50.])
+    comparison = benchmarks.compareBenchmarks(baseline, current, quiet=True)
+    # c is five times slower but below min_seconds, d's memory wasn't measured in the baseline
+    assert comparison['regression'].tolist() == [False, True, False, False]
+    current = current.assign(peak_mb=[10., 10., 13., 50.])
+    comparison = benchmarks.compareBenchmarks(baseline, current, quiet=True)
+    assert comparison['regression'].tolist() == [False, True, True, False]
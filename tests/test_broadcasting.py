@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+from support import load
+
+df2xl = load('df2xl')
+Formula = df2xl.Formula
+
+
+def buildTables():
+    sheet = df2xl.Workbook('w').addSheet('s')
+    A = sheet.addTable('A', pd.DataFrame(np.arange(12).reshape(4, 3), columns=list('abc'), index=list('wxyz')))
+    B = sheet.addTable('B', pd.DataFrame(np.arange(12).reshape(4, 3), columns=list('abc')))
+    C = sheet.addTable('C', pd.DataFrame(np.arange(3).reshape(1, 3), columns=list('def')))
+    D = sheet.addTable('D', pd.DataFrame(np.arange(4).reshape(4, 1), columns=['q'], index=list('mnop')))
+    E = sheet.addTable('E', pd.DataFrame([[5]], columns=['e']))
+    return sheet, A, B, C, D, E
+
+
+def render(result, sheet):
+    if isinstance(result, pd.DataFrame):
+        return (list(result.index), list(result.columns),
+                [[formula.toReferenceString(sheet) for formula in row] for row in result.values])
+    return result.toReferenceString(sheet)
+
+
+def renderBroadcasts():
+    sheet, A, B, C, D, E = buildTables()
+    cell = A['a'].iloc[0]
+    row = pd.DataFrame(A.getCellDF()['a'].values.reshape(1, 4))
+    return [render(result, sheet) for result in [
+        Formula.divide(A, B),
+        Formula.add(A, C.getCellDF()),
+        Formula.add(C.getCellDF(), A),
+        Formula.add(A, D.getCellDF()),
+        Formula.multiply(D, A),
+        Formula.add(A, 3, parentheses=True),
+        Formula.add(3, A),
+        Formula.add(A, E),
+        Formula.add(cell, cell, 2, parentheses=True),
+        Formula.subtract(A, B, A, parentheses=True),
+        Formula.sum(A, B),
+        Formula.applyIf(Formula.isEqual(A, B), A, 0),
+        Formula.add(D.getCellDF(), row),
+        Formula.add(row, D),
+    ]]
+
+
+# Rendered by the implementation that tiled DataFrames with pd.concat
+EXPECTED = [
+    (['w', 'x', 'y', 'z'], ['a', 'b', 'c'],
+     [['B3/B10', 'C3/C10', 'D3/D10'], ['B4/B11', 'C4/C11', 'D4/D11'], ['B5/B12', 'C5/C12', 'D5/D12'],
+      ['B6/B13', 'C6/C13', 'D6/D13']]),
+    (['w', 'x', 'y', 'z'], ['a', 'b', 'c'],
+     [['B3+B17', 'C3+C17', 'D3+D17'], ['B4+B17', 'C4+C17', 'D4+D17'], ['B5+B17', 'C5+C17', 'D5+D17'],
+      ['B6+B17', 'C6+C17', 'D6+D17']]),
+    ([0, 1, 2, 3], ['d', 'e', 'f'],
+     [['B17+B3', 'C17+C3', 'D17+D3'], ['B17+B4', 'C17+C4', 'D17+D4'], ['B17+B5', 'C17+C5', 'D17+D5'],
+      ['B17+B6', 'C17+C6', 'D17+D6']]),
+    (['w', 'x', 'y', 'z'], ['a', 'b', 'c'],
+     [['B3+B21', 'C3+B21', 'D3+B21'], ['B4+B22', 'C4+B22', 'D4+B22'], ['B5+B23', 'C5+B23', 'D5+B23'],
+      ['B6+B24', 'C6+B24', 'D6+B24']]),
+    (['m', 'n', 'o', 'p'], [0, 1, 2],
+     [['B21*B3', 'B21*C3', 'B21*D3'], ['B22*B4', 'B22*C4', 'B22*D4'], ['B23*B5', 'B23*C5', 'B23*D5'],
+      ['B24*B6', 'B24*C6', 'B24*D6']]),
+    (['w', 'x', 'y', 'z'], ['a', 'b', 'c'],
+     [['(B3+3)', '(C3+3)', '(D3+3)'], ['(B4+3)', '(C4+3)', '(D4+3)'], ['(B5+3)', '(C5+3)', '(D5+3)'],
+      ['(B6+3)', '(C6+3)', '(D6+3)']]),
+    (['w', 'x', 'y', 'z'], ['a', 'b', 'c'],
+     [['3+B3', '3+C3', '3+D3'], ['3+B4', '3+C4', '3+D4'], ['3+B5', '3+C5', '3+D5'], ['3+B6', '3+C6', '3+D6']]),
+    (['w', 'x', 'y', 'z'], ['a', 'b', 'c'],
+     [['B3+B28', 'C3+B28', 'D3+B28'], ['B4+B28', 'C4+B28', 'D4+B28'], ['B5+B28', 'C5+B28', 'D5+B28'],
+      ['B6+B28', 'C6+B28', 'D6+B28']]),
+    '(B3+B3+2)',
+    (['w', 'x', 'y', 'z'], ['a', 'b', 'c'],
+     [['(B3-B10-B3)', '(C3-C10-C3)', '(D3-D10-D3)'], ['(B4-B11-B4)', '(C4-C11-C4)', '(D4-D11-D4)'],
+      ['(B5-B12-B5)', '(C5-C12-C5)', '(D5-D12-D5)'], ['(B6-B13-B6)', '(C6-C13-C6)', '(D6-D13-D6)']]),
+    (['w', 'x', 'y', 'z'], ['a', 'b', 'c'],
+     [['SUM(B3,B10)', 'SUM(C3,C10)', 'SUM(D3,D10)'], ['SUM(B4,B11)', 'SUM(C4,C11)', 'SUM(D4,D11)'],
+      ['SUM(B5,B12)', 'SUM(C5,C12)', 'SUM(D5,D12)'], ['SUM(B6,B13)', 'SUM(C6,C13)', 'SUM(D6,D13)']]),
+    (['w', 'x', 'y', 'z'], ['a', 'b', 'c'],
+     [['IF(B3=B10,B3,0)', 'IF(C3=C10,C3,0)', 'IF(D3=D10,D3,0)'],
+      ['IF(B4=B11,B4,0)', 'IF(C4=C11,C4,0)', 'IF(D4=D11,D4,0)'],
+      ['IF(B5=B12,B5,0)', 'IF(C5=C12,C5,0)', 'IF(D5=D12,D5,0)'],
+      ['IF(B6=B13,B6,0)', 'IF(C6=C13,C6,0)', 'IF(D6=D13,D6,0)']]),
+    (['m', 'n', 'o', 'p'], ['q'], [['B21+B3'], ['B22+B4'], ['B23+B5'], ['B24+B6']]),
+    ([0], [0, 1, 2, 3], [['B3+B21', 'B4+B22', 'B5+B23', 'B6+B24']]),
+]
+
+
+def test_broadcasts_match_tiled_implementation():
+    assert renderBroadcasts() == EXPECTED
+
+
+def test_single_argument_sum_leaves_table_alone():
+    sheet, A, B, C, D, E = buildTables()
+    summed = Formula.sum(A)
+    assert render(summed, sheet)[2][0] == ['SUM(B3)', 'SUM(C3)', 'SUM(D3)']
+    assert render(A.getCellDF(), sheet)[2][0] == ['B3', 'C3', 'D3']
+
+
+def test_sum_of_range_is_wrapped():
+    sheet, A, B, C, D, E = buildTables()
+    assert Formula.sum(A.getDataRangeReference()).toReferenceString(sheet) == 'SUM(B3:D6)'
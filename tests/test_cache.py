@@ -0,0 +1,78 @@
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+
+from support import load
+
+df2xl = load('df2xl')
+cache = load('cache')
+
+CREATED = dt.datetime(2020, 1, 1)
+
+
+def buildWorkbook():
+    wb = df2xl.Workbook('w')
+    sheet = wb.addSheet('s')
+    months = pd.date_range('2020-01-01', periods=4, freq='MS')
+    cohorts = sheet.addTable('cohorts', pd.DataFrame(np.triu(np.arange(1, 17).reshape(4, 4)), index=months, columns=months))
+    # The lower triangle of a retention table holds Cells, which aren't written
+    sheet.addTable('retention', cohorts.toRetentionRate())
+    chunks = iter([pd.DataFrame({'a': np.arange(3.) + 3 * i, 'b': list('xyz')}, index=range(3 * i, 3 * i + 3))
+                   for i in range(3)])
+    sheet.addTable('chunked', chunks, relative_position='right', total_row=True)
+    return wb
+
+
+def test_cached_export_matches_uncached(tmp_path):
+    export_cache = cache.ExportCache(str(tmp_path / 'cache'))
+    buildWorkbook().exportAsXLSX(str(tmp_path / 'plain.xlsx'), created=CREATED)
+    buildWorkbook().exportAsXLSX(str(tmp_path / 'cached.xlsx'), cache=export_cache, created=CREATED)
+    assert (tmp_path / 'plain.xlsx').read_bytes() == (tmp_path / 'cached.xlsx').read_bytes()
+
+
+def test_export_from_cached_sheets_matches_uncached(tmp_path):
+    export_cache = cache.ExportCache(str(tmp_path / 'cache'))
+    buildWorkbook().exportAsXLSX(str(tmp_path / 'plain.xlsx'), created=CREATED)
+    buildWorkbook().exportAsXLSX(str(tmp_path / 'first.xlsx'), cache=export_cache, created=CREATED)
+    # A second sheet forces the workbook to be assembled again, from the first sheet's cached buffers
+    wb = buildWorkbook()
+    wb.addSheet('extra')
+    wb.exportAsXLSX(str(tmp_path / 'second.xlsx'), cache=export_cache, created=CREATED)
+    plain = pd.read_excel(str(tmp_path / 'plain.xlsx'), sheet_name='s', header=None)
+    second = pd.read_excel(str(tmp_path / 'second.xlsx'), sheet_name='s', header=None)
+    pd.testing.assert_frame_equal(plain, second)
+
+
+def test_cached_sheets_mixed_with_threaded_preparation(tmp_path):
+    export_cache = cache.ExportCache(str(tmp_path / 'cache'))
+    buildWorkbook().exportAsXLSX(str(tmp_path / 'first.xlsx'), cache=export_cache, created=CREATED)
+    # 's' comes from the cache, the other sheets are prepared on threads
+    wb = buildWorkbook()
+    for i in range(3):
+        wb.addSheet('extra%d' % i).addTable('t', pd.DataFrame(np.arange(6.).reshape(3, 2) + i))
+    wb.exportAsXLSX(str(tmp_path / 'cached.xlsx'), cache=export_cache, created=CREATED, workers=2)
+    wb.exportAsXLSX(str(tmp_path / 'plain.xlsx'), created=CREATED)
+    assert (tmp_path / 'plain.xlsx').read_bytes() == (tmp_path / 'cached.xlsx').read_bytes()
+
+
+def test_creation_time_is_part_of_the_workbook_key(tmp_path):
+    export_cache = cache.ExportCache(str(tmp_path / 'cache'))
+    later = dt.datetime(2021, 6, 1)
+    buildWorkbook().exportAsXLSX(str(tmp_path / 'first.xlsx'), cache=export_cache, created=CREATED)
+    buildWorkbook().exportAsXLSX(str(tmp_path / 'cached.xlsx'), cache=export_cache, created=later)
+    buildWorkbook().exportAsXLSX(str(tmp_path / 'plain.xlsx'), created=later)
+    assert (tmp_path / 'plain.xlsx').read_bytes() == (tmp_path / 'cached.xlsx').read_bytes()
+    assert (tmp_path / 'first.xlsx').read_bytes() != (tmp_path / 'cached.xlsx').read_bytes()
+
+
+def test_content_hash_follows_edited_template_rows():
+    sheet = df2xl.Workbook('w').addSheet('s')
+    table = sheet.addTable('t', pd.DataFrame({'a': [1., 2., 3.]}))
+    f = df2xl.Formula.add(table[['a']], 1)
+    formulas = sheet.addTable('f', f, relative_position='right')
+    before = formulas.getContentHash()
+    assert before == formulas.getContentHash()
+    f.iloc[1, 0]._setParentheses(True)
+    assert formulas.getCellStore().getTemplate(0) is None
+    assert formulas.getContentHash() != before
@@ -0,0 +1,83 @@
+import datetime as dt
+import gc
+import weakref
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from support import load
+
+df2xl = load('df2xl')
+
+CREATED = dt.datetime(2020, 1, 1)
+
+
+def makeFrame():
+    return pd.DataFrame({'a': np.arange(10.), 'b': list('abcdefghij')})
+
+
+def iterChunks(df, rows):
+    # Numbered from 0 each, as read_sql makes them
+    for start in range(0, len(df), rows):
+        yield df.iloc[start:start + rows].reset_index(drop=True)
+
+
+def export(data, path, constant_memory=False):
+    wb = df2xl.Workbook('w')
+    sheet = wb.addSheet('s')
+    table = sheet.addTable('t', data, total_row=True)
+    sheet.addTable('f', df2xl.Formula.multiply(table[['a']], 2), relative_position='right')
+    wb.exportAsXLSXandCSVs(path, constant_memory=constant_memory, created=CREATED)
+    return table
+
+
+@pytest.mark.parametrize('constant_memory', [False, True])
+def test_chunked_table_exports_like_a_dataframe(tmp_path, constant_memory):
+    (tmp_path / 'plain').mkdir()
+    (tmp_path / 'chunked').mkdir()
+    plain = export(makeFrame(), str(tmp_path / 'plain' / 'x.xlsx'), constant_memory)
+    chunked = export(iterChunks(makeFrame(), 4), str(tmp_path / 'chunked' / 'x.xlsx'), constant_memory)
+    assert type(chunked.getCellStore()) == df2xl.ChunkedCellStore
+    assert len(chunked.getCellStore().chunks) == 3
+    assert chunked.getCellStore().getData(0, 10).toFinalString(None) == plain.getCellStore().getData(0, 10).toFinalString(None)
+    assert (tmp_path / 'plain' / 'x.xlsx').read_bytes() == (tmp_path / 'chunked' / 'x.xlsx').read_bytes()
+    assert (tmp_path / 'plain' / 's.csv').read_text() == (tmp_path / 'chunked' / 's.csv').read_text()
+
+
+@pytest.mark.parametrize('rows', [
+    lambda: zip(range(3), 'abc'),
+    lambda: ((i, i * i) for i in range(3)),
+    lambda: iter([[1, 'x'], [2, 'y']]),
+])
+def test_iterators_of_rows_are_not_chunks(rows):
+    table = df2xl.Workbook('w').addSheet('s').addTable('t', rows())
+    assert type(table.getCellStore()) == df2xl.CellStore
+    pd.testing.assert_frame_equal(table.getDataDF(), pd.DataFrame(rows()))
+
+
+def test_chunks_after_the_first_must_be_dataframes():
+    chunks = iter([makeFrame(), [[1, 'x']]])
+    with pytest.raises(TypeError):
+        df2xl.Workbook('w').addSheet('s').addTable('t', chunks)
+
+
+def test_spool_is_closed_with_its_table():
+    wb = df2xl.Workbook('w')
+    table = wb.addSheet('s').addTable('t', iterChunks(makeFrame(), 4))
+    spool = weakref.ref(table.getCellStore().spool)
+    assert not spool().closed
+    del wb, table
+    gc.collect()
+    assert spool() is None
+
+
+def test_chunked_table_has_no_dataframe_indexers():
+    sheet = df2xl.Workbook('w').addSheet('s')
+    plain = sheet.addTable('p', makeFrame())
+    chunked = sheet.addTable('c', iterChunks(makeFrame(), 4), relative_position='right')
+    assert plain.ix[3, 'a'] == 3 and plain.iloc[4, 1] == 'e'
+    for indexer in ('ix', 'iloc'):
+        with pytest.raises(TypeError, match='chunks'):
+            getattr(chunked, indexer)
+    pd.testing.assert_frame_equal(chunked.getDataDF(), makeFrame())
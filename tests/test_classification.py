@@ -0,0 +1,75 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from support import load
+
+df2xl = load('df2xl')
+Utils = load('Utils')
+Formula = df2xl.Formula
+
+VALUES = [1, 2.5, np.int64(3), np.int32(4), np.float64(np.nan), np.inf, True, np.bool_(False), 'x',
+          '1', None, pd.Timestamp('2020-01-01'), datetime.date(2020, 1, 2), datetime.datetime(2020, 1, 3),
+          np.datetime64('2020-01-04'), pd.NaT, 1 + 2j, [1]]
+
+
+def classifyValues():
+    return [(Utils.isNumerical(v), Utils.isIntegerLike(v), Utils.isDatetimeLike(v)) for v in VALUES]
+
+
+def renderOperands():
+    sheet = df2xl.Workbook('w').addSheet('s')
+    t = sheet.addTable('t', pd.DataFrame(np.arange(6).reshape(3, 2) * 1.5, columns=list('ab')))
+    nums = pd.DataFrame({'a': [1, 2, 3], 'b': [0.5, np.int64(7), 2.25]})
+    obj = pd.DataFrame({'a': [1, 'x', np.float64(2.5)], 'b': [0.25, None, np.int32(4)]})
+    rendered = []
+    for result in [Formula.add(t, nums), Formula.multiply(t, 2.5), Formula.add(nums, t), Formula.add(t, obj),
+                   Formula.subtract(obj, 3), Formula.sum(nums), Formula.add(t, np.int64(4)),
+                   Formula.divide(t, pd.DataFrame([[2]])), Formula.add(1, 2), Formula.sum(t, 3)]:
+        if isinstance(result, pd.DataFrame):
+            rendered.append([[formula.toReferenceString(sheet) for formula in row] for row in result.values])
+        else:
+            rendered.append(result.toReferenceString(sheet))
+    return rendered
+
+
+# Classified and rendered value by value, before whole columns were classified at once
+EXPECTED_CLASSES = [
+    (True, True, False), (True, False, False), (True, True, False), (True, True, False), (True, False, False),
+    (True, False, False), (False, False, False), (False, False, False), (False, False, False), (False, False, False),
+    (False, False, False), (False, False, True), (False, False, True), (False, False, True), (False, False, True),
+    (False, False, False), (False, False, False), (False, False, False),
+]
+EXPECTED_OPERANDS = [
+    [['B3+1', 'C3+0.5'], ['B4+2', 'C4+7.0'], ['B5+3', 'C5+2.25']],
+    [['B3*2.5', 'C3*2.5'], ['B4*2.5', 'C4*2.5'], ['B5*2.5', 'C5*2.5']],
+    [['1+B3', '0.5+C3'], ['2+B4', '7.0+C4'], ['3+B5', '2.25+C5']],
+    [['B3+1', 'C3+0.25'], ['B4+x', 'C4+nan'], ['B5+2.5', 'C5+4.0']],
+    [['1-3', '0.25-3'], ['x-3', 'nan-3'], ['2.5-3', '4.0-3']],
+    [['SUM(1)', 'SUM(0.5)'], ['SUM(2)', 'SUM(7.0)'], ['SUM(3)', 'SUM(2.25)']],
+    [['B3+4', 'C3+4'], ['B4+4', 'C4+4'], ['B5+4', 'C5+4']],
+    [['B3/2', 'C3/2'], ['B4/2', 'C4/2'], ['B5/2', 'C5/2']],
+    '1+2',
+    [['SUM(B3,3)', 'SUM(C3,3)'], ['SUM(B4,3)', 'SUM(C4,3)'], ['SUM(B5,3)', 'SUM(C5,3)']],
+]
+
+
+def test_value_checks_are_unchanged():
+    assert classifyValues() == EXPECTED_CLASSES
+
+
+def test_float32_values_are_numerical_like_their_columns():
+    # The old check went through np.float, an alias of float, which float32 and float16 values aren't instances of
+    assert Utils.isNumerical(np.float32(0.5)) and Utils.isNumerical(np.float16(0.5))
+    assert Utils.numericalMask(np.array([0.5], dtype=np.float32)).tolist() == [True]
+
+
+def test_column_mask_matches_value_checks():
+    for values in ([1, 2.5, np.nan], np.arange(3), np.array([1.5, np.inf]), np.array(VALUES, dtype=object),
+                   np.array(['a', 'b']), pd.date_range('2020-01-01', periods=2).values):
+        assert Utils.numericalMask(values).tolist() == [Utils.isNumerical(v) for v in values]
+
+
+def test_operands_render_as_before():
+    assert renderOperands() == EXPECTED_OPERANDS
@@ -0,0 +1,61 @@
+import json
+
+import pandas as pd
+import pytest
+
+from support import load
+
+Utils = load('Utils')
+
+
+@pytest.fixture
+def authfile(tmp_path):
+    path = tmp_path / 'auth.json'
+    path.write_text(json.dumps({'URL': 'sqlite:///%s' % (tmp_path / 'test.db')}))
+    yield str(path)
+    Utils.disposeDatabaseEngines()
+
+
+def test_pushed_frame_reads_back(authfile):
+    df = pd.DataFrame({'a': [1, 2, 3], 'b': ['x', 'y', 'z']})
+    assert Utils.pushDataFrameUsingAlchemy(authfile, df, 'pushed', index=False, quiet=True) == 'Success'
+    result = Utils.runDatabaseQuery(authfile, 'SELECT a, b FROM pushed ORDER BY a', quiet=True)
+    pd.testing.assert_frame_equal(result, df)
+
+
+def test_query_without_results_is_committed(authfile):
+    assert Utils.runDatabaseQuery(authfile, 'CREATE TABLE t (a INTEGER)', results=False, quiet=True) is None
+    Utils.runDatabaseQuery(authfile, 'INSERT INTO t VALUES (7)', results=False, quiet=True)
+    # Read on a different pooled connection from the one that wrote
+    Utils.disposeDatabaseEngines(authfile)
+    assert Utils.runDatabaseQuery(authfile, 'SELECT a FROM t', quiet=True)['a'].tolist() == [7]
+
+
+def test_second_query_reuses_pooled_engine(authfile):
+    Utils.runDatabaseQuery(authfile, 'SELECT 1 AS one', quiet=True)
+    engine = Utils.DATABASE_ENGINES.getEngine(authfile, quiet=True)
+    checked_in = engine.pool.checkedin()
+    assert checked_in >= 1
+    assert Utils.runDatabaseQuery(authfile, 'SELECT 2 AS two', quiet=True)['two'].tolist() == [2]
+    assert Utils.DATABASE_ENGINES.getEngine(authfile, quiet=True) is engine
+    # The connection went back to the pool rather than a new one being left open
+    assert engine.pool.checkedin() == checked_in
+    assert engine.pool.checkedout() == 0
+
+
+def test_dispose_resets_the_pool(authfile):
+    Utils.runDatabaseQuery(authfile, 'SELECT 1 AS one', quiet=True)
+    engine = Utils.DATABASE_ENGINES.getEngine(authfile, quiet=True)
+    Utils.disposeDatabaseEngines()
+    assert Utils.DATABASE_ENGINES.engines == {}
+    assert Utils.DATABASE_ENGINES.auths == {}
+    assert Utils.runDatabaseQuery(authfile, 'SELECT 1 AS one', quiet=True)['one'].tolist() == [1]
+    assert Utils.DATABASE_ENGINES.getEngine(authfile, quiet=True) is not engine
+
+
+def test_iterated_query_returns_its_connection(authfile):
+    df = pd.DataFrame({'a': range(25)})
+    Utils.pushDataFrameUsingAlchemy(authfile, df, 'numbers', index=False, quiet=True)
+    chunks = list(Utils.iterDatabaseQuery(authfile, 'SELECT a FROM numbers ORDER BY a', chunksize=10, quiet=True))
+    assert [len(chunk) for chunk in chunks] == [10, 10, 5]
+    assert Utils.DATABASE_ENGINES.getEngine(authfile, quiet=True).pool.checkedout() == 0
@@ -0,0 +1,77 @@
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+
+from support import load
+
+df2xl = load('df2xl')
+
+
+def buildWorkbook(sheets=2):
+    wb = df2xl.Workbook('w')
+    for i in range(sheets):
+        sheet = wb.addSheet('s%d' % i)
+        table = sheet.addTable('t', pd.DataFrame(np.arange(40.).reshape(10, 4), columns=list('abcd')))
+        sheet.addTable('f', df2xl.Formula.add(table[['a', 'b']], table[['c']]), relative_position='right')
+    return wb
+
+
+def test_export_with_fixed_creation_time_is_reproducible(tmp_path):
+    created = dt.datetime(2020, 1, 1)
+    buildWorkbook().exportAsXLSX(str(tmp_path / 'a.xlsx'), created=created)
+    buildWorkbook().exportAsXLSX(str(tmp_path / 'b.xlsx'), created=created)
+    assert (tmp_path / 'a.xlsx').read_bytes() == (tmp_path / 'b.xlsx').read_bytes()
+
+
+def test_sheets_prepared_on_threads_give_the_same_file(tmp_path):
+    created = dt.datetime(2020, 1, 1)
+    for constant_memory in (False, True):
+        buildWorkbook(6).exportAsXLSX(str(tmp_path / 'a.xlsx'), constant_memory=constant_memory, created=created)
+        buildWorkbook(6).exportAsXLSX(
+            str(tmp_path / 'b.xlsx'), constant_memory=constant_memory, created=created, workers=3)
+        assert (tmp_path / 'a.xlsx').read_bytes() == (tmp_path / 'b.xlsx').read_bytes()
+
+
+def test_sheets_are_prepared_a_bounded_number_ahead(tmp_path, monkeypatch):
+    prepared, written, ahead = [], [], []
+    prepareExport, add_worksheet = df2xl.Sheet.prepareExport, df2xl.xlsxwriter.Workbook.add_worksheet
+
+    def recordPrepared(sheet, *args, **kwargs):
+        prepared.append(sheet.getId())
+        return prepareExport(sheet, *args, **kwargs)
+
+    def recordWritten(workbook, name=None):
+        written.append(name)
+        ahead.append(len(prepared) - len(written))
+        return add_worksheet(workbook, name)
+
+    monkeypatch.setattr(df2xl.Sheet, 'prepareExport', recordPrepared)
+    monkeypatch.setattr(df2xl.xlsxwriter.Workbook, 'add_worksheet', recordWritten)
+    buildWorkbook(8).exportAsXLSX(str(tmp_path / 'w.xlsx'), workers=2)
+    assert written == ['s%d' % i for i in range(8)]
+    assert sorted(prepared) == written
+    assert max(ahead) <= 2
+
+
+def test_float32_values_are_written_as_their_shortest_repr(tmp_path):
+    wb = df2xl.Workbook('w')
+    sheet = wb.addSheet('s')
+    sheet.addTable('t', pd.DataFrame({'f': np.array([0.1, 1.5, 123456.7], dtype=np.float32)}))
+    wb.exportAsXLSXandCSVs(str(tmp_path / 'a.xlsx'))
+    wb.exportAsXLSX(str(tmp_path / 'b.xlsx'), constant_memory=True)
+    expected = [0.1, 1.5, 123456.7]
+    for path in ('a.xlsx', 'b.xlsx'):
+        assert pd.read_excel(str(tmp_path / path), header=None).iloc[2:, 1].tolist() == expected
+    assert pd.read_csv(str(tmp_path / 's.csv'), header=None).iloc[2:, 1].astype(float).tolist() == expected
+
+
+def test_value_export_keeps_formula_templates(tmp_path):
+    wb = buildWorkbook()
+    table = wb.getSheets()['s0'].getTables()['f']
+    assert table.getCellStore().getTemplate(0) is not None
+    content_hash = table.getContentHash()
+    wb.exportAsXLSXandCSVs(str(tmp_path / 'w.xlsx'), formulas='value')
+    assert table.getCellStore().getTemplate(0) is not None
+    assert table.getContentHash() == content_hash
+    assert pd.read_csv(str(tmp_path / 's0.csv'), header=None).iloc[2:6, 7].astype(float).tolist() == [2, 10, 18, 26]
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from support import load
+
+df2xl = load('df2xl')
+
+
+def buildForecasts(forecasts, periods, seed=0):
+    """Rows of counts for each forecast date, starting up to three days before it, in shuffled forecast order."""
+    random = np.random.RandomState(seed)
+    rows = []
+    forecast_dates = pd.date_range('2015-01-01', periods=forecasts, freq='D')
+    for forecast_date in forecast_dates[random.permutation(forecasts)]:
+        start = forecast_date - pd.Timedelta(days=random.randint(0, 4))
+        for count_date in pd.date_range(start, periods=periods, freq='D'):
+            rows.append({'ForecastDate': forecast_date, 'CountDate': count_date, 'Count': random.randint(0, 100),
+                         'm': 1.5})
+    sheet = df2xl.Workbook('w').addSheet('s')
+    return sheet, sheet.addTable('t', pd.DataFrame(rows))
+
+
+def renderPeriods():
+    rendered = []
+    for forecasts, periods, periods_out in [(5, 8, 3), (12, 10, 4)]:
+        sheet, table = buildForecasts(forecasts, periods)
+        for as_data in (True, False):
+            result = table.periodsFromForecastDate(periods_out, as_data=as_data)
+            rendered.append(([str(label) for label in result.columns], list(result.index),
+                             [[v.toReferenceString(None) for v in row] for row in result.values]))
+    return rendered
+
+
+# Built one forecast date at a time with .ix lookups
+EXPECTED = [
+    (['2015-01-03 00:00:00', '2015-01-01 00:00:00', '2015-01-02 00:00:00', '2015-01-04 00:00:00',
+      '2015-01-05 00:00:00'],
+     [1, 2, 3],
+     [["'s'!D7", "'s'!D12", "'s'!D21", "'s'!D31", "'s'!D38"], ["'s'!D8", "'s'!D13", "'s'!D22", "'s'!D32", "'s'!D39"],
+      ["'s'!D9", "'s'!D14", "'s'!D23", "'s'!D33", "'s'!D40"]]),
+    (['2015-01-03 00:00:00', '2015-01-01 00:00:00', '2015-01-02 00:00:00', '2015-01-04 00:00:00',
+      '2015-01-05 00:00:00'],
+     [1, 2, 3],
+     [["'s'!D7", "'s'!D12", "'s'!D21", "'s'!D31", "'s'!D38"], ["'s'!D8", "'s'!D13", "'s'!D22", "'s'!D32", "'s'!D39"],
+      ["'s'!D9", "'s'!D14", "'s'!D23", "'s'!D33", "'s'!D40"]]),
+    (['2015-01-07 00:00:00', '2015-01-12 00:00:00', '2015-01-05 00:00:00', '2015-01-11 00:00:00',
+      '2015-01-03 00:00:00', '2015-01-09 00:00:00', '2015-01-02 00:00:00', '2015-01-08 00:00:00',
+      '2015-01-10 00:00:00', '2015-01-04 00:00:00', '2015-01-01 00:00:00', '2015-01-06 00:00:00'],
+     [1, 2, 3, 4],
+     [["'s'!D4", "'s'!D15", "'s'!D24", "'s'!D37", "'s'!D44", "'s'!D54", "'s'!D66", "'s'!D77", "'s'!D85", "'s'!D94",
+       "'s'!D105", "'s'!D116"],
+      ["'s'!D5", "'s'!D16", "'s'!D25", "'s'!D38", "'s'!D45", "'s'!D55", "'s'!D67", "'s'!D78", "'s'!D86", "'s'!D95",
+       "'s'!D106", "'s'!D117"],
+      ["'s'!D6", "'s'!D17", "'s'!D26", "'s'!D39", "'s'!D46", "'s'!D56", "'s'!D68", "'s'!D79", "'s'!D87", "'s'!D96",
+       "'s'!D107", "'s'!D118"],
+      ["'s'!D7", "'s'!D18", "'s'!D27", "'s'!D40", "'s'!D47", "'s'!D57", "'s'!D69", "'s'!D80", "'s'!D88", "'s'!D97",
+       "'s'!D108", "'s'!D119"]]),
+    (['2015-01-07 00:00:00', '2015-01-12 00:00:00', '2015-01-05 00:00:00', '2015-01-11 00:00:00',
+      '2015-01-03 00:00:00', '2015-01-09 00:00:00', '2015-01-02 00:00:00', '2015-01-08 00:00:00',
+      '2015-01-10 00:00:00', '2015-01-04 00:00:00', '2015-01-01 00:00:00', '2015-01-06 00:00:00'],
+     [1, 2, 3, 4],
+     [["'s'!D4", "'s'!D15", "'s'!D24", "'s'!D37", "'s'!D44", "'s'!D54", "'s'!D66", "'s'!D77", "'s'!D85", "'s'!D94",
+       "'s'!D105", "'s'!D116"],
+      ["'s'!D5", "'s'!D16", "'s'!D25", "'s'!D38", "'s'!D45", "'s'!D55", "'s'!D67", "'s'!D78", "'s'!D86", "'s'!D95",
+       "'s'!D106", "'s'!D117"],
+      ["'s'!D6", "'s'!D17", "'s'!D26", "'s'!D39", "'s'!D46", "'s'!D56", "'s'!D68", "'s'!D79", "'s'!D87", "'s'!D96",
+       "'s'!D107", "'s'!D118"],
+      ["'s'!D7", "'s'!D18", "'s'!D27", "'s'!D40", "'s'!D47", "'s'!D57", "'s'!D69", "'s'!D80", "'s'!D88", "'s'!D97",
+       "'s'!D108", "'s'!D119"]]),
+]
+
+
+def test_periods_match_per_forecast_date_implementation():
+    assert renderPeriods() == EXPECTED
+
+
+def test_short_forecast_raises():
+    sheet, table = buildForecasts(3, 4)
+    with pytest.raises(ValueError):
+        table.periodsFromForecastDate(6)
@@ -0,0 +1,71 @@
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from support import load
+
+df2xl = load('df2xl')
+Formula, Function = df2xl.Formula, df2xl.Function
+
+
+def buildTable():
+    sheet = df2xl.Workbook('w').addSheet('s')
+    return sheet, sheet.addTable('t', pd.DataFrame(np.arange(6.).reshape(3, 2), columns=list('ab')))
+
+
+def render(df, sheet):
+    return [[formula.toReferenceString(sheet) for formula in row] for row in df.values]
+
+
+def test_identical_formulas_are_shared():
+    sheet, table = buildTable()
+    pool = df2xl.FormulaPool()
+    total = Formula.sum(table.getDataRangeReference())
+    first = pool.intern(Formula.add(total, table['a'].iloc[0]))
+    second = pool.intern(Formula.add(Formula.sum(table.getDataRangeReference()), table['a'].iloc[0]))
+    assert first is second
+    assert first.getArgs()[0] is pool.intern(total)
+    assert pool.intern(Formula.add(total, table['a'].iloc[1])) is not first
+    assert first.toReferenceString(sheet) == 'SUM(B3:C5)+B3'
+
+
+def test_interned_frame_renders_like_the_original():
+    sheet, table = buildTable()
+    pool = df2xl.FormulaPool()
+    df = Formula.multiply(Formula.sum(table.getDataRangeReference()), table.getCellDF())
+    pooled = pool.internDF(df)
+    assert render(pooled, sheet) == render(df, sheet)
+    assert len(set(id(f.getArgs()[0]) for f in pooled.values.flat)) == 1
+
+
+def test_pooled_formulas_refuse_edits_and_originals_stay_editable():
+    sheet, table = buildTable()
+    pool = df2xl.FormulaPool()
+    original = Formula.add(table['a'].iloc[0], 1)
+    pooled = pool.intern(original)
+    for edit in (lambda f: f._setArgs(2), lambda f: f._setFunction(Function.subtract()),
+                 lambda f: f._setParentheses(True)):
+        with pytest.raises(TypeError):
+            edit(pooled)
+    original._setArgs(table['a'].iloc[0], 2)
+    assert original.toReferenceString(sheet) == 'B3+2'
+    assert pooled.toReferenceString(sheet) == 'B3+1'
+    assert pool.intern(Formula.add(table['a'].iloc[0], 1)) is pooled
+
+
+def test_functions_made_on_several_threads_are_one_instance():
+    made = []
+    start = threading.Barrier(8)
+
+    def make():
+        start.wait()
+        made.append(Function('POOL_TEST', 'before'))
+
+    threads = [threading.Thread(target=make) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(map(id, made))) == 1
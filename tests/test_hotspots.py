@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import openpyxl
+
+from support import load
+
+df2xl = load('df2xl')
+
+
+def buildWorkbook(instrumentation=None):
+    wb = df2xl.Workbook('w') if instrumentation is None else df2xl.Workbook('w', instrumentation=instrumentation)
+    for name in ('s0', 's1'):
+        sheet = wb.addSheet(name)
+        df = pd.DataFrame(np.arange(20.).reshape(5, 4) / 4, columns=list('abcd'))
+        table = sheet.addTable('t', df, total_row=True)
+        sheet.addTable('f', df2xl.Formula.divide(table[['a', 'b']], table[['c']]), relative_position='right')
+    return wb
+
+
+def readWorkbook(path):
+    cells = []
+    for sheet in openpyxl.load_workbook(path).worksheets:
+        for row in sheet.iter_rows():
+            cells.extend((sheet.title, cell.coordinate, cell.value) for cell in row if cell.value is not None)
+    return cells
+
+
+def exportCells(path):
+    buildWorkbook().exportAsXLSX(path)
+    return readWorkbook(path)
+
+
+# Written before exports were instrumented
+EXPECTED = [
+    ('s0', 'A1', 't'), ('s0', 'G1', 'f'), ('s0', 'B2', 'a'), ('s0', 'C2', 'b'), ('s0', 'D2', 'c'), ('s0', 'E2', 'd'),
+    ('s0', 'H2', 'a'), ('s0', 'I2', 'b'), ('s0', 'A3', 0), ('s0', 'B3', 0), ('s0', 'C3', 0.25), ('s0', 'D3', 0.5),
+    ('s0', 'E3', 0.75), ('s0', 'G3', 0), ('s0', 'H3', '=B3/D3'), ('s0', 'I3', '=C3/D3'), ('s0', 'A4', 1),
+    ('s0', 'B4', 1), ('s0', 'C4', 1.25), ('s0', 'D4', 1.5), ('s0', 'E4', 1.75), ('s0', 'G4', 1),
+    ('s0', 'H4', '=B4/D4'), ('s0', 'I4', '=C4/D4'), ('s0', 'A5', 2), ('s0', 'B5', 2), ('s0', 'C5', 2.25),
+    ('s0', 'D5', 2.5), ('s0', 'E5', 2.75), ('s0', 'G5', 2), ('s0', 'H5', '=B5/D5'), ('s0', 'I5', '=C5/D5'),
+    ('s0', 'A6', 3), ('s0', 'B6', 3), ('s0', 'C6', 3.25), ('s0', 'D6', 3.5), ('s0', 'E6', 3.75), ('s0', 'G6', 3),
+    ('s0', 'H6', '=B6/D6'), ('s0', 'I6', '=C6/D6'), ('s0', 'A7', 4), ('s0', 'B7', 4), ('s0', 'C7', 4.25),
+    ('s0', 'D7', 4.5), ('s0', 'E7', 4.75), ('s0', 'G7', 4), ('s0', 'H7', '=B7/D7'), ('s0', 'I7', '=C7/D7'),
+    ('s0', 'A8', 'Total'), ('s0', 'B8', '=SUM(B3:B7)'), ('s0', 'C8', '=SUM(C3:C7)'), ('s0', 'D8', '=SUM(D3:D7)'),
+    ('s0', 'E8', '=SUM(E3:E7)'), ('s0', 'G8', 'Total'), ('s0', 'H8', '=B8/D8'), ('s0', 'I8', '=C8/D8'),
+    ('s1', 'A1', 't'), ('s1', 'G1', 'f'), ('s1', 'B2', 'a'), ('s1', 'C2', 'b'), ('s1', 'D2', 'c'), ('s1', 'E2', 'd'),
+    ('s1', 'H2', 'a'), ('s1', 'I2', 'b'), ('s1', 'A3', 0), ('s1', 'B3', 0), ('s1', 'C3', 0.25), ('s1', 'D3', 0.5),
+    ('s1', 'E3', 0.75), ('s1', 'G3', 0), ('s1', 'H3', '=B3/D3'), ('s1', 'I3', '=C3/D3'), ('s1', 'A4', 1),
+    ('s1', 'B4', 1), ('s1', 'C4', 1.25), ('s1', 'D4', 1.5), ('s1', 'E4', 1.75), ('s1', 'G4', 1),
+    ('s1', 'H4', '=B4/D4'), ('s1', 'I4', '=C4/D4'), ('s1', 'A5', 2), ('s1', 'B5', 2), ('s1', 'C5', 2.25),
+    ('s1', 'D5', 2.5), ('s1', 'E5', 2.75), ('s1', 'G5', 2), ('s1', 'H5', '=B5/D5'), ('s1', 'I5', '=C5/D5'),
+    ('s1', 'A6', 3), ('s1', 'B6', 3), ('s1', 'C6', 3.25), ('s1', 'D6', 3.5), ('s1', 'E6', 3.75), ('s1', 'G6', 3),
+    ('s1', 'H6', '=B6/D6'), ('s1', 'I6', '=C6/D6'), ('s1', 'A7', 4), ('s1', 'B7', 4), ('s1', 'C7', 4.25),
+    ('s1', 'D7', 4.5), ('s1', 'E7', 4.75), ('s1', 'G7', 4), ('s1', 'H7', '=B7/D7'), ('s1', 'I7', '=C7/D7'),
+    ('s1', 'A8', 'Total'), ('s1', 'B8', '=SUM(B3:B7)'), ('s1', 'C8', '=SUM(C3:C7)'), ('s1', 'D8', '=SUM(D3:D7)'),
+    ('s1', 'E8', '=SUM(E3:E7)'), ('s1', 'G8', 'Total'), ('s1', 'H8', '=B8/D8'), ('s1', 'I8', '=C8/D8'),
+]
+
+
+def test_instrumented_export_writes_the_same_cells(tmp_path):
+    reporter = load('instrumentation').HotspotReporter()
+    path = str(tmp_path / 'w.xlsx')
+    buildWorkbook(reporter).exportAsXLSXandCSVs(path)
+    assert readWorkbook(path) == EXPECTED
+    events = reporter.toDF()
+    assert events[events['phase'] == 'build_table'][['sheet', 'table', 'cells']].values.tolist() == [
+        ['s0', 't', 40], ['s0', 'f', 24], ['s1', 't', 40], ['s1', 'f', 24]]
+    assert sorted(set(events[events['phase'] == 'prepare_table']['table'])) == ['f', 't']
+    assert events[events['phase'] == 'write_sheet']['sheet'].tolist() == ['s0', 's1']
+    assert events[events['phase'] == 'write_csv']['sheet'].tolist() == ['s0', 's1']
+    assert (events['phase'] == 'close').sum() == 1
+    assert events['memory'].isnull().all()
+    summary = reporter.summarize()
+    assert np.isclose(summary['share'].sum(), 1)
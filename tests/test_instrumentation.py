@@ -0,0 +1,19 @@
+from support import load
+
+instrumentation = load('instrumentation')
+
+MB = 2 ** 20
+
+
+def test_nested_phases_keep_their_own_peaks():
+    reporter = instrumentation.HotspotReporter(memory=True)
+    with reporter.export():
+        with reporter.phase('outer'):
+            block = bytearray(8 * MB)
+            del block
+            with reporter.phase('inner'):
+                block = bytearray(MB)
+                del block
+    memory = reporter.toDF().set_index('phase')['memory']
+    assert 0.9 * MB <= memory['inner'] < 2 * MB
+    assert memory['outer'] >= 7 * MB
@@ -0,0 +1,52 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from support import load
+
+df2xl = load('df2xl')
+
+
+def buildSheet():
+    sheet = df2xl.Workbook('w').addSheet('s')
+    shapes = [(10, 2), (2, 2), (3, 4), (1, 1), (6, 3), (2, 5), (4, 1), (3, 3)]
+    positions = ['below', 'right', 'below', 'right', 'right', 'below', 'right', 'below']
+    for i, ((height, width), position) in enumerate(zip(shapes, positions)):
+        sheet.addTable('t%d' % i, pd.DataFrame(np.ones((height, width))), relative_position=position,
+                       total_row=i % 3 == 0, margin=i % 2 + 1, include_id=i != 4)
+    return sheet
+
+
+def placeTables():
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        sheet = buildSheet()
+    return [(table.getId(), table.getLocation().getX(), table.getLocation().getY(),
+             table.getDataOriginLocation().getX(), table.getDataOriginLocation().getY())
+            for table in sheet.getTables().values()]
+
+
+# Placed before the sheet kept a spatial index of its tables
+EXPECTED = [
+    ('t0', 0, 0, 1, 2), ('t1', 5, 0, 6, 2), ('t2', 0, 5, 1, 7), ('t3', 7, 5, 8, 7), ('t4', 10, 5, 11, 6),
+    ('t5', 0, 14, 1, 16), ('t6', 7, 14, 8, 16), ('t7', 0, 23, 1, 25),
+]
+
+
+def test_placement_is_unchanged():
+    assert placeTables() == EXPECTED
+
+
+def test_overlaps_are_found_and_reported():
+    sheet = df2xl.Workbook('w').addSheet('s')
+    a = sheet.addTable('a', pd.DataFrame(np.ones((10, 2))))
+    sheet.addTable('b', pd.DataFrame(np.ones((2, 2))), relative_position='right')
+    with pytest.warns(UserWarning):
+        c = sheet.addTable('c', pd.DataFrame(np.ones((2, 2))))
+    assert [(p.getId(), q.getId()) for p, q in sheet.getOverlappingTables()] == [('a', 'c')]
+    assert sheet.getTableAt(0, 0) is a and sheet.getTableAt(100, 100) is None
+    c.shift(0, 20)
+    assert sheet.getOverlappingTables() == []
+    assert sheet.getTableAt(1, 26) is c
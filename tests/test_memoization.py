@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+from support import load
+
+df2xl = load('df2xl')
+Formula = df2xl.Formula
+
+
+def render(df, sheet):
+    return [[formula.toReferenceString(sheet) for formula in row] for row in df.values]
+
+
+def renderAroundShifts():
+    wb = df2xl.Workbook('w')
+    sheet, other = wb.addSheet('s'), wb.addSheet('o%th')
+    A = sheet.addTable('A', pd.DataFrame(np.arange(12).reshape(4, 3), columns=list('abc')), total_row=True)
+    B = sheet.addTable('B', pd.DataFrame(np.arange(12).reshape(4, 3), columns=list('abc')), total_row=True)
+    D = other.addTable('D', pd.DataFrame(np.arange(5).reshape(5, 1), columns=['q']))
+    x = Formula.add(A, B, parentheses=True)
+    y = Formula.divide(x, D)
+    chain = Formula.add(A['a'].iloc[0], 1)
+    for i in range(6):
+        chain = Formula.add(chain, B['b'].iloc[i % 4])
+    rendered = [render(x, sheet), render(y, sheet), render(y, other), chain.toReferenceString(other)]
+    T = other.addTable('T', y, relative_position='right')
+    U = other.addTable('U', Formula.add(T, 1))
+    rendered += [render(y, sheet), render(U.getCellDF(), other)]
+    A.shift(2, 3)
+    D.shift(1, 0)
+    rendered += [render(x, sheet), render(y, sheet), render(y, other), render(U.getCellDF(), other),
+                 chain.toReferenceString(other)]
+    T.shiftToLocation(df2xl.Location(6, 1, other))
+    rendered += [render(U.getCellDF(), sheet), chain.toReferenceString(sheet)]
+    return rendered
+
+
+# Rendered before renderings were memoized
+EXPECTED = [
+    [['(B3+B11)', '(C3+C11)', '(D3+D11)'], ['(B4+B12)', '(C4+C12)', '(D4+D12)'], ['(B5+B13)', '(C5+C13)', '(D5+D13)'],
+     ['(B6+B14)', '(C6+C14)', '(D6+D14)'], ['(B7+B15)', '(C7+C15)', '(D7+D15)']],
+    [["(B3+B11)/'o%th'!B3", "(C3+C11)/'o%th'!B3", "(D3+D11)/'o%th'!B3"],
+     ["(B4+B12)/'o%th'!B4", "(C4+C12)/'o%th'!B4", "(D4+D12)/'o%th'!B4"],
+     ["(B5+B13)/'o%th'!B5", "(C5+C13)/'o%th'!B5", "(D5+D13)/'o%th'!B5"],
+     ["(B6+B14)/'o%th'!B6", "(C6+C14)/'o%th'!B6", "(D6+D14)/'o%th'!B6"],
+     ["(B7+B15)/'o%th'!B7", "(C7+C15)/'o%th'!B7", "(D7+D15)/'o%th'!B7"]],
+    [["('s'!B3+'s'!B11)/B3", "('s'!C3+'s'!C11)/B3", "('s'!D3+'s'!D11)/B3"],
+     ["('s'!B4+'s'!B12)/B4", "('s'!C4+'s'!C12)/B4", "('s'!D4+'s'!D12)/B4"],
+     ["('s'!B5+'s'!B13)/B5", "('s'!C5+'s'!C13)/B5", "('s'!D5+'s'!D13)/B5"],
+     ["('s'!B6+'s'!B14)/B6", "('s'!C6+'s'!C14)/B6", "('s'!D6+'s'!D14)/B6"],
+     ["('s'!B7+'s'!B15)/B7", "('s'!C7+'s'!C15)/B7", "('s'!D7+'s'!D15)/B7"]],
+    "'s'!B3+1+'s'!C11+'s'!C12+'s'!C13+'s'!C14+'s'!C11+'s'!C12",
+    [["(B3+B11)/'o%th'!B3", "(C3+C11)/'o%th'!B3", "(D3+D11)/'o%th'!B3"],
+     ["(B4+B12)/'o%th'!B4", "(C4+C12)/'o%th'!B4", "(D4+D12)/'o%th'!B4"],
+     ["(B5+B13)/'o%th'!B5", "(C5+C13)/'o%th'!B5", "(D5+D13)/'o%th'!B5"],
+     ["(B6+B14)/'o%th'!B6", "(C6+C14)/'o%th'!B6", "(D6+D14)/'o%th'!B6"],
+     ["(B7+B15)/'o%th'!B7", "(C7+C15)/'o%th'!B7", "(D7+D15)/'o%th'!B7"]],
+    [['B11', 'C11', 'D11'], ['B12', 'C12', 'D12'], ['B13', 'C13', 'D13'], ['B14', 'C14', 'D14'],
+     ['B15', 'C15', 'D15']],
+    [['(D6+B11)', '(E6+C11)', '(F6+D11)'], ['(D7+B12)', '(E7+C12)', '(F7+D12)'], ['(D8+B13)', '(E8+C13)', '(F8+D13)'],
+     ['(D9+B14)', '(E9+C14)', '(F9+D14)'], ['(D10+B15)', '(E10+C15)', '(F10+D15)']],
+    [["(D6+B11)/'o%th'!C3", "(E6+C11)/'o%th'!C3", "(F6+D11)/'o%th'!C3"],
+     ["(D7+B12)/'o%th'!C4", "(E7+C12)/'o%th'!C4", "(F7+D12)/'o%th'!C4"],
+     ["(D8+B13)/'o%th'!C5", "(E8+C13)/'o%th'!C5", "(F8+D13)/'o%th'!C5"],
+     ["(D9+B14)/'o%th'!C6", "(E9+C14)/'o%th'!C6", "(F9+D14)/'o%th'!C6"],
+     ["(D10+B15)/'o%th'!C7", "(E10+C15)/'o%th'!C7", "(F10+D15)/'o%th'!C7"]],
+    [["('s'!D6+'s'!B11)/C3", "('s'!E6+'s'!C11)/C3", "('s'!F6+'s'!D11)/C3"],
+     ["('s'!D7+'s'!B12)/C4", "('s'!E7+'s'!C12)/C4", "('s'!F7+'s'!D12)/C4"],
+     ["('s'!D8+'s'!B13)/C5", "('s'!E8+'s'!C13)/C5", "('s'!F8+'s'!D13)/C5"],
+     ["('s'!D9+'s'!B14)/C6", "('s'!E9+'s'!C14)/C6", "('s'!F9+'s'!D14)/C6"],
+     ["('s'!D10+'s'!B15)/C7", "('s'!E10+'s'!C15)/C7", "('s'!F10+'s'!D15)/C7"]],
+    [['B11', 'C11', 'D11'], ['B12', 'C12', 'D12'], ['B13', 'C13', 'D13'], ['B14', 'C14', 'D14'],
+     ['B15', 'C15', 'D15']],
+    "'s'!D6+1+'s'!C11+'s'!C12+'s'!C13+'s'!C14+'s'!C11+'s'!C12",
+    [["'o%th'!B11", "'o%th'!C11", "'o%th'!D11"], ["'o%th'!B12", "'o%th'!C12", "'o%th'!D12"],
+     ["'o%th'!B13", "'o%th'!C13", "'o%th'!D13"], ["'o%th'!B14", "'o%th'!C14", "'o%th'!D14"],
+     ["'o%th'!B15", "'o%th'!C15", "'o%th'!D15"]],
+    'D6+1+C11+C12+C13+C14+C11+C12',
+]
+
+
+def test_rendering_follows_shifted_tables():
+    assert renderAroundShifts() == EXPECTED
@@ -0,0 +1,118 @@
+import threading
+import time
+
+import pytest
+
+from support import load
+
+pipeline = load('pipeline')
+ExportPipeline, ExportSpec = pipeline.ExportPipeline, pipeline.ExportSpec
+
+
+class FakeWorkbook():
+    """Stand-in for a Workbook, writing its data to the export path."""
+
+    def __init__(self, data, delay=0.):
+        self.data = data
+        self.delay = delay
+
+    def exportAsXLSX(self, path, **options):
+        time.sleep(self.delay)
+        with open(path, 'w') as f:
+            f.write(str(self.data))
+
+
+def makeSpecs(tmp_path, count, fetch_delay=0., uploaded=None):
+    def spec(i):
+        def fetch():
+            time.sleep(fetch_delay * (count - i))
+            return i
+        return ExportSpec(i, fetch, FakeWorkbook, str(tmp_path / ('%d.xlsx' % i)),
+                          None if uploaded is None else uploaded.append)
+    return [spec(i) for i in range(count)]
+
+
+def test_results_keep_the_order_of_the_specs(tmp_path):
+    uploaded = []
+    # Later specs fetch faster, so they finish first
+    specs = makeSpecs(tmp_path, 6, fetch_delay=0.01, uploaded=uploaded)
+    results = ExportPipeline(fetch_concurrency=6).runBlocking(specs)
+    assert [result.id for result in results] == list(range(6))
+    assert all(result.error is None for result in results)
+    assert [result.path for result in results] == [spec.path for spec in specs]
+    assert sorted(uploaded) == sorted(spec.path for spec in specs)
+    assert (tmp_path / '3.xlsx').read_text() == '3'
+
+
+def test_failed_stage_skips_the_later_ones(tmp_path):
+    built, uploaded = [], []
+
+    def fail():
+        raise ValueError('no data')
+
+    def build(data):
+        built.append(data)
+        return FakeWorkbook(data)
+
+    specs = [spec._replace(build=build) for spec in makeSpecs(tmp_path, 4, uploaded=uploaded)]
+    specs[1] = specs[1]._replace(fetch=fail)
+    p = ExportPipeline()
+    results = p.runBlocking(specs)
+    assert isinstance(results[1].error, ValueError) and results[1].path is None
+    assert [result.error for result in results if result.id != 1] == [None] * 3
+    assert sorted(built) == [0, 2, 3]
+    assert specs[1].path not in uploaded
+    metrics = p.getMetrics()
+    assert metrics.loc['fetch', ['items', 'failures', 'skipped']].tolist() == [4, 1, 0]
+    assert metrics.loc['export', ['items', 'failures', 'skipped']].tolist() == [3, 0, 1]
+    assert metrics.loc['upload', ['items', 'failures', 'skipped']].tolist() == [3, 0, 1]
+
+
+def test_slow_export_holds_fetches_back(tmp_path):
+    lock = threading.Lock()
+    counts = {'fetched': 0, 'exported': 0, 'ahead': 0}
+
+    def fetch(i):
+        def run():
+            with lock:
+                counts['fetched'] += 1
+                counts['ahead'] = max(counts['ahead'], counts['fetched'] - counts['exported'])
+            return i
+        return run
+
+    def build(data):
+        workbook = FakeWorkbook(data, delay=0.02)
+        export = workbook.exportAsXLSX
+
+        def exportAndCount(path, **options):
+            export(path, **options)
+            with lock:
+                counts['exported'] += 1
+        workbook.exportAsXLSX = exportAndCount
+        return workbook
+
+    specs = [ExportSpec(i, fetch(i), build, str(tmp_path / ('%d.xlsx' % i))) for i in range(12)]
+    p = ExportPipeline(fetch_concurrency=1, export_concurrency=1, upload_concurrency=1, queue_size=1)
+    results = p.runBlocking(specs)
+    assert all(result.error is None for result in results)
+    # One item being exported, one waiting in the export queue, and one fetched and waiting for room
+    assert counts['ahead'] <= 3
+    assert p.getMetrics().loc['fetch', 'blocked_seconds'] > 0
+
+
+def test_metrics_count_every_item(tmp_path):
+    uploaded = []
+    p = ExportPipeline(export_concurrency=3)
+    p.runBlocking(makeSpecs(tmp_path, 5, uploaded=uploaded))
+    metrics = p.getMetrics()
+    assert metrics.index.tolist() == ['fetch', 'export', 'upload']
+    assert metrics['items'].tolist() == [5, 5, 5]
+    assert metrics['failures'].tolist() == [0, 0, 0]
+    assert metrics['skipped'].tolist() == [0, 0, 0]
+    assert (metrics['busy_seconds'] >= 0).all()
+    assert len(uploaded) == 5
+
+
+def test_concurrency_must_be_positive():
+    with pytest.raises(AssertionError):
+        ExportPipeline(fetch_concurrency=0)
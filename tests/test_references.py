@@ -0,0 +1,47 @@
+import pandas as pd
+
+from support import load
+
+df2xl = load('df2xl')
+Formula = df2xl.Formula
+
+
+def buildWorkbook():
+    wb = df2xl.Workbook('w')
+    sheet = wb.addSheet('s')
+    data = sheet.addTable('a', pd.DataFrame({'x': [1., 2., 3.]}))
+    single = sheet.addTable('f', pd.DataFrame({'f': [Formula.add(data['x'].iloc[0], 1)]}), relative_position='right')
+    template = Formula.add(data[['x']], 1)
+    rows = sheet.addTable('t', template, relative_position='right')
+    return wb, sheet, data, single, template, rows
+
+
+def dependents(wb, table, y):
+    return [(cell.getTable().getId(), cell.toReferenceString(None)) for cell in
+            wb.getDependents(table.getCellStore().getCell(0, y))]
+
+
+def test_dependents_of_cells():
+    wb, sheet, data, single, template, rows = buildWorkbook()
+    assert dependents(wb, data, 0) == [('f', "'s'!E3"), ('t', "'s'!H3")]
+    assert dependents(wb, data, 2) == [('t', "'s'!H5")]
+
+
+def test_moving_tables_keeps_the_index():
+    wb, sheet, data, single, template, rows = buildWorkbook()
+    wb.getDependents(data.getCellStore().getCell(0, 0))
+    entries = wb.reference_index.sources[single]
+    data.shift(0, 2)
+    assert dependents(wb, data, 0) == [('f', "'s'!E3"), ('t', "'s'!H3")]
+    assert wb.reference_index.sources[single] is entries
+
+
+def test_edited_formulas_are_indexed_again():
+    wb, sheet, data, single, template, rows = buildWorkbook()
+    assert dependents(wb, data, 1) == [('t', "'s'!H4")]
+    single.getCellStore().getData(0, 0)._setArgs(data['x'].iloc[1], 1)
+    assert dependents(wb, data, 1) == [('f', "'s'!E3"), ('t', "'s'!H4")]
+    assert dependents(wb, data, 0) == [('t', "'s'!H3")]
+    template.iloc[2, 0]._setArgs(data['x'].iloc[0], 2)
+    assert dependents(wb, data, 0) == [('t', "'s'!H3"), ('t', "'s'!H5")]
+    assert dependents(wb, data, 2) == []
@@ -0,0 +1,86 @@
+import pandas as pd
+
+from support import load
+
+df2xl = load('df2xl')
+Workbook, Sheet, Cell, Location, Formula = df2xl.Workbook, df2xl.Sheet, df2xl.Cell, df2xl.Location, df2xl.Formula
+
+
+def makeCell():
+    sheet = Sheet('S', Workbook('w'))
+    return sheet, Cell(Location(1, 2, sheet), 5)
+
+
+def test_parent_rerenders_after_parentheses_change():
+    sheet, cell = makeCell()
+    f = Formula.add(cell, 1)
+    g = Formula.sum(f)
+    assert g.toFinalString(None) == "=SUM('S'!B3+1)"
+    f._setParentheses(True)
+    assert g.toFinalString(None) == "=SUM(('S'!B3+1))"
+
+
+def test_parent_rerenders_after_args_and_function_change():
+    sheet, cell = makeCell()
+    f = Formula.add(cell, 1)
+    g = Formula.multiply(f, 2)
+    assert g.toFinalString(None) == "='S'!B3+1*2"
+    f._setArgs(cell, 3)
+    assert g.toFinalString(None) == "='S'!B3+3*2"
+    f._setFunction(df2xl.Function.subtract())
+    assert g.toFinalString(None) == "='S'!B3-3*2"
+
+
+def test_parent_rerenders_after_cell_moves():
+    sheet, cell = makeCell()
+    g = Formula.sum(Formula.add(cell, 1))
+    g.toFinalString(None)
+    cell._setLocation(Location(3, 4, sheet))
+    assert g.toFinalString(None) == "=SUM('S'!D5+1)"
+
+
+def buildChain():
+    sheet = Workbook('w').addSheet('S')
+    table = sheet.addTable('t', pd.DataFrame({'a': [1., 2., 3.]}))
+    f = Formula.add(table[['a']], 1)
+    g = Formula.multiply(f, 2)
+    return sheet, f, g
+
+
+def render(df, sheet):
+    return [formula.toReferenceString(sheet) for formula in df.iloc[:, 0]]
+
+
+def test_template_follows_edited_operand_row():
+    sheet, f, g = buildChain()
+    assert render(g, sheet) == ['B3+1*2', 'B4+1*2', 'B5+1*2']
+    f.iloc[0, 0]._setParentheses(True)
+    assert render(g, sheet) == ['(B3+1)*2', 'B4+1*2', 'B5+1*2']
+
+
+def test_table_of_edited_template_exports_cell_by_cell():
+    sheet, f, g = buildChain()
+    table = sheet.addTable('g', g)
+    assert table.getCellStore().getTemplate(0) is not None
+    for row in f.iloc[:, 0]:
+        row._setParentheses(True)
+    assert table.getCellStore().getTemplate(0) is None
+    assert render(g, sheet) == ['(B3+1)*2', '(B4+1)*2', '(B5+1)*2']
+    # A template built after the edit doesn't reuse the edited rows' template either
+    assert render(Formula.subtract(g, 5), sheet) == ['(B3+1)*2-5', '(B4+1)*2-5', '(B5+1)*2-5']
+
+
+def test_table_cell_location_round_trips():
+    sheet = Workbook('w').addSheet('S')
+    table = sheet.addTable('t', pd.DataFrame({'a': [1., 2., 3.]}))
+    cell = table.getCellStore().getCell(0, 1)
+    assert cell.toReferenceString(sheet) == 'B4'
+    cell._setLocation(cell.getLocation())
+    assert cell.getLocation().asTuple() == (1, 3)
+    assert cell.toReferenceString(sheet) == 'B4'
+    cell._setLocation(Location(4, 9, sheet))
+    assert cell.toReferenceString(sheet) == 'E10'
+    cell.move_inplace(Location(1, 1, sheet))
+    assert cell.toReferenceString(sheet) == 'F11'
+    table.shift(1, 0)
+    assert cell.getLocation().asTuple() == (6, 10)
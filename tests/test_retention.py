@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+from support import load
+
+df2xl = load('df2xl')
+
+DATES = pd.date_range('2020-01-01', periods=4, freq='MS')
+
+
+def buildCohorts(total_row=False):
+    sheet = df2xl.Workbook('w').addSheet('s')
+    cohorts = pd.DataFrame(np.triu(np.arange(1, 17).reshape(4, 4)) * 1., index=DATES, columns=DATES)
+    return sheet, sheet.addTable('coh', cohorts, total_row=total_row)
+
+
+def render(df, sheet):
+    return [[v.toReferenceString(sheet) for v in row] for row in df.values]
+
+
+# Built by the cell-by-cell loop, except for its divisor: it overwrote each diagonal cell with the cell divided by
+# itself before dividing the rest of the row by it, so the off-diagonal formulas read e.g. C3/B3/B3
+EXPECTED = [
+    ['B3/B3', 'C3/B3', 'D3/B3', 'E3/B3'],
+    ['B4', 'C4/C4', 'D4/C4', 'E4/C4'],
+    ['B5', 'C5', 'D5/D5', 'E5/D5'],
+    ['B6', 'C6', 'D6', 'E6/E6'],
+]
+
+
+def test_rates_divide_by_the_diagonal():
+    sheet, table = buildCohorts()
+    rates = table.toRetentionRate()
+    assert list(rates.index) == list(DATES) and list(rates.columns) == list(DATES)
+    assert render(rates, sheet) == EXPECTED
+
+
+def test_total_row_is_not_divided():
+    sheet, table = buildCohorts(total_row=True)
+    rendered = render(table.toRetentionRate(), sheet)
+    assert rendered[:4] == EXPECTED
+    assert rendered[4] == render(table.getCellDF(), sheet)[4]
+
+
+def test_values_and_masked_lower_triangle():
+    sheet, table = buildCohorts()
+    rates = table.toRetentionRate(values=True)
+    assert rates.values.tolist() == [[1, 2, 3, 4], [0, 1, 7 / 6, 8 / 6], [0, 0, 1, 12 / 11], [0, 0, 0, 1]]
+    masked = table.toRetentionRate(values=True, mask_lower=True)
+    assert np.isnan(masked.values[np.tril_indices(4, -1)]).all()
+    assert masked.values[np.triu_indices(4)].tolist() == rates.values[np.triu_indices(4)].tolist()
+    formulas = table.toRetentionRate(mask_lower=True)
+    assert formulas.values[np.tril_indices(4, -1)].tolist() == [None] * 6
+    assert formulas.iloc[1, 1].toReferenceString(sheet) == 'C4/C4'
@@ -0,0 +1,176 @@
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from support import load
+
+Utils = load('Utils')
+
+MB = 2 ** 20
+
+
+class FakeKey():
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.position = 0
+
+    def read(self, size=0):
+        data = self.bucket.contents[self.name]
+        end = len(data) if size == 0 else self.position + size
+        out = data[self.position:end]
+        self.position += len(out)
+        return out
+
+    def close(self):
+        pass
+
+    def set_contents_from_file(self, fp):
+        self.bucket.puts.append(self.name)
+        self.bucket.contents[self.name] = fp.read()
+
+
+class FakeMultipartUpload():
+    def __init__(self, bucket, name, fail_part=None):
+        self.bucket = bucket
+        self.name = name
+        self.fail_part = fail_part
+        self.parts = {}
+        self.lock = threading.Lock()
+        self.state = 'open'
+
+    def upload_part_from_file(self, fp, part_num):
+        if part_num == self.fail_part:
+            raise IOError('Part %d failed' % part_num)
+        with self.lock:
+            self.parts[part_num] = fp.read()
+
+    def complete_upload(self):
+        self.state = 'complete'
+        self.bucket.contents[self.name] = b''.join(self.parts[n] for n in sorted(self.parts))
+
+    def cancel_upload(self):
+        self.state = 'cancelled'
+
+
+class FakeBucket():
+    """The parts of boto's Bucket the S3 helpers use, keeping keys in memory."""
+
+    def __init__(self, fail_part=None):
+        self.contents = {}
+        self.puts = []
+        self.uploads = []
+        self.fail_part = fail_part
+
+    def new_key(self, name):
+        return FakeKey(self, name)
+
+    def get_key(self, name):
+        return FakeKey(self, name) if name in self.contents else None
+
+    def initiate_multipart_upload(self, name):
+        upload = FakeMultipartUpload(self, name, self.fail_part)
+        self.uploads.append(upload)
+        return upload
+
+
+class FakeConnection():
+    def __init__(self, key, secret):
+        self.credentials = (key, secret)
+        self.buckets = {}
+        self.closed = False
+
+    def get_bucket(self, name):
+        return self.buckets.setdefault(name, FakeBucket())
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    monkeypatch.setattr(Utils, 'S3Connection', FakeConnection)
+    connections = Utils.S3Connections()
+    monkeypatch.setattr(Utils, 'S3_CONNECTIONS', connections)
+    yield connections
+    connections.close()
+
+
+@pytest.fixture
+def authfile(tmp_path):
+    path = tmp_path / 's3.json'
+    path.write_text(json.dumps({'key': 'access', 'secret': 'shh'}))
+    return str(path)
+
+
+def test_connections_read_the_auth_file(connections, authfile):
+    auths = dict(Utils.DATABASE_ENGINES.auths)
+    bucket = connections.getBucket(authfile, 'b')
+    assert connections.getBucket(authfile, 'b') is bucket
+    (conn,) = connections.connections.values()
+    assert conn.credentials == ('access', 'shh')
+    assert Utils.DATABASE_ENGINES.auths == auths
+    connections.close()
+    assert conn.closed and connections.buckets == {}
+
+
+def test_small_upload_is_a_single_put():
+    bucket = FakeBucket()
+    Utils.uploadPartsToS3(bucket.new_key('k'), [b'abc', b'def'])
+    assert bucket.contents['k'] == b'abcdef'
+    assert bucket.puts == ['k'] and bucket.uploads == []
+
+
+def test_multipart_upload_crosses_part_boundary():
+    bucket = FakeBucket()
+    data = np.random.RandomState(0).bytes(20 * MB + 123)
+    chunks = [data[i:i + 3 * MB] for i in range(0, len(data), 3 * MB)]
+    Utils.uploadPartsToS3(bucket.new_key('k'), chunks)
+    (upload,) = bucket.uploads
+    assert upload.state == 'complete'
+    assert bucket.contents['k'] == data
+    sizes = [len(upload.parts[n]) for n in sorted(upload.parts)]
+    assert sorted(upload.parts) == list(range(1, len(sizes) + 1))
+    assert len(sizes) > 1
+    assert all(size >= Utils.S3_PART_SIZE for size in sizes[:-1])
+
+
+def test_failed_part_cancels_the_upload():
+    bucket = FakeBucket(fail_part=2)
+    data = np.random.RandomState(0).bytes(20 * MB)
+    with pytest.raises(IOError):
+        Utils.uploadPartsToS3(bucket.new_key('k'), [data[i:i + MB] for i in range(0, len(data), MB)])
+    (upload,) = bucket.uploads
+    assert upload.state == 'cancelled'
+    assert 'k' not in bucket.contents
+
+
+def test_saved_file_is_uploaded_in_parts(connections, authfile, tmp_path):
+    path = tmp_path / 'x.xlsx'
+    data = np.random.RandomState(0).bytes(17 * MB)
+    path.write_bytes(data)
+    Utils.saveFileToS3(str(path), authfile, 'b', 'x.xlsx')
+    bucket = connections.getBucket(authfile, 'b')
+    assert bucket.contents['x.xlsx'] == data
+    assert len(bucket.uploads[0].parts) == 3
+
+
+def test_chunked_csv_round_trip(connections, authfile):
+    df = pd.DataFrame(np.random.RandomState(0).rand(2500, 3), columns=list('abc'),
+                      index=pd.date_range('2020-01-01', periods=2500, freq='min'))
+    Utils.pushDataFrameToS3(df, authfile, 'b', 'df.csv')
+    assert connections.getBucket(authfile, 'b').contents['df.csv'] == df.to_csv().encode('utf-8')
+    chunks = list(Utils.getDataFrameFromS3(authfile, 'b', 'df.csv', chunksize=1000))
+    assert [len(chunk) for chunk in chunks] == [1000, 1000, 500]
+    back = pd.concat(chunks)
+    pd.testing.assert_frame_equal(back, df, check_freq=False)
+    pd.testing.assert_frame_equal(Utils.getDataFrameFromS3(authfile, 'b', 'df.csv'), df, check_freq=False)
+
+
+def test_existing_key_is_kept_without_overwrite(connections, authfile):
+    Utils.pushDataFrameToS3(pd.DataFrame({'a': [1]}), authfile, 'b', 'df.csv')
+    Utils.pushDataFrameToS3(pd.DataFrame({'a': [2]}), authfile, 'b', 'df.csv')
+    assert Utils.getDataFrameFromS3(authfile, 'b', 'df.csv')['a'].tolist() == [1]
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from support import load
+
+sheets = load('sheets')
+
+
+class FakeWorksheet():
+    """The parts of gspread's Worksheet df_to_sheets uses, recording every call."""
+
+    def __init__(self, rows=1000, cols=26):
+        self.row_count = rows
+        self.col_count = cols
+        self.calls = []
+
+    def resize(self, rows, cols):
+        self.calls.append(('resize', rows, cols))
+        self.row_count, self.col_count = rows, cols
+
+    def update(self, values, range_name, value_input_option):
+        self.calls.append(('update', range_name, values, value_input_option))
+
+
+class FakeSpreadsheet():
+    def __init__(self, worksheet):
+        self.sheet1 = worksheet
+
+
+class FakeClient():
+    def __init__(self, worksheet):
+        self.worksheet = worksheet
+
+    def open(self, spreadsheet_id):
+        return FakeSpreadsheet(self.worksheet)
+
+
+@pytest.fixture
+def worksheet(monkeypatch):
+    worksheet = FakeWorksheet()
+    monkeypatch.setattr(sheets, 'get_client', lambda: FakeClient(worksheet))
+    return worksheet
+
+
+def test_frame_over_max_cells_is_written_in_row_batches(worksheet):
+    df = pd.DataFrame(np.arange(40).reshape(10, 4), columns=list('abcd'))
+    sheets.df_to_sheets(df, 'test', 'Sheet1', max_cells=20)
+    values = [[''] + list('abcd')] + [[i] + list(range(4 * i, 4 * i + 4)) for i in range(10)]
+    assert worksheet.calls == [
+        ('update', 'A1:E4', values[0:4], 'RAW'),
+        ('update', 'A5:E8', values[4:8], 'RAW'),
+        ('update', 'A9:E11', values[8:11], 'RAW'),
+    ]
+
+
+def test_row_wider_than_max_cells_is_written_a_row_at_a_time(worksheet):
+    df = pd.DataFrame([np.arange(30)], columns=['c%d' % i for i in range(30)])
+    sheets.df_to_sheets(df, 'test', 'Sheet1', max_cells=10)
+    assert worksheet.calls == [
+        ('resize', 1000, 31),
+        ('update', 'A1:AE1', [[''] + list(df.columns)], 'RAW'),
+        ('update', 'A2:AE2', [[0] + list(range(30))], 'RAW'),
+    ]
+
+
+def test_empty_frame_writes_only_its_header(worksheet):
+    sheets.df_to_sheets(pd.DataFrame(columns=['a', 'b']), 'test', 'Sheet1')
+    assert worksheet.calls == [('update', 'A1:C1', [['', 'a', 'b']], 'RAW')]
+
+
+def test_empty_frame_without_headers_writes_nothing(worksheet):
+    sheets.df_to_sheets(pd.DataFrame(columns=['a', 'b']), 'test', 'Sheet1', column_header=False, row_header=False)
+    assert worksheet.calls == []
+
+
+def test_value_input_option_is_passed_on(worksheet):
+    df = pd.DataFrame({'a': ['00123', '1/2', '=A1']})
+    sheets.df_to_sheets(df, 'test', 'Sheet1', value_input_option='USER_ENTERED')
+    assert worksheet.calls == [('update', 'A1:B4', [['', 'a'], [0, '00123'], [1, '1/2'], [2, '=A1']], 'USER_ENTERED')]
@@ -0,0 +1,119 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import openpyxl
+
+from support import load
+
+df2xl = load('df2xl')
+
+
+def buildWorkbook():
+    wb = df2xl.Workbook('w')
+    sheet = wb.addSheet('s')
+    sheet.addTable('t', pd.DataFrame({
+        'f': [1.5, np.nan, np.inf, 2.0, 3.25],
+        'i': [1, 2, 3, 4, 5],
+        'dt': pd.to_datetime(['1900-01-15', '1900-03-05', '2020-05-06 13:00', '2021-01-01', '1999-12-31']),
+        's': ['a', 'b', np.nan, '=1+1', 'e'],
+        'o': ['x', 1, datetime.date(2020, 1, 2), None, 2.5],
+        'n': [np.nan] * 5,
+        'b': [True, False, True, False, True],
+    }, index=pd.date_range('2020-01-01', periods=5)))
+    table = sheet.addTable('t2', pd.DataFrame(np.arange(12).reshape(4, 3) * 1.5, columns=list('abc')),
+                           relative_position='right', total_row=True)
+    sheet.addTable('t3', df2xl.Formula.divide(table[['a', 'b']], table[['c']]))
+    sheet.addTable('t4', df2xl.Formula.add(table['a'].to_frame(), 3), include_id=False, relative_position='right')
+    table.shift(0, 2)
+    other = wb.addSheet('s2')
+    other.addTable('ref', pd.DataFrame([[df2xl.Formula(df2xl.Function.reference(), table['a'].iloc[0])]]))
+    return wb
+
+
+def readWorkbook(path):
+    cells = []
+    for sheet in openpyxl.load_workbook(path).worksheets:
+        for row in sheet.iter_rows():
+            for cell in row:
+                if cell.value is not None or cell.has_style:
+                    color = cell.font.color
+                    color = color.rgb if color is not None and color.type == 'rgb' else None
+                    cells.append((sheet.title, cell.coordinate, cell.value, cell.number_format, color))
+    return cells
+
+
+def exportCells(path):
+    buildWorkbook().exportAsXLSX(path)
+    return readWorkbook(path)
+
+
+# Written by exportAsXLSX before the streaming mode was added
+EXPECTED = [
+    ('s', 'A1', 't', 'General', 'FFFFFFFF'), ('s', 'B1', None, 'General', 'FFFFFFFF'),
+    ('s', 'C1', None, 'General', 'FFFFFFFF'), ('s', 'D1', None, 'General', 'FFFFFFFF'),
+    ('s', 'E1', None, 'General', 'FFFFFFFF'), ('s', 'F1', None, 'General', 'FFFFFFFF'),
+    ('s', 'G1', None, 'General', 'FFFFFFFF'), ('s', 'H1', None, 'General', 'FFFFFFFF'),
+    ('s', 'A2', None, 'General', 'FFFFFFFF'), ('s', 'B2', 'f', 'General', 'FFFFFFFF'),
+    ('s', 'C2', 'i', 'General', 'FFFFFFFF'), ('s', 'D2', 'dt', 'General', 'FFFFFFFF'),
+    ('s', 'E2', 's', 'General', 'FFFFFFFF'), ('s', 'F2', 'o', 'General', 'FFFFFFFF'),
+    ('s', 'G2', 'n', 'General', 'FFFFFFFF'), ('s', 'H2', 'b', 'General', 'FFFFFFFF'),
+    ('s', 'A3', datetime.datetime(2020, 1, 1, 0, 0), 'mm/dd/yy', 'FFFFFFFF'), ('s', 'B3', 1.5, '###,###,###', None),
+    ('s', 'C3', 1, '###,###,###', None), ('s', 'D3', datetime.datetime(1900, 1, 15, 0, 0), 'mm/dd/yy', None),
+    ('s', 'E3', 'a', '###,###,###', None), ('s', 'F3', 'x', '###,###,###', None),
+    ('s', 'H3', True, '###,###,###', None), ('s', 'J3', 't2', 'General', 'FFFFFFFF'),
+    ('s', 'K3', None, 'General', 'FFFFFFFF'), ('s', 'L3', None, 'General', 'FFFFFFFF'),
+    ('s', 'M3', None, 'General', 'FFFFFFFF'), ('s', 'A4', datetime.datetime(2020, 1, 2, 0, 0), 'mm/dd/yy', 'FFFFFFFF'),
+    ('s', 'C4', 2, '###,###,###', None), ('s', 'D4', datetime.datetime(1900, 3, 5, 0, 0), 'mm/dd/yy', None),
+    ('s', 'E4', 'b', '###,###,###', None), ('s', 'F4', 1, '###,###,###', None),
+    ('s', 'H4', False, '###,###,###', None), ('s', 'J4', None, 'General', 'FFFFFFFF'),
+    ('s', 'K4', 'a', 'General', 'FFFFFFFF'), ('s', 'L4', 'b', 'General', 'FFFFFFFF'),
+    ('s', 'M4', 'c', 'General', 'FFFFFFFF'), ('s', 'A5', datetime.datetime(2020, 1, 3, 0, 0), 'mm/dd/yy', 'FFFFFFFF'),
+    ('s', 'C5', 3, '###,###,###', None), ('s', 'D5', datetime.datetime(2020, 5, 6, 0, 0), 'mm/dd/yy', None),
+    ('s', 'F5', datetime.datetime(2020, 1, 2, 0, 0), 'mm/dd/yy', None), ('s', 'H5', True, '###,###,###', None),
+    ('s', 'J5', 0, 'General', 'FFFFFFFF'), ('s', 'K5', 0, '###,###,###', None), ('s', 'L5', 1.5, '###,###,###', None),
+    ('s', 'M5', 3, '###,###,###', None), ('s', 'A6', datetime.datetime(2020, 1, 4, 0, 0), 'mm/dd/yy', 'FFFFFFFF'),
+    ('s', 'B6', 2, '###,###,###', None), ('s', 'C6', 4, '###,###,###', None),
+    ('s', 'D6', datetime.datetime(2021, 1, 1, 0, 0), 'mm/dd/yy', None), ('s', 'E6', '=1+1', '###,###,###', None),
+    ('s', 'F6', None, '###,###,###', None), ('s', 'H6', False, '###,###,###', None),
+    ('s', 'J6', 1, 'General', 'FFFFFFFF'), ('s', 'K6', 4.5, '###,###,###', None), ('s', 'L6', 6, '###,###,###', None),
+    ('s', 'M6', 7.5, '###,###,###', None), ('s', 'A7', datetime.datetime(2020, 1, 5, 0, 0), 'mm/dd/yy', 'FFFFFFFF'),
+    ('s', 'B7', 3.25, '###,###,###', None), ('s', 'C7', 5, '###,###,###', None),
+    ('s', 'D7', datetime.datetime(1999, 12, 31, 0, 0), 'mm/dd/yy', None), ('s', 'E7', 'e', '###,###,###', None),
+    ('s', 'F7', 2.5, '###,###,###', None), ('s', 'H7', True, '###,###,###', None),
+    ('s', 'J7', 2, 'General', 'FFFFFFFF'), ('s', 'K7', 9, '###,###,###', None), ('s', 'L7', 10.5, '###,###,###', None),
+    ('s', 'M7', 12, '###,###,###', None), ('s', 'J8', 3, 'General', 'FFFFFFFF'),
+    ('s', 'K8', 13.5, '###,###,###', None), ('s', 'L8', 15, '###,###,###', None),
+    ('s', 'M8', 16.5, '###,###,###', None), ('s', 'A9', 't3', 'General', 'FFFFFFFF'),
+    ('s', 'B9', None, 'General', 'FFFFFFFF'), ('s', 'C9', None, 'General', 'FFFFFFFF'),
+    ('s', 'E9', None, 'General', 'FFFFFFFF'), ('s', 'F9', 'a', 'General', 'FFFFFFFF'),
+    ('s', 'J9', 'Total', 'General', 'FFFFFFFF'), ('s', 'K9', '=SUM(K5:K8)', '###,###,###', None),
+    ('s', 'L9', '=SUM(L5:L8)', '###,###,###', None), ('s', 'M9', '=SUM(M5:M8)', '###,###,###', None),
+    ('s', 'A10', None, 'General', 'FFFFFFFF'), ('s', 'B10', 'a', 'General', 'FFFFFFFF'),
+    ('s', 'C10', 'b', 'General', 'FFFFFFFF'), ('s', 'E10', 0, 'General', 'FFFFFFFF'),
+    ('s', 'F10', '=K5+3', '###,###,###', None), ('s', 'A11', 0, 'General', 'FFFFFFFF'),
+    ('s', 'B11', '=K5/M5', '###,###,###', None), ('s', 'C11', '=L5/M5', '###,###,###', None),
+    ('s', 'E11', 1, 'General', 'FFFFFFFF'), ('s', 'F11', '=K6+3', '###,###,###', None),
+    ('s', 'A12', 1, 'General', 'FFFFFFFF'), ('s', 'B12', '=K6/M6', '###,###,###', None),
+    ('s', 'C12', '=L6/M6', '###,###,###', None), ('s', 'E12', 2, 'General', 'FFFFFFFF'),
+    ('s', 'F12', '=K7+3', '###,###,###', None), ('s', 'A13', 2, 'General', 'FFFFFFFF'),
+    ('s', 'B13', '=K7/M7', '###,###,###', None), ('s', 'C13', '=L7/M7', '###,###,###', None),
+    ('s', 'E13', 3, 'General', 'FFFFFFFF'), ('s', 'F13', '=K8+3', '###,###,###', None),
+    ('s', 'A14', 3, 'General', 'FFFFFFFF'), ('s', 'B14', '=K8/M8', '###,###,###', None),
+    ('s', 'C14', '=L8/M8', '###,###,###', None), ('s', 'E14', 'Total', 'General', 'FFFFFFFF'),
+    ('s', 'F14', '=K9+3', '###,###,###', None), ('s', 'A15', 'Total', 'General', 'FFFFFFFF'),
+    ('s', 'B15', '=K9/M9', '###,###,###', None), ('s', 'C15', '=L9/M9', '###,###,###', None),
+    ('s2', 'A1', 'ref', 'General', 'FFFFFFFF'), ('s2', 'B1', None, 'General', 'FFFFFFFF'),
+    ('s2', 'A2', None, 'General', 'FFFFFFFF'), ('s2', 'B2', 0, 'General', 'FFFFFFFF'),
+    ('s2', 'A3', 0, 'General', 'FFFFFFFF'), ('s2', 'B3', "='s'!K5", '###,###,###', None),
+]
+
+
+def test_default_export_is_unchanged(tmp_path):
+    assert exportCells(str(tmp_path / 'w.xlsx')) == EXPECTED
+
+
+def test_constant_memory_export_writes_the_same_cells(tmp_path):
+    path = str(tmp_path / 'w.xlsx')
+    buildWorkbook().exportAsXLSX(path, constant_memory=True)
+    assert readWorkbook(path) == EXPECTED
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import openpyxl
+
+from support import load
+
+df2xl = load('df2xl')
+Formula = df2xl.Formula
+
+
+def buildWorkbook():
+    wb = df2xl.Workbook('w')
+    sheet, other = wb.addSheet('s'), wb.addSheet('o')
+    A = sheet.addTable('A', pd.DataFrame(np.arange(12).reshape(4, 3) * 1.5, columns=list('abc')), total_row=True)
+    B = sheet.addTable('B', pd.DataFrame(np.arange(12).reshape(4, 3), columns=list('abc')), total_row=True,
+                       relative_position='right')
+    ratio = Formula.divide(A[['a', 'b']], A[['c']])
+    sheet.addTable('ratio', ratio)
+    total = Formula.add(Formula.multiply(A, B, parentheses=True), 3)
+    sheet.addTable('total', total, relative_position='right')
+    other.addTable('tail', Formula.subtract(total.iloc[1:], 1), include_id=False)
+    other.addTable('mixed', Formula.add(A[['a']], Formula.multiply(B[['b']], 2)))
+    other.addTable('if', Formula.applyIf(Formula.isEqual(A, B), total, 0))
+    A.shift(0, 2)
+    return wb
+
+
+def exportFormulas(path):
+    buildWorkbook().exportAsXLSX(path)
+    cells = []
+    for sheet in openpyxl.load_workbook(path).worksheets:
+        for row in sheet.iter_rows():
+            cells.extend((sheet.title, cell.coordinate, cell.value) for cell in row if cell.value is not None)
+    return cells
+
+
+# Written cell by cell, before formula columns were stored as templates
+EXPECTED = [
+    ('s', 'F1', 'B'), ('s', 'G2', 'a'), ('s', 'H2', 'b'), ('s', 'I2', 'c'), ('s', 'A3', 'A'), ('s', 'F3', 0),
+    ('s', 'G3', 0), ('s', 'H3', 1), ('s', 'I3', 2), ('s', 'B4', 'a'), ('s', 'C4', 'b'), ('s', 'D4', 'c'),
+    ('s', 'F4', 1), ('s', 'G4', 3), ('s', 'H4', 4), ('s', 'I4', 5), ('s', 'A5', 0), ('s', 'B5', 0), ('s', 'C5', 1.5),
+    ('s', 'D5', 3), ('s', 'F5', 2), ('s', 'G5', 6), ('s', 'H5', 7), ('s', 'I5', 8), ('s', 'A6', 1), ('s', 'B6', 4.5),
+    ('s', 'C6', 6), ('s', 'D6', 7.5), ('s', 'F6', 3), ('s', 'G6', 9), ('s', 'H6', 10), ('s', 'I6', 11), ('s', 'A7', 2),
+    ('s', 'B7', 9), ('s', 'C7', 10.5), ('s', 'D7', 12), ('s', 'F7', 'Total'), ('s', 'G7', '=SUM(G3:G6)'),
+    ('s', 'H7', '=SUM(H3:H6)'), ('s', 'I7', '=SUM(I3:I6)'), ('s', 'A8', 3), ('s', 'B8', 13.5), ('s', 'C8', 15),
+    ('s', 'D8', 16.5), ('s', 'A9', 'ratio'), ('s', 'D9', '=SUM(D5:D8)'), ('s', 'E9', 'total'), ('s', 'B10', 'a'),
+    ('s', 'C10', 'b'), ('s', 'F10', 'a'), ('s', 'G10', 'b'), ('s', 'H10', 'c'), ('s', 'A11', 0),
+    ('s', 'B11', '=B5/D5'), ('s', 'C11', '=C5/D5'), ('s', 'E11', 0), ('s', 'F11', '=(B5*G3)+3'),
+    ('s', 'G11', '=(C5*H3)+3'), ('s', 'H11', '=(D5*I3)+3'), ('s', 'A12', 1), ('s', 'B12', '=B6/D6'),
+    ('s', 'C12', '=C6/D6'), ('s', 'E12', 1), ('s', 'F12', '=(B6*G4)+3'), ('s', 'G12', '=(C6*H4)+3'),
+    ('s', 'H12', '=(D6*I4)+3'), ('s', 'A13', 2), ('s', 'B13', '=B7/D7'), ('s', 'C13', '=C7/D7'), ('s', 'E13', 2),
+    ('s', 'F13', '=(B7*G5)+3'), ('s', 'G13', '=(C7*H5)+3'), ('s', 'H13', '=(D7*I5)+3'), ('s', 'A14', 3),
+    ('s', 'B14', '=B8/D8'), ('s', 'C14', '=C8/D8'), ('s', 'E14', 3), ('s', 'F14', '=(B8*G6)+3'),
+    ('s', 'G14', '=(C8*H6)+3'), ('s', 'H14', '=(D8*I6)+3'), ('s', 'A15', 'Total'), ('s', 'B15', '=B9/D9'),
+    ('s', 'C15', '=C9/D9'), ('s', 'E15', 'Total'), ('s', 'F15', '=(B9*G7)+3'), ('s', 'G15', '=(C9*H7)+3'),
+    ('s', 'H15', '=(D9*I7)+3'), ('o', 'B1', 'a'), ('o', 'C1', 'b'), ('o', 'D1', 'c'), ('o', 'A2', 1),
+    ('o', 'B2', "=('s'!B6*'s'!G4)+3-1"), ('o', 'C2', "=('s'!C6*'s'!H4)+3-1"), ('o', 'D2', "=('s'!D6*'s'!I4)+3-1"),
+    ('o', 'A3', 2), ('o', 'B3', "=('s'!B7*'s'!G5)+3-1"), ('o', 'C3', "=('s'!C7*'s'!H5)+3-1"),
+    ('o', 'D3', "=('s'!D7*'s'!I5)+3-1"), ('o', 'A4', 3), ('o', 'B4', "=('s'!B8*'s'!G6)+3-1"),
+    ('o', 'C4', "=('s'!C8*'s'!H6)+3-1"), ('o', 'D4', "=('s'!D8*'s'!I6)+3-1"), ('o', 'A5', 'Total'),
+    ('o', 'B5', "=('s'!B9*'s'!G7)+3-1"), ('o', 'C5', "=('s'!C9*'s'!H7)+3-1"), ('o', 'D5', "=('s'!D9*'s'!I7)+3-1"),
+    ('o', 'A7', 'mixed'), ('o', 'B8', 'a'), ('o', 'A9', 0), ('o', 'B9', "='s'!B5+'s'!H3*2"), ('o', 'A10', 1),
+    ('o', 'B10', "='s'!B6+'s'!H4*2"), ('o', 'A11', 2), ('o', 'B11', "='s'!B7+'s'!H5*2"), ('o', 'A12', 3),
+    ('o', 'B12', "='s'!B8+'s'!H6*2"), ('o', 'A13', 'Total'), ('o', 'B13', "='s'!B9+'s'!H7*2"), ('o', 'A15', 'if'),
+    ('o', 'B16', 'a'), ('o', 'C16', 'b'), ('o', 'D16', 'c'), ('o', 'A17', 0),
+    ('o', 'B17', "=IF('s'!B5='s'!G3,('s'!B5*'s'!G3)+3,0)"), ('o', 'C17', "=IF('s'!C5='s'!H3,('s'!C5*'s'!H3)+3,0)"),
+    ('o', 'D17', "=IF('s'!D5='s'!I3,('s'!D5*'s'!I3)+3,0)"), ('o', 'A18', 1),
+    ('o', 'B18', "=IF('s'!B6='s'!G4,('s'!B6*'s'!G4)+3,0)"), ('o', 'C18', "=IF('s'!C6='s'!H4,('s'!C6*'s'!H4)+3,0)"),
+    ('o', 'D18', "=IF('s'!D6='s'!I4,('s'!D6*'s'!I4)+3,0)"), ('o', 'A19', 2),
+    ('o', 'B19', "=IF('s'!B7='s'!G5,('s'!B7*'s'!G5)+3,0)"), ('o', 'C19', "=IF('s'!C7='s'!H5,('s'!C7*'s'!H5)+3,0)"),
+    ('o', 'D19', "=IF('s'!D7='s'!I5,('s'!D7*'s'!I5)+3,0)"), ('o', 'A20', 3),
+    ('o', 'B20', "=IF('s'!B8='s'!G6,('s'!B8*'s'!G6)+3,0)"), ('o', 'C20', "=IF('s'!C8='s'!H6,('s'!C8*'s'!H6)+3,0)"),
+    ('o', 'D20', "=IF('s'!D8='s'!I6,('s'!D8*'s'!I6)+3,0)"), ('o', 'A21', 'Total'),
+    ('o', 'B21', "=IF('s'!B9='s'!G7,('s'!B9*'s'!G7)+3,0)"), ('o', 'C21', "=IF('s'!C9='s'!H7,('s'!C9*'s'!H7)+3,0)"),
+    ('o', 'D21', "=IF('s'!D9='s'!I7,('s'!D9*'s'!I7)+3,0)"),
+]
+
+
+def test_template_columns_export_like_cell_formulas(tmp_path):
+    assert exportFormulas(str(tmp_path / 'w.xlsx')) == EXPECTED
+
+
+def test_template_rows_render_like_cell_formulas():
+    wb = df2xl.Workbook('w')
+    sheet = wb.addSheet('s')
+    A = sheet.addTable('A', pd.DataFrame(np.arange(6).reshape(3, 2), columns=list('ab')))
+    f = Formula.multiply(Formula.add(A[['a']], A[['b']], parentheses=True), 2)
+    row = f.iloc[2, 0]
+    assert row.toReferenceString(sheet) == '(B5+C5)*2'
+    assert repr(row.getFunction()) == repr(Formula.multiply(1, 2).getFunction())
+    assert row.getArgs()[0].toReferenceString(sheet) == '(B5+C5)'
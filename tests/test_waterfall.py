@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from support import load
+
+df2xl = load('df2xl')
+
+
+def buildTables(dates, rate_index, columns=('p', 'q')):
+    sheet = df2xl.Workbook('w').addSheet('s')
+    adds = sheet.addTable('adds', pd.DataFrame(np.arange(len(dates) * len(columns)).reshape(len(dates), len(columns)),
+                                               index=dates, columns=list(columns)))
+    rates = pd.DataFrame(np.random.RandomState(0).rand(len(rate_index), len(columns)).round(3), index=rate_index,
+                         columns=list(columns))
+    return sheet, adds, sheet.addTable('rr', rates, relative_position='right')
+
+
+CASES = [
+    (pd.date_range('2018-01-01', '2020-10-01', freq='QS'), range(0, 4)),
+    (pd.date_range('2018-03-01', '2020-02-01', freq='4MS'), range(1, 4)),
+    (pd.DatetimeIndex(['2018-01-01', '2018-01-15', '2019-03-01 10:00', '2019-01-01', '2020-02-01 10:00',
+                       '2020-02-01 11:00']), range(0, 4)),
+    (pd.date_range('2018-01-01', '2021-01-01', freq='QS')[::-1], ['a', 'b', 'c', 'd']),
+]
+
+
+def renderWaterfalls():
+    rendered = []
+    for dates, rate_index in CASES:
+        sheet, adds, rates = buildTables(dates, rate_index)
+        for column, df in adds.toAnnualRenewalWaterfall(rates).items():
+            # Each row as its formulas by column position, the rest of the waterfall is empty
+            rows = [{x: v.toReferenceString(sheet) for x, v in enumerate(row) if isinstance(v, df2xl.Formula)}
+                    for row in df.values]
+            rendered.append((column, [str(label) for label in df.index], [str(label) for label in df.columns], rows))
+    return rendered
+
+
+# Built from a dict of dicts per column, with a pd.date_range of anniversaries per cohort
+EXPECTED = [
+    ('p',
+     ['2018-01-01 00:00:00', '2019-01-01 00:00:00', '2020-01-01 00:00:00', '2018-04-01 00:00:00',
+      '2019-04-01 00:00:00', '2020-04-01 00:00:00', '2018-07-01 00:00:00', '2019-07-01 00:00:00',
+      '2020-07-01 00:00:00', '2018-10-01 00:00:00', '2019-10-01 00:00:00', '2020-10-01 00:00:00'],
+     ['2018-01-01 00:00:00', '2019-01-01 00:00:00', '2020-01-01 00:00:00', '2018-04-01 00:00:00',
+      '2019-04-01 00:00:00', '2020-04-01 00:00:00', '2018-07-01 00:00:00', '2019-07-01 00:00:00',
+      '2020-07-01 00:00:00', '2018-10-01 00:00:00', '2019-10-01 00:00:00', '2020-10-01 00:00:00'],
+     [{0: 'B3', 1: 'B3*F4', 2: 'B3*F5'}, {1: 'B7', 2: 'B7*F4'}, {2: 'B11'}, {3: 'B4', 4: 'B4*F4', 5: 'B4*F5'},
+      {4: 'B8', 5: 'B8*F4'}, {5: 'B12'}, {6: 'B5', 7: 'B5*F4', 8: 'B5*F5'}, {7: 'B9', 8: 'B9*F4'}, {8: 'B13'},
+      {9: 'B6', 10: 'B6*F4', 11: 'B6*F5'}, {10: 'B10', 11: 'B10*F4'}, {11: 'B14'}]),
+    ('q',
+     ['2018-01-01 00:00:00', '2019-01-01 00:00:00', '2020-01-01 00:00:00', '2018-04-01 00:00:00',
+      '2019-04-01 00:00:00', '2020-04-01 00:00:00', '2018-07-01 00:00:00', '2019-07-01 00:00:00',
+      '2020-07-01 00:00:00', '2018-10-01 00:00:00', '2019-10-01 00:00:00', '2020-10-01 00:00:00'],
+     ['2018-01-01 00:00:00', '2019-01-01 00:00:00', '2020-01-01 00:00:00', '2018-04-01 00:00:00',
+      '2019-04-01 00:00:00', '2020-04-01 00:00:00', '2018-07-01 00:00:00', '2019-07-01 00:00:00',
+      '2020-07-01 00:00:00', '2018-10-01 00:00:00', '2019-10-01 00:00:00', '2020-10-01 00:00:00'],
+     [{0: 'C3', 1: 'C3*G4', 2: 'C3*G5'}, {1: 'C7', 2: 'C7*G4'}, {2: 'C11'}, {3: 'C4', 4: 'C4*G4', 5: 'C4*G5'},
+      {4: 'C8', 5: 'C8*G4'}, {5: 'C12'}, {6: 'C5', 7: 'C5*G4', 8: 'C5*G5'}, {7: 'C9', 8: 'C9*G4'}, {8: 'C13'},
+      {9: 'C6', 10: 'C6*G4', 11: 'C6*G5'}, {10: 'C10', 11: 'C10*G4'}, {11: 'C14'}]),
+    ('p',
+     ['2018-03-01 00:00:00', '2019-03-01 00:00:00', '2018-07-01 00:00:00', '2019-07-01 00:00:00',
+      '2018-11-01 00:00:00', '2019-11-01 00:00:00'],
+     ['2018-03-01 00:00:00', '2019-03-01 00:00:00', '2018-07-01 00:00:00', '2019-07-01 00:00:00',
+      '2018-11-01 00:00:00', '2019-11-01 00:00:00'],
+     [{0: 'B3', 1: 'B3*F3'}, {1: 'B6'}, {2: 'B4', 3: 'B4*F3'}, {3: 'B7'}, {4: 'B5', 5: 'B5*F3'}, {5: 'B8'}]),
+    ('q',
+     ['2018-03-01 00:00:00', '2019-03-01 00:00:00', '2018-07-01 00:00:00', '2019-07-01 00:00:00',
+      '2018-11-01 00:00:00', '2019-11-01 00:00:00'],
+     ['2018-03-01 00:00:00', '2019-03-01 00:00:00', '2018-07-01 00:00:00', '2019-07-01 00:00:00',
+      '2018-11-01 00:00:00', '2019-11-01 00:00:00'],
+     [{0: 'C3', 1: 'C3*G3'}, {1: 'C6'}, {2: 'C4', 3: 'C4*G3'}, {3: 'C7'}, {4: 'C5', 5: 'C5*G3'}, {5: 'C8'}]),
+    ('p',
+     ['2018-01-01 00:00:00', '2019-01-01 00:00:00', '2018-01-15 00:00:00', '2019-03-01 10:00:00',
+      '2020-02-01 10:00:00', '2020-02-01 11:00:00'],
+     ['2018-01-01 00:00:00', '2019-01-01 00:00:00', '2020-01-01 00:00:00', '2018-02-01 00:00:00',
+      '2019-02-01 00:00:00', '2020-02-01 00:00:00', '2019-03-01 10:00:00', '2020-02-01 10:00:00',
+      '2020-02-01 11:00:00'],
+     [{0: 'B3', 1: 'B3*F4', 2: 'B3*F5'}, {1: 'B6', 2: 'B6*F4'}, {3: 'B4', 4: 'B4*F4', 5: 'B4*F5'}, {6: 'B5'},
+      {7: 'B7'}, {8: 'B8'}]),
+    ('q',
+     ['2018-01-01 00:00:00', '2019-01-01 00:00:00', '2018-01-15 00:00:00', '2019-03-01 10:00:00',
+      '2020-02-01 10:00:00', '2020-02-01 11:00:00'],
+     ['2018-01-01 00:00:00', '2019-01-01 00:00:00', '2020-01-01 00:00:00', '2018-02-01 00:00:00',
+      '2019-02-01 00:00:00', '2020-02-01 00:00:00', '2019-03-01 10:00:00', '2020-02-01 10:00:00',
+      '2020-02-01 11:00:00'],
+     [{0: 'C3', 1: 'C3*G4', 2: 'C3*G5'}, {1: 'C6', 2: 'C6*G4'}, {3: 'C4', 4: 'C4*G4', 5: 'C4*G5'}, {6: 'C5'},
+      {7: 'C7'}, {8: 'C8'}]),
+    ('p',
+     ['2021-01-01 00:00:00', '2020-01-01 00:00:00', '2019-01-01 00:00:00', '2018-01-01 00:00:00',
+      '2020-10-01 00:00:00', '2019-10-01 00:00:00', '2018-10-01 00:00:00', '2020-07-01 00:00:00',
+      '2019-07-01 00:00:00', '2018-07-01 00:00:00', '2020-04-01 00:00:00', '2019-04-01 00:00:00',
+      '2018-04-01 00:00:00'],
+     ['2021-01-01 00:00:00', '2020-10-01 00:00:00', '2020-07-01 00:00:00', '2020-04-01 00:00:00',
+      '2020-01-01 00:00:00', '2019-10-01 00:00:00', '2019-07-01 00:00:00', '2019-04-01 00:00:00',
+      '2019-01-01 00:00:00', '2018-10-01 00:00:00', '2018-07-01 00:00:00', '2018-04-01 00:00:00',
+      '2018-01-01 00:00:00'],
+     [{0: 'B3'}, {0: 'B7*F4', 4: 'B7'}, {0: 'B11*F5', 4: 'B11*F4', 8: 'B11'},
+      {0: 'B15*F6', 4: 'B15*F5', 8: 'B15*F4', 12: 'B15'}, {1: 'B4'}, {1: 'B8*F4', 5: 'B8'},
+      {1: 'B12*F5', 5: 'B12*F4', 9: 'B12'}, {2: 'B5'}, {2: 'B9*F4', 6: 'B9'}, {2: 'B13*F5', 6: 'B13*F4', 10: 'B13'},
+      {3: 'B6'}, {3: 'B10*F4', 7: 'B10'}, {3: 'B14*F5', 7: 'B14*F4', 11: 'B14'}]),
+    ('q',
+     ['2021-01-01 00:00:00', '2020-01-01 00:00:00', '2019-01-01 00:00:00', '2018-01-01 00:00:00',
+      '2020-10-01 00:00:00', '2019-10-01 00:00:00', '2018-10-01 00:00:00', '2020-07-01 00:00:00',
+      '2019-07-01 00:00:00', '2018-07-01 00:00:00', '2020-04-01 00:00:00', '2019-04-01 00:00:00',
+      '2018-04-01 00:00:00'],
+     ['2021-01-01 00:00:00', '2020-10-01 00:00:00', '2020-07-01 00:00:00', '2020-04-01 00:00:00',
+      '2020-01-01 00:00:00', '2019-10-01 00:00:00', '2019-07-01 00:00:00', '2019-04-01 00:00:00',
+      '2019-01-01 00:00:00', '2018-10-01 00:00:00', '2018-07-01 00:00:00', '2018-04-01 00:00:00',
+      '2018-01-01 00:00:00'],
+     [{0: 'C3'}, {0: 'C7*G4', 4: 'C7'}, {0: 'C11*G5', 4: 'C11*G4', 8: 'C11'},
+      {0: 'C15*G6', 4: 'C15*G5', 8: 'C15*G4', 12: 'C15'}, {1: 'C4'}, {1: 'C8*G4', 5: 'C8'},
+      {1: 'C12*G5', 5: 'C12*G4', 9: 'C12'}, {2: 'C5'}, {2: 'C9*G4', 6: 'C9'}, {2: 'C13*G5', 6: 'C13*G4', 10: 'C13'},
+      {3: 'C6'}, {3: 'C10*G4', 7: 'C10'}, {3: 'C14*G5', 7: 'C14*G4', 11: 'C14'}]),
+]
+
+
+def test_waterfalls_match_date_range_implementation():
+    assert renderWaterfalls() == EXPECTED
+
+
+def test_missing_renewal_year_raises():
+    # Two years of rates for cohorts that run for three, as before
+    sheet, adds, rates = buildTables(pd.date_range('2018-01-01', '2020-06-01', freq='MS'), range(0, 2))
+    with pytest.raises(KeyError):
+        adds.toAnnualRenewalWaterfall(rates)